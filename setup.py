@@ -45,7 +45,8 @@ setup(
     #[console_scripts]
     #miniscot = scse.main.cli:main
     #""",
-    entry_points={'console_scripts':['miniscot=scse.main.cli:main']},
+    entry_points={'console_scripts':['miniscot=scse.main.cli:main',
+                                    'scse=scse.main.batch:main']},
     #
     # 3. Uncomment the Python interpreter and Python-setuptools in the
     #   dependencies section of your Config. This is necessary to guarantee the
@@ -0,0 +1,143 @@
+"""
+Columnar batches of actions.
+
+Besides lists of action dicts, Agents can return an ActionBatch from
+`compute_actions()`: one typed column per action field, which the Environment
+validates and applies with vectorized operations. This is much cheaper for
+agents emitting many actions per timestep (e.g. demand generation or
+fulfillment).
+
+Columns:
+ - type: codes into ACTION_TYPES,
+ - asin: ASIN ids (see scse.api.asin),
+ - quantity, schedule: integers,
+ - origin, destination: node names, or None,
+ - uuid: id of the order the action completes, or None.
+
+Action dicts are executed in their order. Within a batch, the orders are
+created first, then the shipments, whatever their order in the batch; an
+Agent needing another order returns several batches (or dicts).
+
+The Environment doesn't modify the batches returned by the Agents.
+"""
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+ACTION_TYPES = ('purchase_order', 'customer_order', 'inbound_shipment', 'outbound_shipment', 'transfer')
+ACTION_TYPE_CODES = {action_type: code for code, action_type in enumerate(ACTION_TYPES)}
+ORDER_TYPES = ('purchase_order', 'customer_order')
+SHIPMENT_TYPES = ('inbound_shipment', 'outbound_shipment', 'transfer')
+
+_FIELDS = ('type', 'asin', 'origin', 'destination', 'quantity', 'schedule', 'uuid')
+
+
+def type_codes(action_types):
+    return [ACTION_TYPE_CODES[action_type] for action_type in action_types]
+
+
+def _column(values, size, dtype=None):
+    # Scalars (e.g. the same schedule for all actions) are repeated.
+    if np.ndim(values) == 0:
+        column = np.empty(size, dtype=object if dtype is None else dtype)
+        column[:] = values
+        return column
+    if dtype is None:
+        column = np.empty(len(values), dtype=object)
+        column[:] = list(values)
+        return column
+    return np.asarray(values, dtype=dtype)
+
+
+class ActionBatch:
+    def __init__(self, type, asin, quantity, schedule, origin=None, destination=None, uuid=None):
+        # Quantities are checked (integer, non negative) by the Environment, like those of action dicts.
+        self.asin = np.asarray(asin)
+        if self.asin.dtype.kind not in 'OU':
+            # ASINs, rather than ids, are translated by the Environment.
+            self.asin = self.asin.astype(np.int64, copy=False)
+        size = len(self.asin)
+        if isinstance(type, str):
+            type = ACTION_TYPE_CODES[type]
+        elif np.ndim(type) and len(type) and isinstance(type[0], str):
+            type = type_codes(type)
+        self.type = _column(type, size, np.int8)
+        self.quantity = np.asarray(quantity) if np.ndim(quantity) else np.full(size, quantity)
+        if size == 0:
+            self.quantity = self.quantity.astype(np.int64)
+        self.schedule = _column(schedule, size, np.int64)
+        self.origin = _column(origin, size)
+        self.destination = _column(destination, size)
+        self.uuid = _column(uuid, size)
+
+        for name in _FIELDS:
+            if len(getattr(self, name)) != size:
+                raise ValueError("Column {} has {} values, expected {}".format(name, len(getattr(self, name)), size))
+
+    @classmethod
+    def from_dicts(cls, actions):
+        actions = list(actions)
+        return cls(type=type_codes([action['type'] for action in actions]),
+                   asin=[action['asin'] for action in actions],
+                   quantity=[action['quantity'] for action in actions],
+                   schedule=[action['schedule'] for action in actions],
+                   origin=[action.get('origin') for action in actions],
+                   destination=[action.get('destination') for action in actions],
+                   uuid=[action.get('uuid') for action in actions])
+
+    @classmethod
+    def concatenate(cls, batches):
+        batches = list(batches)
+        return cls(**{name: np.concatenate([getattr(batch, name) for batch in batches])
+                      for name in _FIELDS})
+
+    def __len__(self):
+        return len(self.asin)
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def __repr__(self):
+        return 'ActionBatch({})'.format(self.to_dicts())
+
+    def take(self, index):
+        """
+        Batch of the actions selected by `index` (a boolean mask or positions).
+        """
+        return ActionBatch(**{name: getattr(self, name)[index] for name in _FIELDS})
+
+    def replace(self, **columns):
+        """
+        Batch with the given columns replaced (the others are shared).
+        """
+        return ActionBatch(**dict({name: getattr(self, name) for name in _FIELDS}, **columns))
+
+    def to_dicts(self):
+        actions = []
+        for action_type, asin, origin, destination, quantity, schedule, uuid in zip(
+                self.type.tolist(), self.asin.tolist(), self.origin.tolist(), self.destination.tolist(),
+                self.quantity.tolist(), self.schedule.tolist(), self.uuid.tolist()):
+            action = {
+                'type': ACTION_TYPES[action_type],
+                'asin': asin,
+                'origin': origin,
+                'destination': destination,
+                'quantity': quantity,
+                'schedule': schedule
+            }
+            # Like action dicts, actions which don't complete an order have no uuid.
+            if uuid is not None:
+                action['uuid'] = uuid
+            actions.append(action)
+        return actions
+
+
+def iter_actions(actions):
+    """
+    Iterate over a list of action dicts and ActionBatches, as dicts.
+    """
+    for action in actions:
+        if isinstance(action, ActionBatch):
+            yield from action.to_dicts()
+        else:
+            yield action
@@ -0,0 +1,72 @@
+"""
+Interned ASINs.
+
+The selection (`context['asin_list']`) is an AsinTable: a sequence of the
+selected ASINs whose positions are their dense integer ids. Inside the
+simulation (actions, orders, shipments, inventory, rewards) ASINs are referred
+to by these ids; ASIN strings are only used at the boundaries (profiles,
+datasets, logs and printing), translated with `id_of()` / `asin_of()`.
+"""
+from collections.abc import Sequence
+import sys
+
+
+class AsinTable(Sequence):
+    def __init__(self, asins):
+        self._asins = [sys.intern(str(asin)) for asin in asins]
+        self._ids = {}
+        for asin_id, asin in enumerate(self._asins):
+            if asin in self._ids:
+                raise ValueError("ASIN {} is selected more than once".format(asin))
+            self._ids[asin] = asin_id
+
+    def __getitem__(self, asin_id):
+        return self._asins[asin_id]
+
+    def __len__(self):
+        return len(self._asins)
+
+    def __contains__(self, asin):
+        return asin in self._ids
+
+    def __iter__(self):
+        return iter(self._asins)
+
+    def __eq__(self, other):
+        if isinstance(other, AsinTable):
+            return self._asins == other._asins
+        return isinstance(other, Sequence) and self._asins == list(other)
+
+    def __repr__(self):
+        return 'AsinTable({!r})'.format(self._asins)
+
+    @property
+    def ids(self):
+        return range(len(self._asins))
+
+    def id_of(self, asin):
+        try:
+            return self._ids[asin]
+        except KeyError:
+            raise KeyError("ASIN {} is not in the selection".format(asin))
+
+    def ids_of(self, asins):
+        """
+        Ids of `asins`, skipping the ones that are not in the selection.
+        """
+        return [self._ids[asin] for asin in asins if asin in self._ids]
+
+    def asin_of(self, asin_id):
+        return self._asins[asin_id]
+
+    def decode(self, record):
+        """
+        Copy of an action, order or shipment dict with its ASIN id replaced by
+        the ASIN, e.g. for printing.
+        """
+        if isinstance(record.get('asin'), int):
+            record = dict(record, asin=self._asins[record['asin']])
+        return record
+
+    def decode_inventory(self, inventory):
+        return {self._asins[asin_id]: quantity for asin_id, quantity in inventory.items()}
@@ -0,0 +1,291 @@
+"""
+Compact network backend.
+
+CSRNetwork stores the topology as arrays: nodes and edges have dense integer
+ids, the out-edges of node i are edges indptr[i]:indptr[i + 1] (sorted by
+origin, i.e. CSR adjacency), and the attributes are typed columns:
+ - node_type (codes into node_types), location and, for the nodes holding
+   inventory, an inventory array of shape (nodes, ASINs),
+ - transit_time per edge, plus the list of shipments in transit on each edge.
+
+Its structure is read-only, but it exposes the same API as networkx for
+reading the network (`nodes(data=True)`, `G.nodes[n]`, `edges(data=True)`,
+`get_edge_data()`, ...). Node and edge data are views on the columns, so that
+the existing modules (and the CLI) work with either backend, while the
+Environment and the network helpers use the arrays directly.
+
+Profiles choose the backend with their "network_backend" key ("networkx",
+the default, or "csr"); the network built by the topology module is then
+converted with `CSRNetwork.from_networkx()`.
+"""
+from collections.abc import Mapping, MutableMapping
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+NETWORK_BACKENDS = ('networkx', 'csr')
+
+# Attributes stored as columns; any other attribute is kept in a per node/edge dict.
+_NODE_COLUMNS = ('node_type', 'location', 'inventory')
+_EDGE_COLUMNS = ('transit_time', 'shipments')
+
+
+class CSRNetwork:
+    def __init__(self, node_names, node_types, locations, has_inventory, inventory,
+                 origins, destinations, transit_times, shipments=None, node_attributes=None, edge_attributes=None):
+        """
+        Edges are given as arrays of origin and destination node ids; they are
+        re-ordered by origin.
+        """
+        self.node_names = list(node_names)
+        self._node_ids = {name: node_id for node_id, name in enumerate(self.node_names)}
+        self.node_types = list(dict.fromkeys(node_types))
+        self.node_type = np.array([self.node_types.index(node_type) for node_type in node_types], dtype=np.int16)
+        self.location = np.asarray(locations, dtype=float).reshape(len(self.node_names), 2)
+        self.has_inventory = np.asarray(has_inventory, dtype=bool)
+        self.inventory = np.asarray(inventory, dtype=np.int64)
+
+        origins = np.asarray(origins, dtype=np.int64)
+        destinations = np.asarray(destinations, dtype=np.int64)
+        order = np.argsort(origins, kind='stable')
+        self.edge_origin = origins[order]
+        self.indices = destinations[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(origins, minlength=len(self.node_names)))])
+        self.transit_time = np.asarray(transit_times, dtype=np.int64)[order]
+        shipments = list(shipments) if shipments is not None else [[] for _ in order]
+        self.shipments = [shipments[edge_id] for edge_id in order.tolist()]
+
+        self._node_attributes = list(node_attributes) if node_attributes is not None else [{} for _ in self.node_names]
+        edge_attributes = list(edge_attributes) if edge_attributes is not None else [{} for _ in order]
+        self._edge_attributes = [edge_attributes[edge_id] for edge_id in order.tolist()]
+
+    @classmethod
+    def from_networkx(cls, G, asin_count):
+        node_names = list(G.nodes)
+        node_ids = {name: node_id for node_id, name in enumerate(node_names)}
+        node_types, locations, has_inventory, node_attributes = [], [], [], []
+        inventory = np.zeros((len(node_names), asin_count), dtype=np.int64)
+        for node_id, (node, node_data) in enumerate(G.nodes(data=True)):
+            node_types.append(node_data.get('node_type'))
+            locations.append(node_data.get('location', (np.nan, np.nan)))
+            has_inventory.append('inventory' in node_data)
+            for asin_id, quantity in node_data.get('inventory', {}).items():
+                inventory[node_id, asin_id] = quantity
+            node_attributes.append({key: value for key, value in node_data.items() if key not in _NODE_COLUMNS})
+
+        origins, destinations, transit_times, edge_attributes, shipments = [], [], [], [], []
+        for origin, destination, edge_data in G.edges(data=True):
+            origins.append(node_ids[origin])
+            destinations.append(node_ids[destination])
+            transit_times.append(edge_data['transit_time'])
+            shipments.append(list(edge_data.get('shipments', [])))
+            edge_attributes.append({key: value for key, value in edge_data.items() if key not in _EDGE_COLUMNS})
+
+        return cls(node_names, node_types, locations, has_inventory, inventory,
+                   origins, destinations, transit_times, shipments, node_attributes, edge_attributes)
+
+    # Ids
+
+    def node_id(self, node):
+        return self._node_ids[node]
+
+    def edge_id(self, origin, destination):
+        """
+        Id of the edge from `origin` to `destination` (node names), or None.
+        """
+        origin_id = self._node_ids.get(origin)
+        destination_id = self._node_ids.get(destination)
+        if origin_id is None or destination_id is None:
+            return None
+        start, end = self.indptr[origin_id], self.indptr[origin_id + 1]
+        matches = np.flatnonzero(self.indices[start:end] == destination_id)
+        return int(start + matches[0]) if len(matches) else None
+
+    def nodes_of_type(self, node_type):
+        """
+        Boolean mask of the nodes of type `node_type`.
+        """
+        if node_type not in self.node_types:
+            return np.zeros(len(self.node_names), dtype=bool)
+        return self.node_type == self.node_types.index(node_type)
+
+    # networkx-compatible (read-only) API
+
+    @property
+    def nodes(self):
+        return _NodeView(self)
+
+    def edges(self, data=False):
+        for edge_id, (origin_id, destination_id) in enumerate(zip(self.edge_origin.tolist(), self.indices.tolist())):
+            origin, destination = self.node_names[origin_id], self.node_names[destination_id]
+            if data:
+                yield origin, destination, _EdgeData(self, edge_id)
+            else:
+                yield origin, destination
+
+    def get_edge_data(self, origin, destination, default=None):
+        edge_id = self.edge_id(origin, destination)
+        return default if edge_id is None else _EdgeData(self, edge_id)
+
+    def has_node(self, node):
+        return node in self._node_ids
+
+    def has_edge(self, origin, destination):
+        return self.edge_id(origin, destination) is not None
+
+    def successors(self, node):
+        node_id = self._node_ids[node]
+        return iter([self.node_names[i] for i in self.indices[self.indptr[node_id]:self.indptr[node_id + 1]].tolist()])
+
+    def predecessors(self, node):
+        node_id = self._node_ids[node]
+        return iter([self.node_names[i] for i in self.edge_origin[self.indices == node_id].tolist()])
+
+    def number_of_nodes(self):
+        return len(self.node_names)
+
+    def number_of_edges(self):
+        return len(self.indices)
+
+    def __contains__(self, node):
+        return node in self._node_ids
+
+    def __iter__(self):
+        return iter(self.node_names)
+
+    def __len__(self):
+        return len(self.node_names)
+
+    def __getitem__(self, node):
+        # Like networkx, the adjacency of `node`: {successor: edge data}
+        node_id = self._node_ids[node]
+        return {self.node_names[self.indices[edge_id]]: _EdgeData(self, edge_id)
+                for edge_id in range(self.indptr[node_id], self.indptr[node_id + 1])}
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("The structure of a CSRNetwork is read-only")
+
+    add_node = add_nodes_from = add_edge = add_edges_from = _read_only
+    remove_node = remove_nodes_from = remove_edge = remove_edges_from = _read_only
+
+
+class _NodeView(Mapping):
+    def __init__(self, network):
+        self._network = network
+
+    def __call__(self, data=False):
+        if data:
+            return [(name, _NodeData(self._network, node_id)) for node_id, name in enumerate(self._network.node_names)]
+        return list(self._network.node_names)
+
+    def __getitem__(self, node):
+        return _NodeData(self._network, self._network.node_id(node))
+
+    def __iter__(self):
+        return iter(self._network.node_names)
+
+    def __len__(self):
+        return len(self._network.node_names)
+
+
+class _NodeData(MutableMapping):
+    # The attributes of a node, as a dict would hold them with networkx.
+    def __init__(self, network, node_id):
+        self._network = network
+        self._node_id = node_id
+
+    def _keys(self):
+        keys = ['node_type']
+        if not np.isnan(self._network.location[self._node_id]).any():
+            keys.append('location')
+        if self._network.has_inventory[self._node_id]:
+            keys.append('inventory')
+        return keys + list(self._network._node_attributes[self._node_id])
+
+    def __getitem__(self, key):
+        network, node_id = self._network, self._node_id
+        if key == 'node_type':
+            return network.node_types[network.node_type[node_id]]
+        if key == 'location' and not np.isnan(network.location[node_id]).any():
+            return tuple(network.location[node_id].tolist())
+        if key == 'inventory' and network.has_inventory[node_id]:
+            return _Inventory(network.inventory[node_id])
+        return network._node_attributes[node_id][key]
+
+    def __setitem__(self, key, value):
+        if key in _NODE_COLUMNS:
+            raise TypeError("Node attribute {} of a CSRNetwork is read-only".format(key))
+        self._network._node_attributes[self._node_id][key] = value
+
+    def __delitem__(self, key):
+        if key in _NODE_COLUMNS:
+            raise TypeError("Node attribute {} of a CSRNetwork is read-only".format(key))
+        del self._network._node_attributes[self._node_id][key]
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _Inventory(MutableMapping):
+    # {ASIN id: quantity}, over a row of the inventory array
+    def __init__(self, row):
+        self._row = row
+
+    def __getitem__(self, asin_id):
+        return int(self._row[asin_id])
+
+    def __setitem__(self, asin_id, quantity):
+        self._row[asin_id] = quantity
+
+    def __delitem__(self, asin_id):
+        self._row[asin_id] = 0
+
+    def __iter__(self):
+        return iter(range(len(self._row)))
+
+    def __len__(self):
+        return len(self._row)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _EdgeData(MutableMapping):
+    def __init__(self, network, edge_id):
+        self._network = network
+        self._edge_id = edge_id
+
+    def __getitem__(self, key):
+        if key == 'transit_time':
+            return int(self._network.transit_time[self._edge_id])
+        if key == 'shipments':
+            return self._network.shipments[self._edge_id]
+        return self._network._edge_attributes[self._edge_id][key]
+
+    def __setitem__(self, key, value):
+        if key == 'transit_time':
+            self._network.transit_time[self._edge_id] = value
+        elif key == 'shipments':
+            self._network.shipments[self._edge_id] = value
+        else:
+            self._network._edge_attributes[self._edge_id][key] = value
+
+    def __delitem__(self, key):
+        if key in _EDGE_COLUMNS:
+            raise TypeError("Edge attribute {} of a CSRNetwork can't be removed".format(key))
+        del self._network._edge_attributes[self._edge_id][key]
+
+    def __iter__(self):
+        return iter(list(_EDGE_COLUMNS) + list(self._network._edge_attributes[self._edge_id]))
+
+    def __len__(self):
+        return len(_EDGE_COLUMNS) + len(self._network._edge_attributes[self._edge_id])
+
+    def __repr__(self):
+        return repr(dict(self))
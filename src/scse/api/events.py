@@ -0,0 +1,44 @@
+"""
+Notifications of the changes the Environment makes to the state.
+
+Modules (and metrics) which define `subscribe(events)` are given the
+EventBus of the Environment when it is created, and can subscribe callbacks
+to the changes they need to track, instead of scanning the state at every
+step:
+ - INVENTORY_CHANGED(node, asin, quantity): the inventory of an ASIN (id) at
+   a node changed by `quantity` (negative when it decreased),
+ - ORDER_CREATED(order), ORDER_REMOVED(order): an order (dict) was added to or
+   removed from the state (updating an order removes then creates it),
+ - SHIPMENT_CREATED(shipment), SHIPMENT_ARRIVED(shipment): a shipment (dict)
+   left its origin, or arrived at its destination.
+
+Callbacks are called synchronously, while the Environment updates the state.
+"""
+INVENTORY_CHANGED = 'inventory_changed'
+ORDER_CREATED = 'order_created'
+ORDER_REMOVED = 'order_removed'
+SHIPMENT_CREATED = 'shipment_created'
+SHIPMENT_ARRIVED = 'shipment_arrived'
+
+EVENT_TYPES = (INVENTORY_CHANGED, ORDER_CREATED, ORDER_REMOVED, SHIPMENT_CREATED, SHIPMENT_ARRIVED)
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers = {event_type: [] for event_type in EVENT_TYPES}
+
+    def subscribe(self, event_type, callback):
+        if event_type not in self._subscribers:
+            raise ValueError("Unknown event type {}, expected one of {}".format(event_type, EVENT_TYPES))
+        self._subscribers[event_type].append(callback)
+
+    def wants(self, event_type):
+        """
+        Whether anyone subscribed to `event_type`; publishers can skip
+        preparing events nobody listens to.
+        """
+        return bool(self._subscribers[event_type])
+
+    def publish(self, event_type, *args):
+        for callback in self._subscribers[event_type]:
+            callback(*args)
@@ -19,6 +19,26 @@ class Module(abc.ABC):
         Return the Agent's unique name.
         """
 
+    def is_asin_separable(self):
+        """
+        Return True if the module treats every ASIN independently of the others
+        (e.g. no capacity or budget shared between ASINs), so that a run can be
+        split into runs over subsets of the ASINs (see scse.controller.sharding).
+        """
+        return False
+
+    def subscribe(self, events):
+        """
+        Subscribe to the changes of the state, published on the EventBus
+        `events` of the Environment (see scse.api.events).
+        """
+
+    def close(self):
+        """
+        Release the resources held for the run (e.g. threads, open files),
+        when the Environment is closed. The module may be reset again.
+        """
+
 
 class Env(Module):
     """
@@ -60,8 +80,9 @@ class Agent(Module):
         Compute new actions taken by the Agent given the most recent `state`.
 
         `state` are values and deterministically define the Environment
-        (hosting the agent). `state` is mutable, but can only be changed by the
-        Environment as the Environment reacts to actions returned by Agents.
+        (hosting the agent). `state` can only be changed by the Environment as
+        the Environment reacts to actions returned by Agents: Agents get a
+        read-only view of it (see scse.api.state_view).
 
         Note that as `context` hasn't changed since `reset()`, it is therefore
         not provided again as an argument.
@@ -70,3 +91,29 @@ class Agent(Module):
 
         """
         return []
+
+    async def compute_actions_async(self, state):
+        """
+        Coroutine version of `compute_actions()`, for Agents which wait on I/O
+        (e.g. a model or an optimizer behind a service). Agents overriding it
+        are run on an asyncio event loop instead of calling `compute_actions()`.
+
+        Consecutive async Agents of the profile are awaited concurrently: they
+        all get the state as it is before any of them acts, and their actions
+        are executed in the order of the profile. The run parameter
+        `agent_time_budget` (seconds, for all of them or as a dict by Agent
+        name) bounds how long they are awaited; an Agent exceeding its budget
+        takes no actions at that step.
+        """
+        return self.compute_actions(state)
+
+    def get_next_wakeup(self, state):
+        """
+        Return the clock at which the Agent next needs to compute actions, or
+        None if it must do so at every timestep (the default).
+
+        Only used when the Environment advances time from event to event, in
+        which case timesteps where no Agent needs to run, no action is scheduled
+        and no shipment arrives are skipped.
+        """
+        return None
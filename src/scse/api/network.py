@@ -1,7 +1,21 @@
-import networkx as nx
+"""
+Helpers to query the network state. ASINs are referred to by their ids (see
+scse.api.asin), which are also the keys of the nodes' inventory.
+
+The helpers work with both network backends, and with their read-only views
+(see scse.api.state_view); with a CSRNetwork they read its arrays directly.
+"""
+from scse.api.csr_network import CSRNetwork
+
+
+def _is_csr(G):
+    return isinstance(G, CSRNetwork) or getattr(G, 'is_csr', False)
 
 
 def get_asin_inventory_in_network(G, asin):
+    if _is_csr(G):
+        return int(G.inventory[:, asin].sum())
+
     total_asin_inventory = 0
     for _, node_data in G.nodes(data=True):
         total_asin_inventory += node_data.get('inventory', {}).get(asin, 0)
@@ -10,6 +24,13 @@ def get_asin_inventory_in_network(G, asin):
 
 
 def get_asin_inventory_on_all_inbound_arcs(G, asin):
+    if _is_csr(G):
+        amazon_fcs = ~(G.nodes_of_type('customer') | G.nodes_of_type('vendor'))
+        return sum(shipment['quantity']
+                   for edge_id in amazon_fcs[G.indices].nonzero()[0].tolist()
+                   for shipment in G.shipments[edge_id]
+                   if shipment['asin'] == asin)
+
     amazon_fcs = set()
     for node, node_data in G.nodes(data=True):
         if node_data.get('node_type') not in ['customer', 'vendor']:
@@ -19,17 +40,25 @@ def get_asin_inventory_on_all_inbound_arcs(G, asin):
     for origin, destination, edge_data in G.edges(data=True):
         if destination in amazon_fcs:
             for shipment in edge_data['shipments']:
-                total_arc_inventory += shipment['quantity']
+                if shipment['asin'] == asin:
+                    total_arc_inventory += shipment['quantity']
 
     return total_arc_inventory
 
 
 def get_asin_inventory_on_inbound_arcs_to_node(G, asin, node):
+    if _is_csr(G):
+        return sum(shipment['quantity']
+                   for edge_id in (G.indices == G.node_id(node)).nonzero()[0].tolist()
+                   for shipment in G.shipments[edge_id]
+                   if shipment['asin'] == asin)
+
     total_arc_inbound_to_node = 0
     for origin, destination, edge_data in G.edges(data=True):
         if destination == node:
             for shipment in edge_data['shipments']:
-                total_arc_inbound_to_node += shipment['quantity']
+                if shipment['asin'] == asin:
+                    total_arc_inbound_to_node += shipment['quantity']
     return total_arc_inbound_to_node
 
 
@@ -40,7 +69,7 @@ def get_asin_inventory_on_inbound_arcs_to_node_by_arrival_time(
         if destination == node:
             for shipment in edge_data['shipments']:
                 arrival_time = shipment['time_until_arrival']
-                if arrival_time > 0:
+                if arrival_time > 0 and shipment['asin'] == asin:
                     total_arc_inbound_to_node[arrival_time -
                                               1] += shipment['quantity']
 
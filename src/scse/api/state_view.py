@@ -0,0 +1,262 @@
+"""
+Read-only views of the state, given to the Agents instead of the live state.
+
+The Environment owns the state: Agents only read it, and change it through
+their actions. Copying the state for every Agent call would cost as much as
+the state is large, so Agents get views instead, created in O(1) whatever the
+size of the state. The run parameter `state_view` chooses how much they check:
+ - 'release' (the default): the state is a `types.MappingProxyType`, so its
+   entries can't be replaced, and nothing else is checked (nested values are
+   the live ones),
+ - 'strict': every value read from the view is itself a read-only view, down
+   to the node and edge data of the network, the inventory, the orders and
+   the shipments; any attempt to modify them raises a TypeError. Views are
+   created as the values are read, which slows the Agents down: use it to
+   debug (or test) Agents, not for production runs,
+ - 'off': the Agents get the live state.
+
+With 'strict', the network is a NetworkView, which exposes the networkx API
+for reading the network (`nodes(data=True)`, `G.nodes[n]`, `edges(data=True)`,
+`get_edge_data()`, ...) and, for a CSRNetwork, its (read-only) arrays; it
+can't be passed to networkx algorithms. Numpy arrays are read-only views,
+sets are frozen, other objects are returned as they are.
+"""
+from collections.abc import Iterator, Mapping, Sequence
+import sys
+import types
+from scse.api.csr_network import CSRNetwork
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+STATE_VIEW_MODES = ('strict', 'release', 'off')
+
+# Methods of the networks which modify them.
+_NETWORK_MUTATORS = frozenset(['add_node', 'add_nodes_from', 'add_edge', 'add_edges_from', 'add_weighted_edges_from',
+                               'remove_node', 'remove_nodes_from', 'remove_edge', 'remove_edges_from', 'update',
+                               'clear', 'clear_edges'])
+
+
+def state_view(state, mode='release'):
+    """
+    The view of `state` given to the Agents with the view `mode`.
+    """
+    if mode == 'strict':
+        return FrozenMapping(state)
+    if mode == 'release':
+        return types.MappingProxyType(state)
+    if mode == 'off':
+        return state
+    raise ValueError("Unknown state view {}, expected one of {}".format(mode, STATE_VIEW_MODES))
+
+
+def freeze(value):
+    """
+    A read-only view of `value` (or `value` itself, when it can't be modified
+    or can't be wrapped).
+    """
+    if value is None or isinstance(value, (str, int, float, FrozenMapping, FrozenSequence, NetworkView)):
+        return value
+    if isinstance(value, Mapping):
+        return FrozenMapping(value)
+    if isinstance(value, (list, tuple)):
+        return FrozenSequence(value)
+    if _is_network(value):
+        return NetworkView(value)
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, Iterator):
+        return (freeze(item) for item in value)
+    return value
+
+
+def _is_network(value):
+    # Without importing networkx: if it isn't imported, value can't be a networkx graph.
+    if isinstance(value, CSRNetwork):
+        return True
+    networkx = sys.modules.get('networkx')
+    return networkx is not None and isinstance(value, networkx.Graph)
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("The state is read-only: Agents change it through their actions")
+
+
+class FrozenMapping(Mapping):
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+    def __getitem__(self, key):
+        return freeze(self._mapping[key])
+
+    def __iter__(self):
+        return iter(self._mapping)
+
+    def __len__(self):
+        return len(self._mapping)
+
+    def __contains__(self, key):
+        return key in self._mapping
+
+    def __repr__(self):
+        return 'FrozenMapping({!r})'.format(self._mapping)
+
+    __setitem__ = __delitem__ = _read_only
+    update = pop = popitem = setdefault = clear = _read_only
+
+
+class FrozenSequence(Sequence):
+    def __init__(self, items):
+        self._items = items
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return FrozenSequence(self._items[index])
+        return freeze(self._items[index])
+
+    def __iter__(self):
+        return map(freeze, self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenSequence):
+            other = other._items
+        if not isinstance(other, (list, tuple)):
+            return NotImplemented
+        return len(self._items) == len(other) and all(a == b for a, b in zip(self._items, other))
+
+    def __hash__(self):
+        return hash(tuple(self._items))
+
+    def __repr__(self):
+        return 'FrozenSequence({!r})'.format(self._items)
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = remove = pop = clear = sort = reverse = _read_only
+
+
+class NetworkView:
+    """
+    Read-only view of a network (networkx graph or CSRNetwork).
+    """
+    def __init__(self, network):
+        self._network = network
+        self.is_csr = isinstance(network, CSRNetwork)
+
+    @property
+    def nodes(self):
+        return _NodesView(self._network)
+
+    @property
+    def edges(self):
+        return _EdgesView(self._network)
+
+    def get_edge_data(self, origin, destination, default=None):
+        return freeze(self._network.get_edge_data(origin, destination, default))
+
+    def has_node(self, node):
+        return self._network.has_node(node)
+
+    def has_edge(self, origin, destination):
+        return self._network.has_edge(origin, destination)
+
+    def successors(self, node):
+        return iter(list(self._network.successors(node)))
+
+    neighbors = successors
+
+    def predecessors(self, node):
+        return iter(list(self._network.predecessors(node)))
+
+    def number_of_nodes(self):
+        return self._network.number_of_nodes()
+
+    def number_of_edges(self):
+        return self._network.number_of_edges()
+
+    def __contains__(self, node):
+        return node in self._network
+
+    def __iter__(self):
+        return iter(self._network)
+
+    def __len__(self):
+        return len(self._network)
+
+    def __getitem__(self, node):
+        return freeze(self._network[node])
+
+    def __getattr__(self, name):
+        # Further attributes (the arrays of a CSRNetwork, ...) are frozen, as are the results of methods.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in _NETWORK_MUTATORS:
+            raise TypeError("The network is read-only: Agents change it through their actions")
+        value = getattr(self._network, name)
+        if callable(value):
+            return lambda *args, **kwargs: freeze(value(*args, **kwargs))
+        return freeze(value)
+
+    def __repr__(self):
+        return 'NetworkView({!r})'.format(self._network)
+
+
+class _NodesView(Mapping):
+    # Like G.nodes with networkx: {node: node data}, which can also be called as G.nodes(data=...)
+    def __init__(self, network):
+        self._nodes = network.nodes
+
+    def __call__(self, data=False, default=None):
+        if data is False:
+            return list(self._nodes)
+        if data is True:
+            return [(node, freeze(node_data)) for node, node_data in self._nodes(data=True)]
+        return [(node, freeze(node_data.get(data, default))) for node, node_data in self._nodes(data=True)]
+
+    def __getitem__(self, node):
+        return freeze(self._nodes[node])
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+
+class _EdgesView:
+    # Like G.edges with networkx: G.edges(data=...), and G.edges[origin, destination] for the edge data
+    def __init__(self, network):
+        self._network = network
+
+    def __call__(self, data=False, default=None):
+        if data is False:
+            return [(origin, destination) for origin, destination in self._network.edges()]
+        edges = self._network.edges(data=True)
+        if data is True:
+            return [(origin, destination, freeze(edge_data)) for origin, destination, edge_data in edges]
+        return [(origin, destination, freeze(edge_data.get(data, default))) for origin, destination, edge_data in edges]
+
+    def __getitem__(self, edge):
+        origin, destination = edge
+        edge_data = self._network.get_edge_data(origin, destination)
+        if edge_data is None:
+            raise KeyError(edge)
+        return freeze(edge_data)
+
+    def __iter__(self):
+        return iter(self())
+
+    def __len__(self):
+        return self._network.number_of_edges()
+
+    def __contains__(self, edge):
+        return self._network.has_edge(*edge)
@@ -0,0 +1,143 @@
+"""
+Preallocated history of the state of a run.
+
+With the run parameter `record_history=True`, the Environment fills a
+StateHistory as it steps, in arrays preallocated for the whole horizon (and
+grown, doubling their capacity, for steps past it, e.g. a notebook stepping
+on after the horizon):
+ - inventory: on-hand inventory (steps x nodes x ASINs), after each step,
+ - in_transit: quantity in transit to each node (steps x nodes x ASINs),
+ - executed: quantity of the executed actions of each type
+   (steps x ACTION_TYPES x ASINs); `demand` and `sales` are the customer
+   orders and outbound shipments,
+ - reward: reward of each ASIN (steps x ASINs).
+
+The arrays are exposed as views up to the last recorded step: `array()`
+returns them with their dimension names and coordinates (like an xarray
+DataArray), `frame()` as pandas DataFrames indexed by clock, sharing their
+memory.
+"""
+from collections import namedtuple
+from scse.api.actions import ACTION_TYPES, ACTION_TYPE_CODES
+from scse.api.csr_network import CSRNetwork
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# An array with the names of its dimensions and their coordinates, e.g.
+# dims ('clock', 'asin') and coords {'clock': [...], 'asin': [...]}.
+LabeledArray = namedtuple('LabeledArray', ['values', 'dims', 'coords'])
+
+_NODE_ARRAYS = ('inventory', 'in_transit')
+_ASIN_ARRAYS = ('demand', 'sales', 'reward')
+_FLOWS = {'demand': 'customer_order', 'sales': 'outbound_shipment'}
+
+
+class StateHistory:
+    def __init__(self, asin_list, node_names, steps):
+        self.asin_list = asin_list
+        self.node_names = list(node_names)
+        self._node_ids = {name: node_id for node_id, name in enumerate(self.node_names)}
+        self.capacity = steps
+        self.count = 0
+
+        shape = (steps, len(self.node_names), len(asin_list))
+        self.clock = np.zeros(steps, dtype=np.int64)
+        self.inventory = np.zeros(shape, dtype=np.int64)
+        self.in_transit = np.zeros(shape, dtype=np.int64)
+        self.executed = np.zeros((steps, len(ACTION_TYPES), len(asin_list)), dtype=np.int64)
+        self.reward = np.zeros((steps, len(asin_list)))
+        self.total_reward = np.zeros(steps)
+
+    def _reserve(self):
+        # Room for the step being recorded: past the capacity, the arrays are doubled.
+        if self.count < self.capacity:
+            return
+        capacity = max(2 * self.capacity, 1)
+        for name in ('clock', 'inventory', 'in_transit', 'executed', 'reward', 'total_reward'):
+            values = getattr(self, name)
+            grown = np.zeros((capacity,) + values.shape[1:], dtype=values.dtype)
+            grown[:self.capacity] = values
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def add_executed(self, type_codes, asin_ids, quantities):
+        # Actions executed during the step being recorded; several may concern the same ASIN.
+        self._reserve()
+        np.add.at(self.executed[self.count], (type_codes, asin_ids), quantities)
+
+    def add_executed_action(self, action):
+        self._reserve()
+        self.executed[self.count, ACTION_TYPE_CODES[action['type']], action['asin']] += action['quantity']
+
+    def record(self, clock, state, reward):
+        """
+        Record the state after the step which started at `clock`.
+        """
+        self._reserve()
+        step = self.count
+        self.clock[step] = clock
+        G = state.get('network')
+        shipments, destinations = [], []
+        if isinstance(G, CSRNetwork):
+            self.inventory[step] = G.inventory
+            for edge_id, edge_shipments in enumerate(G.shipments):
+                shipments += edge_shipments
+                destinations += [int(G.indices[edge_id])] * len(edge_shipments)
+        elif G is not None:
+            for node, node_data in G.nodes(data=True):
+                inventory = node_data.get('inventory')
+                if inventory:
+                    row = self.inventory[step, self._node_ids[node]]
+                    for asin_id, quantity in inventory.items():
+                        row[asin_id] = quantity
+            shipments = [shipment for _, _, edge_data in G.edges(data=True) for shipment in edge_data['shipments']]
+            destinations = [self._node_ids[shipment['destination']] for shipment in shipments]
+        if shipments:
+            np.add.at(self.in_transit[step], (destinations, [shipment['asin'] for shipment in shipments]),
+                      [shipment['quantity'] for shipment in shipments])
+        self.reward[step] = reward['timestep_reward']['by_asin']
+        self.total_reward[step] = reward['timestep_reward']['total']
+        self.count += 1
+
+    def _values(self, name):
+        count = self.count
+        if name in _NODE_ARRAYS:
+            return getattr(self, name)[:count]
+        if name in _FLOWS:
+            return self.executed[:count, ACTION_TYPE_CODES[_FLOWS[name]]]
+        if name == 'reward':
+            return self.reward[:count]
+        raise ValueError("Unknown history array {}, expected one of {}".format(name, _NODE_ARRAYS + _ASIN_ARRAYS))
+
+    def array(self, name):
+        """
+        The recorded steps of an array, as a LabeledArray (a view, not a copy).
+        """
+        values = self._values(name)
+        coords = {'clock': self.clock[:self.count], 'asin': list(self.asin_list)}
+        if name in _NODE_ARRAYS:
+            coords['node'] = self.node_names
+            return LabeledArray(values, ('clock', 'node', 'asin'), coords)
+        return LabeledArray(values, ('clock', 'asin'), coords)
+
+    def frame(self, name):
+        """
+        The recorded steps of an array, as a DataFrame indexed by clock, with a
+        column per ASIN (per (node, ASIN) for inventory and in_transit). The
+        DataFrame shares the memory of the history.
+        """
+        values = self._values(name)
+        index = pd.Index(self.clock[:self.count], name='clock')
+        if name in _NODE_ARRAYS:
+            columns = pd.MultiIndex.from_product([self.node_names, list(self.asin_list)], names=['node', 'asin'])
+            # Merging the last two dimensions of a contiguous array is a view.
+            values = values.reshape(len(values), -1)
+        else:
+            columns = pd.Index(list(self.asin_list), name='asin')
+        return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+    def total_reward_series(self):
+        return pd.Series(self.total_reward[:self.count], index=pd.Index(self.clock[:self.count], name='clock'),
+                         name='reward', copy=False)
@@ -3,20 +3,114 @@ Naive Supply Chain environment/controller.
 """
 
 import logging
-import networkx as nx
 import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from scse.api.actions import ActionBatch, ACTION_TYPES, type_codes, ORDER_TYPES
+from scse.api.asin import AsinTable
+from scse.api.csr_network import CSRNetwork, NETWORK_BACKENDS
+from scse.api.events import (EventBus, INVENTORY_CHANGED, ORDER_CREATED, ORDER_REMOVED, SHIPMENT_CREATED,
+                             SHIPMENT_ARRIVED)
 from scse.api.module import Agent
 from scse.api.module import Env
+from scse.api.state_view import state_view, STATE_VIEW_MODES
+from scse.controller.history import StateHistory
+from scse.controller.snapshot import load_snapshot, save_snapshot
+from scse.controller.trace import ActionTrace, ActionTraceRecorder
+from scse.utils.lazy import lazy_import
 from scse.utils.printer import red
 from scse.utils.uuid import short_uuid
 from scse.services.service_registry import singleton as registry
-from scse.profiles.profile import load_profile, instantiate_class
 
-# TODO Right now, let's log all by setting DEBUG at the root level...
-# Later remove and let it be configured.
+np = lazy_import('numpy')
+# Only needed with async Agents.
+asyncio = lazy_import('asyncio')
+
+# Logging is configured by the entry points (cli, notebook, batch).
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
+
+
+"""
+Compact record of a single step, as yielded by SupplyChainEnvironment.iter_steps():
+ - clock, date_time: when the step started,
+ - reward, episode_reward: the step's total reward and the cumulative one,
+ - reward_by_asin: array of the step's reward per ASIN, in context['asin_list'] order,
+ - aggregates: tuple of the requested state aggregates, computed after the step.
+"""
+StepRecord = namedtuple('StepRecord', ['clock', 'date_time', 'reward', 'episode_reward',
+                                       'reward_by_asin', 'aggregates'])
+
+
+def _on_hand_inventory(state):
+    return sum(sum(node_data.get('inventory', {}).values())
+               for _, node_data in state['network'].nodes(data=True))
+
+
+def _in_transit_quantity(state):
+    return sum(shipment['quantity']
+               for _, _, edge_data in state['network'].edges(data=True)
+               for shipment in edge_data['shipments'])
+
+
+def _open_customer_orders(state):
+    return len(state['customer_orders'])
+
+
+def _open_purchase_orders(state):
+    return len(state['purchase_orders'])
+
+
+# State aggregates that iter_steps() can compute by name.
+STATE_AGGREGATES = {
+    'on_hand_inventory': _on_hand_inventory,
+    'in_transit_quantity': _in_transit_quantity,
+    'open_customer_orders': _open_customer_orders,
+    'open_purchase_orders': _open_purchase_orders,
+}
+
+
+def reward_by_asin_dict(reward_by_asin, asin_list):
+    """
+    Dict view {asin: reward} of an array of rewards indexed by ASIN id.
+    """
+    return dict(zip(asin_list, reward_by_asin.tolist()))
+
+
+def _is_async(agent):
+    return type(agent).compute_actions_async is not Agent.compute_actions_async
+
+
+def _agent_groups(agents):
+    # Every synchronous Agent on its own, consecutive async Agents together.
+    groups = []
+    for agent in agents:
+        if groups and _is_async(agent) and _is_async(groups[-1][0]):
+            groups[-1].append(agent)
+        else:
+            groups.append([agent])
+    return groups
+
+
+def _agent_time_budgets(budget, agent_names):
+    # {Agent name: seconds}, from a budget for every Agent or a dict of budgets.
+    if budget is None:
+        return {}
+    if not isinstance(budget, dict):
+        return dict.fromkeys(agent_names, budget)
+    unknown = set(budget) - set(agent_names)
+    if unknown:
+        raise ValueError("Time budgets for unknown Agents {}, expected some of {}".format(sorted(unknown), agent_names))
+    return dict(budget)
+
+
+def _metric_name(metric):
+    get_name = getattr(metric, 'get_name', None)
+    return get_name() if get_name is not None else type(metric).__name__
+
+
+def _is_env_only(module_class):
+    return issubclass(module_class, Env) and not issubclass(module_class, Agent)
 
 
 class SupplyChainEnvironment:
@@ -32,47 +126,197 @@ class SupplyChainEnvironment:
                  start_date = '2019-01-01', # simulation start date
                  time_increment = 'daily',  # timestep increment
                  time_horizon = 100,        # timestep horizon
-                 asin_selection = 1):       # how many / which asins to simulate
+                 asin_selection = 1,        # how many / which asins to simulate
+                 time_advance = 'fixed',    # 'fixed' steps every time_increment, 'next_event' jumps to the next event
+                 **module_parameters):      # any further parameters, passed along to the modules
 
         self._program_start_time = time.time()
         self._miniscot_time_profile = {}
+        self._asin_list = None
 
         self._start_date = start_date
         self._time_increment = time_increment
         self._time_horizon = time_horizon
 
+        if time_advance not in ['fixed', 'next_event']:
+            raise ValueError("Unknown time advance arg {}".format(time_advance))
+        self._time_advance = time_advance
+
+        # Resolved here rather than at import, like the modules of the profile:
+        # importing the controller must stay cheap for every worker process.
+        from scse.profiles.profile import load_profile, load_class, instantiate_class
         profile_config = load_profile(profile)
+        self._profile = profile
+        self._simulation_seed = simulation_seed
+
+        # The profile chooses how the network is represented (see scse.api.csr_network).
+        self._network_backend = module_parameters.get('network_backend',
+                                                      profile_config.get('network_backend', 'networkx'))
+        if self._network_backend not in NETWORK_BACKENDS:
+            raise ValueError("Unknown network backend {}".format(self._network_backend))
+
+        # Each run gets its own scope of service instances, so that runs
+        # executing in parallel in the same process do not share them.
+        self._service_registry = registry.scoped()
+
+        run_parameters = dict(module_parameters,
+                              simulation_seed = simulation_seed,
+                              start_date = start_date,
+                              time_increment = time_increment,
+                              time_horizon = time_horizon,
+                              asin_selection = asin_selection,
+                              time_advance = time_advance,
+                              service_registry = self._service_registry)
 
         # Invariant: order should not be relevant.
-        self._metrics = [instantiate_class(class_name,
-                                           simulation_seed = simulation_seed,
-                                           start_date = start_date,
-                                           time_increment = time_increment,
-                                           time_horizon = time_horizon,
-                                           asin_selection = asin_selection)
-                         for class_name in profile_config['metrics']]
-
-        # TODO For now, only a single metric module is supported.
-        if len(self._metrics) != 1:
-            raise ValueError("miniSCOT supports only a single metric. " +
-                             "{} were specified.".format(len(self._metrics)))
-        self._metrics = self._metrics[0]
-
-        self._modules = [instantiate_class(class_name,
-                                           simulation_seed = simulation_seed,
-                                           start_date = start_date,
-                                           time_increment = time_increment,
-                                           time_horizon = time_horizon,
-                                           asin_selection = asin_selection)
-                         for class_name in profile_config['modules']]
+        self._metric_modules = [instantiate_class(class_name, **run_parameters)
+                                for class_name in profile_config['metrics']]
+        if not self._metric_modules:
+            raise ValueError("The profile {} has no metric".format(profile))
+
+        # Every metric gets its own reward namespace; the primary one is the reward of the run.
+        self._metric_names = [_metric_name(metric) for metric in self._metric_modules]
+        if len(set(self._metric_names)) != len(self._metric_names):
+            raise ValueError("Metric names must be unique, got {}".format(self._metric_names))
+        primary_metric = module_parameters.get('primary_metric',
+                                               profile_config.get('primary_metric', self._metric_names[0]))
+        if primary_metric not in self._metric_names:
+            raise ValueError("Unknown primary metric {}, expected one of {}".format(primary_metric, self._metric_names))
+        self._primary_metric = self._metric_names.index(primary_metric)
+        self._metrics = self._metric_modules[self._primary_metric]
+
+        # Metrics only read the state and update their own, so they are computed concurrently.
+        self._concurrent_metrics = len(self._metric_modules) > 1 and module_parameters.get('concurrent_metrics', True)
+        self._metrics_executor = None
+
+        # Actions of the Agents can be recorded, or replayed from a trace (see scse.controller.trace).
+        self._action_trace_path = module_parameters.get('action_trace')
+        replay_trace = module_parameters.get('replay_trace')
+        self._replay = ActionTrace(replay_trace) if replay_trace is not None else None
+        self._recorder = None
+        # Agents read the state through read-only views (see scse.api.state_view).
+        self._state_view = module_parameters.get('state_view', profile_config.get('state_view', 'release'))
+        if self._state_view not in STATE_VIEW_MODES:
+            raise ValueError("Unknown state view {}, expected one of {}".format(self._state_view, STATE_VIEW_MODES))
+        # Opt-in history of the state, see scse.controller.history.
+        self._record_history = module_parameters.get('record_history', False)
+        self._history = None
+
+        # The initial context and state can come from a snapshot (see scse.controller.snapshot).
+        self._initial_state = module_parameters.get('initial_state')
+        self._initial_state_mmap = module_parameters.get('initial_state_mmap', True)
+        self._initial_state_asins = module_parameters.get('initial_state_asins')
+
+        module_classes = profile_config['modules']
+        if self._initial_state is not None:
+            # The snapshot replaces the contributions of the Env modules.
+            module_classes = [class_name for class_name in module_classes
+                              if not _is_env_only(load_class(class_name))]
+        if self._replay is not None:
+            # The Agents are replaced by the trace.
+            module_classes = [class_name for class_name in module_classes
+                              if not issubclass(load_class(class_name), Agent)]
+        self._modules = [instantiate_class(class_name, **run_parameters)
+                         for class_name in module_classes]
+        # Modules can subscribe to the changes of the state (see scse.api.events).
+        self._events = EventBus()
+        for module in self._modules + self._metric_modules:
+            subscribe = getattr(module, 'subscribe', None)
+            if subscribe is not None:
+                subscribe(self._events)
+
+        if self._replay is not None:
+            self._agent_names = list(self._replay.agent_names)
+        else:
+            self._agent_names = [module.get_name() for module in self._modules if isinstance(module, Agent)]
+
+        # Consecutive async Agents are awaited together, on the event loop of a dedicated thread
+        # (so that it doesn't conflict with a loop the caller may be running, e.g. in a notebook).
+        self._agent_groups = _agent_groups([module for module in self._modules if isinstance(module, Agent)])
+        self._agent_time_budgets = _agent_time_budgets(module_parameters.get('agent_time_budget'), self._agent_names)
+        self._event_loop = None
+        self._agent_executor = None
 
         current_program_time = time.time()
         self._miniscot_time_profile['miniscot_init'] = current_program_time - self._program_start_time
 
+    @property
+    def asin_list(self):
+        """
+        The selected ASINs (an AsinTable), once the environment was initialized.
+        """
+        return self._asin_list
+
+    @property
+    def modules(self):
+        """
+        The modules of the profile (Env modules and Agents), by name.
+        """
+        return {module.get_name(): module for module in self._modules}
+
+    @property
+    def history(self):
+        """
+        The StateHistory of the run (with the `record_history` run parameter), or None.
+        """
+        return self._history
+
+    @property
+    def metrics(self):
+        """
+        The primary metric.
+        """
+        return self._metrics
+
+    @property
+    def metric_modules(self):
+        """
+        All the metrics, by name.
+        """
+        return dict(zip(self._metric_names, self._metric_modules))
+
+    @property
+    def service_registry(self):
+        """
+        The registry of the services of this run (see scse.services.service_registry).
+        """
+        return self._service_registry
+
+    @property
+    def primary_metric(self):
+        """
+        The name of the metric giving the reward of the run.
+        """
+        return self._metric_names[self._primary_metric]
+
+    @property
+    def time_horizon(self):
+        return self._time_horizon
+
+    @property
+    def episode_rewards(self):
+        """
+        The episode reward of every metric, by name.
+        """
+        return dict(zip(self._metric_names, self._episode_rewards.tolist()))
+
+    @property
+    def time_profile(self):
+        """
+        Wall time (in seconds) spent so far in each phase of the simulation.
+        """
+        return dict(self._miniscot_time_profile)
+
+    def is_asin_separable(self):
+        """
+        Whether all the modules (and the metric) treat ASINs independently.
+        """
+        modules = self._modules + self._metric_modules
+        return all(getattr(module, 'is_asin_separable', lambda: False)() for module in modules)
+
     def get_initial_env_values(self):
         module_start_time = time.time()
         self._context = {}
-        context = {}
         state = {}
         state['clock'] = 0
         start_year = int(self._start_date[0:4])
@@ -80,7 +324,30 @@ class SupplyChainEnvironment:
         start_day = int(self._start_date[-2:])
         state['date_time'] = datetime.datetime(start_year, start_month, start_day)
         self.episode_reward = 0
+        self._episode_rewards = np.zeros(len(self._metric_modules))
+
+        if self._initial_state is not None:
+            # Warm start, see scse.controller.snapshot.
+            context, state = load_snapshot(self._initial_state, self._network_backend, self._initial_state_mmap,
+                                           self._initial_state_asins)
+            self._context = dict(context)
+            self._asin_list = context['asin_list']
+        else:
+            context = self._collect_env_values(state)
+
+        if self._network_backend == 'csr' and 'network' in state and not isinstance(state['network'], CSRNetwork):
+            state['network'] = CSRNetwork.from_networkx(state['network'], len(self._asin_list))
+
+        if self._record_history:
+            self._history = StateHistory(self._asin_list, list(state.get('network', [])), self._time_horizon)
+
+        module_end_time = time.time()
+        self._miniscot_time_profile['initial_env_values'] = module_end_time - module_start_time
 
+        return context, state
+
+    def _collect_env_values(self, state):
+        context = {}
         # TODO Should we treat this as context or state?
         state['customer_orders'] = []
         state['purchase_orders'] = []
@@ -100,6 +367,12 @@ class SupplyChainEnvironment:
                     context[module.get_name()] = module_context
                     self._context[module.get_name()] = module_context
 
+        # Inside the simulation ASINs are referred to by their id in the selection.
+        if not isinstance(context.get('asin_list'), AsinTable):
+            context['asin_list'] = AsinTable(context.get('asin_list', []))
+            self._context['asin_list'] = context['asin_list']
+        self._asin_list = context['asin_list']
+
         for module in self._modules:
             if isinstance(module, Env):
                 logger.debug("Getting initial state from Env: {}.".format(
@@ -109,10 +382,16 @@ class SupplyChainEnvironment:
                 if module_state:
                     state[module.get_name()] = module_state
 
-        module_end_time = time.time()
-        self._miniscot_time_profile['initial_env_values'] = module_end_time - module_start_time
+        return context
 
-        return context, state
+    def save_initial_state(self, path):
+        """
+        Save the initial context and state to a snapshot at `path`, which
+        runs can warm-start from (with the `initial_state` run parameter).
+        """
+        context, state = self.get_initial_env_values()
+        save_snapshot(path, context, state)
+        return path
 
     def reset_agents(self, context, state):
         # Reset all agents
@@ -125,43 +404,108 @@ class SupplyChainEnvironment:
 
                 logger.debug("Resetting Agent: {}.".format(module.get_name()))
 
-                module_state = module.reset(context, state)
+                module_state = module.reset(context, state_view(state, self._state_view))
                 if module_state:
                     state[module.get_name()] = module_state
 
                 module_end_time = time.time()
                 self._miniscot_time_profile[module.get_name()+" reset"] = module_end_time - module_start_time
                 self._miniscot_time_profile[module.get_name()+" compute_actions"] = 0
-        self._metrics.reset(context, state)
+        for metric in self._metric_modules:
+            metric.reset(context, state)
         logger.debug("trying to reset signed-in services")
-        registry.reset_signed_in_services(context)
+        self._service_registry.reset_signed_in_services(context)
+
+        self._agent_wakeups = {}
+
+        if self._replay is not None:
+            if list(self._replay.asin_list) != list(context['asin_list']):
+                raise ValueError("The ASINs of the trace and of the replay differ, "
+                                 "were the Env parameters the same?")
+            self._replay.reset()
+        elif self._action_trace_path is not None:
+            self._recorder = ActionTraceRecorder(context['asin_list'], self._agent_names, {
+                'profile': self._profile,
+                'simulation_seed': self._simulation_seed,
+                'time_horizon': self._time_horizon,
+                'time_advance': self._time_advance,
+            })
 
         self._miniscot_time_profile["miniscot_action_execution"] = 0
         self._miniscot_time_profile["miniscot_advance_time"] = 0
         self._miniscot_time_profile["miniscot_metrics_time"] = 0
 
+        self._open_executors()
+
+    def _open_executors(self):
+        # Created per run, as close() shuts them down at the end of the previous one.
+        if self._concurrent_metrics and self._metrics_executor is None:
+            self._metrics_executor = ThreadPoolExecutor(max_workers=len(self._metric_modules),
+                                                        thread_name_prefix='metrics')
+        if any(_is_async(group[0]) for group in self._agent_groups) and self._event_loop is None:
+            self._event_loop = asyncio.new_event_loop()
+            self._agent_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='agents')
+
+    def close(self):
+        """
+        Shut down the threads and the event loop of the environment, and close
+        its modules (see Module.close()) and the services of its scope (e.g.
+        the pools of the model service client). run() and iter_steps() close
+        it when they end; runs stepped by hand (e.g. from a notebook) should
+        close it, or use the environment as a context manager. A closed
+        environment can still be reset and run again.
+        """
+        for module in self._modules + self._metric_modules:
+            close = getattr(module, 'close', None)
+            if close is not None:
+                close()
+        self._service_registry.close()
+        if self._metrics_executor is not None:
+            self._metrics_executor.shutdown()
+            self._metrics_executor = None
+        if self._agent_executor is not None:
+            self._agent_executor.shutdown()
+            self._agent_executor = None
+            self._event_loop.close()
+            self._event_loop = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def step(self, state, actions):
-        # TODO we should clone the state to make clear that it must NOT be
-        # modified by the modules directly. Not sure yet if info should likewise be immutable.
+        # The Agents get read-only views of the state (see _agent_calls): only the Environment modifies it.
+        clock = state['clock']
         state = self._transfer_shipments(state)
-        timestep_reward = 0
-        timestep_reward_by_asin = {k:0 for k in self._context['asin_list']}
-        for module in self._modules:
-            if isinstance(module, Agent):
-                module_start_time = time.time()
-                logger.debug("Getting actions from Agent: {}." .format(module.get_name()))
-                actions.extend(module.compute_actions(state))
-                module_end_time = time.time()
-                self._miniscot_time_profile[module.get_name()+" compute_actions"] += module_end_time - module_start_time
-                
-                miniscot_execute_actions_start_time = time.time()
-                state, actions, reward = self._execute_actions(actions, state)
-                miniscot_execute_actions_end_time = time.time()
-                self._miniscot_time_profile["miniscot_action_execution"] += miniscot_execute_actions_end_time - miniscot_execute_actions_start_time
+        # Rewards of every metric (rows), the primary one being reported as the reward of the step.
+        timestep_rewards = np.zeros(len(self._metric_modules))
+        timestep_rewards_by_asin = np.zeros((len(self._metric_modules), len(self._asin_list)))
+        agents_computed = False
+        # Each Agent sees the state resulting from the actions of the previous ones.
+        for agent_name, module_actions, wakeup in self._agent_calls(state):
+            agents_computed = True
+            if isinstance(module_actions, ActionBatch):
+                actions.append(module_actions)
+            else:
+                actions.extend(module_actions)
+            if self._time_advance == 'next_event':
+                self._agent_wakeups[agent_name] = wakeup
 
-                timestep_reward_by_asin = {k: timestep_reward_by_asin.get(k, 0) + reward['by_asin'].get(k, 0) for k in set(timestep_reward_by_asin)}
-                timestep_reward += reward['total']
+            miniscot_execute_actions_start_time = time.time()
+            state, actions, reward = self._execute_actions(actions, state)
+            miniscot_execute_actions_end_time = time.time()
+            self._miniscot_time_profile["miniscot_action_execution"] += miniscot_execute_actions_end_time - miniscot_execute_actions_start_time
+
+            timestep_rewards += reward['by_metric']['total']
+            timestep_rewards_by_asin += reward['by_metric']['by_asin']
+
+        if not agents_computed:
+            # Only scheduled actions or shipment arrivals happen at this event.
+            state, actions, reward = self._execute_actions(actions, state)
+            timestep_rewards += reward['by_metric']['total']
+            timestep_rewards_by_asin += reward['by_metric']['by_asin']
 
         # Invariant: only the following statements below are allowed to update the state.
 
@@ -169,26 +513,35 @@ class SupplyChainEnvironment:
         # Next, we must update these entities to account for the movement of time.
         # When we are done, the clock is updated to the next time-step.
         miniscot_advance_time_start_time = time.time()
-        state, reward = self._advance_time(state)
+        state, advance_rewards, advance_rewards_by_asin = self._advance_time(state, actions)
         miniscot_advance_time_end_time = time.time()
         self._miniscot_time_profile["miniscot_advance_time"] += miniscot_advance_time_end_time - miniscot_advance_time_start_time
-        if state['clock'] == self._time_horizon:
+        if state['clock'] >= self._time_horizon:
             program_end_time = time.time()
             total_measured_time = sum(self._miniscot_time_profile.values())
             self._miniscot_time_profile["total_measured_time"] = total_measured_time
             self._miniscot_time_profile["miniscot_total_time"] = program_end_time - self._program_start_time
             profile_time = str(self._miniscot_time_profile)
             logger.info("Measured simulation time: {}".format(profile_time))
+            if self._recorder is not None:
+                self.save_action_trace(self._action_trace_path)
 
 
-        timestep_reward += reward['total']
-        timestep_reward_by_asin = {k: timestep_reward_by_asin.get(k, 0) + reward['by_asin'].get(k, 0) for k in set(timestep_reward_by_asin)}
-        self.episode_reward += timestep_reward
-        
-        logger.info(red("timestep is = " + str(state['clock'])))
-        logger.info(red("datetime is = " + str(state['date_time'])))
-        logger.info(red("Timestep Reward = " + str(timestep_reward)))
-        logger.info(red("Episode Reward = " +str(self.episode_reward)))
+        timestep_rewards += advance_rewards
+        timestep_rewards_by_asin += advance_rewards_by_asin
+        self._episode_rewards += timestep_rewards
+
+        primary = self._primary_metric
+        timestep_reward = timestep_rewards[primary]
+        timestep_reward_by_asin = timestep_rewards_by_asin[primary]
+        self.episode_reward = self._episode_rewards[primary]
+
+        # Avoid formatting the messages at every step when they are not logged.
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(red("timestep is = " + str(state['clock'])))
+            logger.info(red("datetime is = " + str(state['date_time'])))
+            logger.info(red("Timestep Reward = " + str(timestep_reward)))
+            logger.info(red("Episode Reward = " +str(self.episode_reward)))
 
         rewards = {}
         rewards["timestep_reward"] = {}
@@ -197,15 +550,106 @@ class SupplyChainEnvironment:
         rewards["timestep_reward"]["total"] = timestep_reward
         rewards["timestep_reward"]["by_asin"] = timestep_reward_by_asin
         rewards["episode_reward"]["total"] = self.episode_reward
+        rewards["metrics"] = {name: {"timestep_reward": {"total": timestep_rewards[i],
+                                                         "by_asin": timestep_rewards_by_asin[i]},
+                                     "episode_reward": {"total": self._episode_rewards[i]}}
+                              for i, name in enumerate(self._metric_names)}
+
+        if self._history is not None:
+            self._history.record(clock, state, rewards)
 
         return state, actions, rewards
 
+    def _agent_calls(self, state):
+        # (Agent name, actions, next wakeup) of the Agents awake at this step.
+        if self._replay is not None:
+            yield from self._replay.calls_at(state['clock'])
+            return
+
+        for group in self._agent_groups:
+            agents = [module for module in group if self._is_awake(module, state)]
+            if not agents:
+                continue
+            view = state_view(state, self._state_view)
+            if _is_async(agents[0]):
+                module_actions = self._compute_actions_async(agents, view)
+            else:
+                module_actions = [self._compute_actions(agents[0], view)]
+
+            wakeups = [module.get_next_wakeup(view) if self._time_advance == 'next_event' else None
+                       for module in agents]
+
+            # In the order of the profile, whichever completed first.
+            for module, actions, wakeup in zip(agents, module_actions, wakeups):
+                if self._recorder is not None:
+                    self._recorder.record_call(state['clock'], module.get_name(), actions, wakeup)
+                yield module.get_name(), actions, wakeup
+
+    def _compute_actions(self, module, view):
+        module_start_time = time.time()
+        logger.debug("Getting actions from Agent: {}." .format(module.get_name()))
+        module_actions = module.compute_actions(view)
+        module_end_time = time.time()
+        self._miniscot_time_profile[module.get_name()+" compute_actions"] += module_end_time - module_start_time
+        return module_actions
+
+    def _compute_actions_async(self, agents, view):
+        async def compute_actions(module):
+            module_start_time = time.time()
+            logger.debug("Getting actions from async Agent: {}." .format(module.get_name()))
+            budget = self._agent_time_budgets.get(module.get_name())
+            try:
+                module_actions = await asyncio.wait_for(module.compute_actions_async(view), budget)
+            except asyncio.TimeoutError:
+                logger.warning("Agent {} exceeded its time budget of {}s at clock {}, it takes no actions.".format(
+                    module.get_name(), budget, view['clock']))
+                module_actions = []
+            module_end_time = time.time()
+            self._miniscot_time_profile[module.get_name()+" compute_actions"] += module_end_time - module_start_time
+            return module_actions
+
+        async def gather():
+            return await asyncio.gather(*[compute_actions(module) for module in agents])
+
+        return self._agent_executor.submit(self._event_loop.run_until_complete, gather()).result()
+
+    def save_action_trace(self, path):
+        """
+        Save the actions recorded so far (requires the `action_trace` run parameter).
+        """
+        if self._recorder is None:
+            raise ValueError("Actions are only recorded with the action_trace run parameter")
+        self._recorder.save(path)
+
+    def _new_uuid(self):
+        # uuids are part of the trace, so that replayed actions refer to the same orders.
+        if self._replay is not None:
+            return self._replay.next_uuid()
+        uuid = short_uuid()
+        if self._recorder is not None:
+            self._recorder.record_uuid(uuid)
+        return uuid
+
     def _execute_actions(self, actions, state):
         # Execute all completed actions that are scheduled for this timestep
         unexecuted_actions = []
-        reward = 0
-        reward_by_asin = {k:0 for k in self._context['asin_list']}
+        # The ASIN and the reward of every metric of the rewarded actions
+        rewarded_asin_ids = []
+        action_rewards = []
         for action in actions:
+            if isinstance(action, ActionBatch):
+                state, unexecuted_batch, batch_reward = self._execute_batch(action, state)
+                if unexecuted_batch is not None:
+                    unexecuted_actions.append(unexecuted_batch)
+                if batch_reward is not None:
+                    asin_ids, batch_rewards = batch_reward
+                    rewarded_asin_ids.extend(asin_ids.tolist())
+                    action_rewards.extend(batch_rewards.tolist())
+                continue
+
+            if isinstance(action['asin'], str):
+                # e.g. actions injected from the CLI or a notebook; a copy, the caller's action is left as it is.
+                action = dict(action, asin=self._asin_list.id_of(action['asin']))
             if action['quantity'] < 0:
                 raise ValueError ("Action quantity is negative, which is not possible!")
             if isinstance(action['quantity'], int) == False:
@@ -217,38 +661,157 @@ class SupplyChainEnvironment:
                 elif action['type'] in ['inbound_shipment', 'outbound_shipment', 'transfer']:
                     state = self._create_shipment_entity(state, action)
                     metrics_start_time = time.time()
-                    action_reward = self._metrics.compute_reward(state, action)
+                    # Single actions are too cheap to reward concurrently.
+                    action_reward = [metric.compute_reward(state, action) for metric in self._metric_modules]
                     metrics_end_time = time.time()
                     self._miniscot_time_profile["miniscot_metrics_time"] += metrics_end_time - metrics_start_time
-                    reward += action_reward
-                    reward_by_asin[action['asin']] += action_reward
+                    rewarded_asin_ids.append(action['asin'])
+                    action_rewards.append(action_reward)
                 else:
-                    raise ValueError("Unknown action type ".format(action['type']))
+                    raise ValueError("Unknown action type {}".format(action['type']))
+                if self._history is not None:
+                    self._history.add_executed_action(action)
             else:
                 unexecuted_actions.append(action)
 
         # this allows us to return rewards by asin, instead of just total reward
+        metric_count = len(self._metric_modules)
+        reward_by_asin = np.zeros((metric_count, len(self._asin_list)))
+        reward = np.zeros(metric_count)
+        if action_rewards:
+            action_rewards = np.array(action_rewards, dtype=float).reshape(-1, metric_count)
+            # Unbuffered, so that several actions on the same ASIN all add up.
+            np.add.at(reward_by_asin.T, rewarded_asin_ids, action_rewards)
+            reward = action_rewards.sum(axis=0)
         rewards = {}
-        rewards["total"] = reward
-        rewards["by_asin"] = reward_by_asin
+        rewards["total"] = reward[self._primary_metric]
+        rewards["by_asin"] = reward_by_asin[self._primary_metric]
+        rewards["by_metric"] = {"total": reward, "by_asin": reward_by_asin}
 
         return state, unexecuted_actions, rewards
 
-    def _advance_time(self, state):
+    def _execute_batch(self, batch, state):
+        # Same as _execute_actions, with vectorized checks and scheduling. Within
+        # a batch, orders are created before the shipments are.
+        if len(batch) == 0:
+            return state, None, None
+        if batch.asin.dtype.kind in 'OU':
+            # A new batch: the one of the Agent is left as it is.
+            batch = batch.replace(asin=np.array([self._asin_list.id_of(asin) for asin in batch.asin.tolist()],
+                                                dtype=np.int64))
+        if not np.issubdtype(batch.quantity.dtype, np.integer):
+            raise ValueError ("Action quantity is not integer, which is not possible!")
+        if (batch.quantity < 0).any():
+            raise ValueError ("Action quantity is negative, which is not possible!")
+        if ((batch.type < 0) | (batch.type >= len(ACTION_TYPES))).any():
+            raise ValueError("Unknown action type codes {}".format(np.unique(batch.type).tolist()))
+
+        due = batch.schedule <= state['clock']
+        if not due.any():
+            return state, batch, None
+        unexecuted_batch = None
+        if not due.all():
+            unexecuted_batch = batch.take(~due)
+            batch = batch.take(due)
+        if self._history is not None:
+            self._history.add_executed(batch.type, batch.asin, batch.quantity)
+
+        is_order = np.isin(batch.type, type_codes(ORDER_TYPES))
+        if is_order.any():
+            state = self._create_order_entities(state, batch.take(is_order) if not is_order.all() else batch)
+        if is_order.all():
+            return state, unexecuted_batch, None
+
+        shipments = batch.take(~is_order) if is_order.any() else batch
+        state = self._create_shipment_entities(state, shipments)
+        metrics_start_time = time.time()
+
+        def batch_rewards(metric):
+            if hasattr(metric, 'compute_batch_reward'):
+                return np.asarray(metric.compute_batch_reward(state, shipments), dtype=float)
+            return np.array([metric.compute_reward(state, action) for action in shipments.to_dicts()], dtype=float)
+
+        # Actions (rows) x metrics
+        shipment_rewards = np.stack(self._map_metrics(batch_rewards), axis=1)
+        metrics_end_time = time.time()
+        self._miniscot_time_profile["miniscot_metrics_time"] += metrics_end_time - metrics_start_time
+
+        return state, unexecuted_batch, (shipments.asin, shipment_rewards)
+
+    def _map_metrics(self, function):
+        # Results in the order of the metrics, whether computed concurrently or not.
+        if self._metrics_executor is None:
+            return [function(metric) for metric in self._metric_modules]
+        return list(self._metrics_executor.map(function, self._metric_modules))
+
+    def _reward_array(self, reward_by_asin):
+        # Metrics may still return rewards by ASIN as dicts.
+        if isinstance(reward_by_asin, dict):
+            values = np.zeros(len(self._asin_list))
+            for asin, asin_reward in reward_by_asin.items():
+                asin_id = self._asin_list.id_of(asin) if isinstance(asin, str) else asin
+                values[asin_id] += asin_reward
+            return values
+        return reward_by_asin
+
+    def _is_awake(self, module, state):
+        if self._time_advance == 'fixed':
+            return True
+        wakeup = self._agent_wakeups.get(module.get_name())
+        return wakeup is None or wakeup <= state['clock']
+
+    def _next_event_clock(self, state, actions):
+        # The earliest of: the horizon, an Agent waking up, a scheduled action
+        # or a shipment arrival; but never earlier than the next timestep.
+        clock = state['clock']
+        next_clock = self._time_horizon
+        for agent_name in self._agent_names:
+            wakeup = self._agent_wakeups.get(agent_name)
+            next_clock = min(next_clock, clock + 1 if wakeup is None else wakeup)
+        for action in actions:
+            if isinstance(action, ActionBatch):
+                if len(action):
+                    next_clock = min(next_clock, int(action.schedule.min()))
+            else:
+                next_clock = min(next_clock, action['schedule'])
+        # A shipment arrives once its time_until_arrival has been decremented to 0,
+        # which happens at the start of each timestep.
+        for shipments in self._shipment_lists(state['network']):
+            for shipment in shipments:
+                next_clock = min(next_clock, clock + shipment['time_until_arrival'])
+
+        return max(next_clock, clock + 1)
+
+    def _advance_time(self, state, actions=()):
         # Right now, the only time processing we need to do is with shipments.
-        reward = 0
-        action = {"type": "advance_time", "asin": None, "quantity": None}
-        reward = self._metrics.compute_reward(state, action)
-        state['clock'] += 1
+        if self._time_advance == 'next_event':
+            elapsed = self._next_event_clock(state, actions) - state['clock']
+        else:
+            elapsed = 1
+
+        # Metrics must account for every timestep, including the skipped ones.
+        action = {"type": "advance_time", "asin": None, "quantity": None, "elapsed": elapsed}
+        metric_rewards = self._map_metrics(lambda metric: metric.compute_reward(state, dict(action)))
+        rewards = np.array([reward['total'] for reward in metric_rewards], dtype=float)
+        rewards_by_asin = np.array([self._reward_array(reward['by_asin']) for reward in metric_rewards],
+                                   dtype=float).reshape(len(metric_rewards), len(self._asin_list))
+
+        # Nothing arrives during the skipped timesteps, but shipments still move.
+        if elapsed > 1:
+            for shipments in self._shipment_lists(state['network']):
+                for shipment in shipments:
+                    shipment['time_until_arrival'] -= elapsed - 1
+
+        state['clock'] += elapsed
         logger.debug('clock: {}'.format(state['clock']))
         if self._time_increment == 'daily':
-            state['date_time'] += datetime.timedelta(days=1)
+            state['date_time'] += datetime.timedelta(days=elapsed)
         elif self._time_increment == 'hourly':
-            state['date_time'] += datetime.timedelta(hours=1)
+            state['date_time'] += datetime.timedelta(hours=elapsed)
         else:
             raise ValueError("Unknown time increment arg".format(self._time_increment))
 
-        return state, reward
+        return state, rewards, rewards_by_asin
 
     def _create_order_entity(self, state, action):
         # semantically, individual actions are singular (order, shipment), state semantics are plural (orders, shipments)
@@ -258,6 +821,7 @@ class SupplyChainEnvironment:
         state, action = self._remove_order_entity(state, action)      
         # either way, append new order to state
         state[atype_to_state].append(action)
+        self._events.publish(ORDER_CREATED, action)
 
         return state
 
@@ -272,12 +836,16 @@ class SupplyChainEnvironment:
         state, action = self._remove_order_entity(state, action)
         uuid = action['uuid']
 
-        G = state['network']
-        
+        self._add_shipment(state['network'], asin, origin, destination, quantity, uuid)
+
+        return state
+
+    def _add_shipment(self, G, asin, origin, destination, quantity, uuid):
         origin_data = G.nodes[origin]
         destination_data = G.nodes[destination]
 
-        logger.debug("Creating shipment at origin {} and destination {}.".format(origin, destination))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Creating shipment at origin {} and destination {}.".format(origin, destination))
         edge_data = G.get_edge_data(origin, destination)
 
         # Update only after the other components have been retrieved to avoid
@@ -287,8 +855,10 @@ class SupplyChainEnvironment:
         if 'inventory' in origin_data:
             if quantity <= origin_data['inventory'][asin]:
                 origin_data['inventory'][asin] -= quantity
+                if self._events.wants(INVENTORY_CHANGED):
+                    self._events.publish(INVENTORY_CHANGED, origin, asin, -quantity)
             else:
-                raise ValueError("Action tried to transfer {} units of {} from {} to {}, but {} only had {} units of inventory for this ASIN!".format(quantity, asin, origin, destination, origin, origin_data['inventory'][asin]))
+                raise ValueError("Action tried to transfer {} units of {} from {} to {}, but {} only had {} units of inventory for this ASIN!".format(quantity, self._asin_list[asin], origin, destination, origin, origin_data['inventory'][asin]))
 
         shipments = edge_data['shipments']
         transit_time = edge_data['transit_time']
@@ -307,44 +877,87 @@ class SupplyChainEnvironment:
 
 
         shipments.append(shipment)
+        self._events.publish(SHIPMENT_CREATED, shipment)
+
+    def _create_order_entities(self, state, orders):
+        # Batch version of _create_order_entity
+        self._remove_orders(state, orders.uuid)
+        for action in orders.to_dicts():
+            if 'uuid' not in action:
+                action['uuid'] = self._new_uuid()
+            state[action['type'] + 's'].append(action)
+            self._events.publish(ORDER_CREATED, action)
+
+        return state
+
+    def _create_shipment_entities(self, state, shipments):
+        # Batch version of _create_shipment_entity
+        self._remove_orders(state, shipments.uuid)
+        G = state['network']
+        for asin, origin, destination, quantity, uuid in zip(
+                shipments.asin.tolist(), shipments.origin.tolist(), shipments.destination.tolist(),
+                shipments.quantity.tolist(), shipments.uuid.tolist()):
+            self._add_shipment(G, asin, origin, destination, quantity, self._new_uuid() if uuid is None else uuid)
 
         return state
 
+    def _remove_orders(self, state, uuids):
+        # Single pass over the orders, instead of one per action.
+        uuids = set(uuids.tolist())
+        uuids.discard(None)
+        if uuids:
+            for orders in (state['customer_orders'], state['purchase_orders']):
+                if self._events.wants(ORDER_REMOVED):
+                    for order in orders:
+                        if order['uuid'] in uuids:
+                            self._events.publish(ORDER_REMOVED, order)
+                orders[:] = [order for order in orders if order['uuid'] not in uuids]
+
     def _remove_order_entity(self, state, action):
         if 'uuid' in action:
             uuid = action['uuid']
             for order in state['customer_orders']:
                 if order['uuid'] == uuid:
                     state['customer_orders'].remove(order)
+                    self._events.publish(ORDER_REMOVED, order)
                     break
             for order in state['purchase_orders']:
                 if order['uuid'] == uuid:
                     state['purchase_orders'].remove(order)
+                    self._events.publish(ORDER_REMOVED, order)
                     break
         else:
-            action['uuid'] = short_uuid()
+            action['uuid'] = self._new_uuid()
 
         return state, action
 
 
     def _transfer_shipments(self, state):
         G = state['network']
-        logger.debug("edges are {}".format(G.edges(data=True)))
+        if isinstance(G, CSRNetwork):
+            return self._transfer_csr_shipments(state)
+        # Formatting the whole network is expensive; only do it if it will be logged.
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug("edges are {}".format(G.edges(data=True)))
 
         for origin, destination, edge_data in G.edges(data=True):
             shipments = edge_data['shipments']
-            logger.debug('For edge with origin {} and destination {}, edge data is {}'.format(origin, destination, edge_data))
+            if debug:
+                logger.debug('For edge with origin {} and destination {}, edge data is {}'.format(origin, destination, edge_data))
 
             # Let's iterate in reverse so that we can remove elements as needed without causing skips
             for shipment in reversed(shipments):
                 shipment['time_until_arrival'] -= 1
-                logger.debug(
-                    "Updated arrival time for shipment {}.".format(shipment))
+                if debug:
+                    logger.debug(
+                        "Updated arrival time for shipment {}.".format(shipment))
 
                 if shipment['time_until_arrival'] <= 0:
-                    logger.debug(
-                        "Shipment {} arrived at destination {}.".format(
-                            shipment, destination))
+                    if debug:
+                        logger.debug(
+                            "Shipment {} arrived at destination {}.".format(
+                                shipment, destination))
 
                     destination_data = G.nodes[destination]
 
@@ -352,14 +965,49 @@ class SupplyChainEnvironment:
                     inventory = destination_data.get('inventory')
                     if inventory:
                         inventory[shipment['asin']] += shipment['quantity']
+                        self._events.publish(INVENTORY_CHANGED, destination, shipment['asin'], shipment['quantity'])
                     else:
                         # Let's update a 'delivered' attribute so that we can debug it better.
                         destination_data['delivered'] += shipment['quantity']
 
                     shipments.remove(shipment)
+                    self._events.publish(SHIPMENT_ARRIVED, shipment)
 
         return (state)
 
+    def _transfer_csr_shipments(self, state):
+        # Same as _transfer_shipments, working on the arrays of the network.
+        G = state['network']
+        for edge_id, shipments in enumerate(G.shipments):
+            if not shipments:
+                continue
+            arrived = False
+            for shipment in shipments:
+                shipment['time_until_arrival'] -= 1
+                arrived = arrived or shipment['time_until_arrival'] <= 0
+            if not arrived:
+                continue
+
+            destination_id = G.indices[edge_id]
+            for shipment in shipments:
+                if shipment['time_until_arrival'] <= 0:
+                    if G.has_inventory[destination_id]:
+                        G.inventory[destination_id, shipment['asin']] += shipment['quantity']
+                        self._events.publish(INVENTORY_CHANGED, G.node_names[destination_id], shipment['asin'],
+                                             shipment['quantity'])
+                    else:
+                        # Let's update a 'delivered' attribute so that we can debug it better.
+                        G.nodes[G.node_names[destination_id]]['delivered'] += shipment['quantity']
+                    self._events.publish(SHIPMENT_ARRIVED, shipment)
+            shipments[:] = [shipment for shipment in shipments if shipment['time_until_arrival'] > 0]
+
+        return state
+
+    def _shipment_lists(self, G):
+        if isinstance(G, CSRNetwork):
+            return G.shipments
+        return [edge_data['shipments'] for _, _, edge_data in G.edges(data=True)]
+
     def run(self):
         logger.info("Simulation Started.")
 
@@ -369,13 +1017,56 @@ class SupplyChainEnvironment:
 
         # Invariant: cannot be executed in parallel
         actions = []
-        for t in range(0, self._time_horizon):
-            logger.info(red("timestep is = " + str(t)))
-            logger.info(red("datetime is = " + str(state['date_time'])))
-            state, actions, reward = self.step(state, actions)
-            logger.info(red("Reward = " + str(reward["timestep_reward"]["total"])))
-            logger.info(red("Episode Reward = " +str(self.episode_reward)))
+        try:
+            while state['clock'] < self._time_horizon:
+                logger.info(red("timestep is = " + str(state['clock'])))
+                logger.info(red("datetime is = " + str(state['date_time'])))
+                state, actions, reward = self.step(state, actions)
+                logger.info(red("Reward = " + str(reward["timestep_reward"]["total"])))
+                logger.info(red("Episode Reward = " +str(self.episode_reward)))
+        finally:
+            self.close()
 
         logger.info("Simulation Completed.")
 
         return state
+
+    def iter_steps(self, aggregates=(), copy=False):
+        """
+        Run the simulation, yielding a StepRecord per step, as it goes.
+
+        The environment keeps no history: consumers may stream the records
+        elsewhere, or stop early by closing the generator (e.g. breaking out
+        of the loop), which closes the environment. `aggregates` lists the
+        names of STATE_AGGREGATES, or callables taking the state, to compute
+        after each step.
+
+        Every record shares the same preallocated reward_by_asin array, so a
+        record is only valid until the next step; pass `copy=True` to keep
+        the records (e.g. list(env.iter_steps(copy=True))).
+        """
+        aggregate_functions = [STATE_AGGREGATES[aggregate] if isinstance(aggregate, str) else aggregate
+                               for aggregate in aggregates]
+
+        context, state = self.get_initial_env_values()
+        self.reset_agents(context, state)
+
+        reward_by_asin = np.zeros(len(context['asin_list']))
+
+        actions = []
+        # Also closed when the generator is closed early.
+        try:
+            while state['clock'] < self._time_horizon:
+                clock = state['clock']
+                date_time = state['date_time']
+                state, actions, reward = self.step(state, actions)
+
+                reward_by_asin[:] = reward['timestep_reward']['by_asin']
+
+                yield StepRecord(clock, date_time,
+                                 reward['timestep_reward']['total'],
+                                 reward['episode_reward']['total'],
+                                 reward_by_asin.copy() if copy else reward_by_asin,
+                                 tuple(aggregate(state) for aggregate in aggregate_functions))
+        finally:
+            self.close()
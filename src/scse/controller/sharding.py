@@ -0,0 +1,173 @@
+"""
+ASIN-sharded execution of a single run.
+
+When every module treats ASINs independently (see
+Module.is_asin_separable()), a run over N ASINs is equivalent to runs over
+disjoint subsets of them. `run_sharded()` builds the topology and initial
+state once, saves them to a snapshot (see scse.controller.snapshot), and
+simulates each shard of the ASINs in a worker process started from the
+memory-mapped snapshot. It then merges the rewards of every metric, the
+metrics logs and the state aggregates of the shards.
+
+Every shard is simulated with the simulation seed: the random draws of the
+modules are keyed by ASIN (e.g. the demand, see
+scse.services.demand_distribution.keyed_uniforms), so that the results are
+those of the unsharded run, whatever the number of shards.
+
+Metrics may implement `merge_metrics_logs(logs)`, merging the metrics logs
+of the shards (in shard order) into the log of the run; by default the rows
+of each timestep are merged by summing their numeric values.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numbers
+import os
+import tempfile
+from scse.controller.miniscot import SupplyChainEnvironment, STATE_AGGREGATES
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+import logging
+logger = logging.getLogger(__name__)
+
+"""
+Merged results of a sharded run:
+ - asin_list: the selected ASINs, in the order of the reward_by_asin columns,
+ - clocks: the clocks of the steps (those of any shard, when time advances from
+   event to event),
+ - rewards: the total reward of each step,
+ - reward_by_asin: array (steps x ASINs) of rewards,
+ - episode_reward: the total reward,
+ - aggregates: array (steps x aggregates), summed over the shards,
+ - metric_rewards: the total reward of each step, by metric name,
+ - episode_rewards: the episode reward, by metric name,
+ - metrics_logs: the merged metrics log (get_metrics_log()), by metric name.
+"""
+ShardedRun = namedtuple('ShardedRun', ['asin_list', 'clocks', 'rewards', 'reward_by_asin',
+                                       'episode_reward', 'aggregates', 'metric_rewards',
+                                       'episode_rewards', 'metrics_logs'])
+
+
+def run_sharded(shards=None, aggregates=(), max_workers=None, **run_parameters):
+    """
+    Run the simulation defined by `run_parameters` (the arguments of
+    SupplyChainEnvironment) in `shards` worker processes (by default, one per
+    core). `aggregates` are names of STATE_AGGREGATES; they must be sums over
+    the ASINs. The initial state must be JSON serializable (see
+    scse.controller.snapshot).
+    """
+    # Shards would overwrite each other's csv log of the metric.
+    run_parameters = dict(run_parameters, metrics_log_path=None)
+    env = SupplyChainEnvironment(**run_parameters)
+    if not env.is_asin_separable():
+        raise ValueError("The modules of profile {} are not all ASIN separable, it can't be sharded".format(
+            run_parameters.get('profile', 'newsvendor_demo_profile')))
+
+    with tempfile.TemporaryDirectory(prefix='scse-shards-') as snapshot_path:
+        # The Env modules run once, here: the shards start from the snapshot.
+        env.save_initial_state(snapshot_path)
+        asin_list = list(env.asin_list)
+
+        shards = min(shards or os.cpu_count() or 1, len(asin_list))
+        shard_ids = np.array_split(np.arange(len(asin_list)), shards)
+        logger.info("Running {} ASINs in {} shards.".format(len(asin_list), shards))
+
+        shard_parameters = [dict(run_parameters, initial_state=snapshot_path, initial_state_mmap=True,
+                                 initial_state_asins=ids.tolist()) for ids in shard_ids]
+        with ProcessPoolExecutor(max_workers=max_workers or shards) as executor:
+            results = list(executor.map(_run_shard, shard_parameters, [tuple(aggregates)] * shards))
+
+    return _merge(env, asin_list, shard_ids, results, len(aggregates))
+
+
+def _run_shard(run_parameters, aggregates):
+    env = SupplyChainEnvironment(**run_parameters)
+    aggregate_functions = [STATE_AGGREGATES[aggregate] for aggregate in aggregates]
+    metric_names = list(env.metric_modules)
+    clocks, rewards, reward_by_asin, shard_aggregates, metric_rewards = [], [], [], [], []
+    with env:
+        context, state = env.get_initial_env_values()
+        env.reset_agents(context, state)
+        actions = []
+        while state['clock'] < env.time_horizon:
+            clocks.append(state['clock'])
+            state, actions, reward = env.step(state, actions)
+            rewards.append(reward['timestep_reward']['total'])
+            reward_by_asin.append(reward['timestep_reward']['by_asin'])
+            shard_aggregates.append([aggregate(state) for aggregate in aggregate_functions])
+            metric_rewards.append([reward['metrics'][name]['timestep_reward']['total'] for name in metric_names])
+    metrics_logs = {name: metric.get_metrics_log() for name, metric in env.metric_modules.items()
+                    if hasattr(metric, 'get_metrics_log')}
+    steps = len(clocks)
+    return {
+        'clocks': np.array(clocks, dtype=np.int64),
+        'rewards': np.array(rewards, dtype=float),
+        'reward_by_asin': np.array(reward_by_asin, dtype=float).reshape(steps, -1),
+        'aggregates': np.array(shard_aggregates, dtype=float).reshape(steps, len(aggregates)),
+        'metric_rewards': np.array(metric_rewards, dtype=float).reshape(steps, len(metric_names)),
+        'episode_rewards': env.episode_rewards,
+        'metrics_logs': metrics_logs,
+    }
+
+
+def _merge(env, asin_list, shard_ids, results, aggregate_count):
+    # Shards may step at different clocks (next-event time advance): align them on the union.
+    clocks = np.unique(np.concatenate([result['clocks'] for result in results]))
+    metric_names = list(env.metric_modules)
+    rewards = np.zeros(len(clocks))
+    reward_by_asin = np.zeros((len(clocks), len(asin_list)))
+    aggregates = np.zeros((len(clocks), aggregate_count))
+    metric_rewards = np.zeros((len(clocks), len(metric_names)))
+    episode_rewards = dict.fromkeys(metric_names, 0)
+
+    # Always summed in shard order, so that the totals don't depend on which worker finished first.
+    for ids, result in zip(shard_ids, results):
+        for name in metric_names:
+            episode_rewards[name] += result['episode_rewards'][name]
+        shard_clocks = result['clocks']
+        if len(shard_clocks) == 0:
+            continue
+        steps = np.searchsorted(clocks, shard_clocks)
+        rewards[steps] += result['rewards']
+        reward_by_asin[steps[:, None], ids[None, :]] = result['reward_by_asin']
+        metric_rewards[steps] += result['metric_rewards']
+        # Between its steps, the state of a shard doesn't change.
+        step_of_clock = np.searchsorted(shard_clocks, clocks, side='right') - 1
+        aggregates += np.where((step_of_clock >= 0)[:, None], result['aggregates'][np.maximum(step_of_clock, 0)], 0)
+
+    metrics_logs = {}
+    for name, metric in env.metric_modules.items():
+        logs = [result['metrics_logs'][name] for result in results if name in result['metrics_logs']]
+        if logs:
+            merge = getattr(metric, 'merge_metrics_logs', merge_metrics_logs)
+            metrics_logs[name] = merge(logs)
+
+    primary = env.primary_metric
+    return ShardedRun(asin_list, clocks, rewards, reward_by_asin, episode_rewards[primary], aggregates,
+                      {name: metric_rewards[:, i] for i, name in enumerate(metric_names)},
+                      episode_rewards, metrics_logs)
+
+
+def merge_metrics_logs(logs):
+    """
+    Merge the metrics logs of shards (lists of dicts), summing the numeric
+    values of the rows of the same timestep (other values are those of the
+    first shard logging the timestep).
+    """
+    rows = {}
+    for log in logs:
+        for row in log:
+            timestep = row.get('timestep')
+            merged = rows.get(timestep)
+            if merged is None:
+                rows[timestep] = dict(row)
+                continue
+            for name, value in row.items():
+                if name != 'timestep' and _is_number(value) and _is_number(merged.get(name)):
+                    merged[name] += value
+    return sorted(rows.values(), key=lambda row: float(row.get('timestep', 0)))
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
@@ -0,0 +1,180 @@
+"""
+Snapshots of the context and state of the Environment, to warm-start runs.
+
+A snapshot is a directory holding:
+ - arrays (.npy) for the network: node types, locations and inventory, edges
+   and transit times, and the shipments in transit,
+ - meta.json for everything else: the context (ASINs, ...), the clock, the
+   orders, the names of the nodes and the other node and edge attributes, and
+   the state contributed by other modules.
+
+Nothing is pickled: values other than the network must be JSON serializable.
+
+`SupplyChainEnvironment(initial_state=path)` starts from a snapshot instead
+of calling the Env modules (which are not instantiated), e.g. to avoid
+reloading the datasets of a data-driven topology for every replication. With
+`initial_state_mmap=True` (the default), the arrays are memory-mapped
+copy-on-write: worker processes starting from the same snapshot share its
+pages, and each gets a private copy of only the pages it modifies.
+
+A run can also start from a subset of the ASINs of a snapshot (the
+`initial_state_asins` run parameter, e.g. the shards of
+scse.controller.sharding): the inventory, the shipments and the orders are
+restricted to them, and their ids renumbered.
+"""
+from os.path import join
+import datetime
+import json
+import os
+from scse.api.asin import AsinTable
+from scse.api.csr_network import CSRNetwork
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+nx = lazy_import('networkx')
+
+_SNAPSHOT_VERSION = 1
+_META = 'meta.json'
+_ORDERS = ('customer_orders', 'purchase_orders')
+_NETWORK_ARRAYS = ('node_type', 'location', 'has_inventory', 'inventory', 'edge_origin', 'edge_destination',
+                   'transit_time', 'shipment_edge', 'shipment_asin', 'shipment_quantity',
+                   'shipment_time_until_arrival')
+
+
+def _json_value(name, value):
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        raise ValueError("{} can't be saved in a snapshot, it is not JSON serializable".format(name))
+    return value
+
+
+def save_snapshot(path, context, state):
+    """
+    Save `context` and `state` to the directory `path`.
+    """
+    os.makedirs(path, exist_ok=True)
+    G = state.get('network')
+    if G is not None and not isinstance(G, CSRNetwork):
+        if type(G) is not nx.DiGraph:
+            raise ValueError("Only DiGraph networks can be saved in a snapshot, not {}".format(type(G).__name__))
+        G = CSRNetwork.from_networkx(G, len(context['asin_list']))
+
+    meta = {
+        'version': _SNAPSHOT_VERSION,
+        'context': {name: list(value) if name == 'asin_list' else _json_value('context ' + name, value)
+                    for name, value in context.items()},
+        'state': {name: _json_value('state ' + name, value) for name, value in state.items()
+                  if name not in ('network', 'date_time')},
+        'date_time': state['date_time'].isoformat(),
+        'network': None,
+    }
+
+    if G is not None:
+        shipments = [(edge_id, shipment) for edge_id, edge_shipments in enumerate(G.shipments)
+                     for shipment in edge_shipments]
+        arrays = {
+            'node_type': G.node_type,
+            'location': G.location,
+            'has_inventory': G.has_inventory,
+            'inventory': G.inventory,
+            'edge_origin': G.edge_origin,
+            'edge_destination': G.indices,
+            'transit_time': G.transit_time,
+            'shipment_edge': np.array([edge_id for edge_id, _ in shipments], dtype=np.int64),
+            'shipment_asin': np.array([shipment['asin'] for _, shipment in shipments], dtype=np.int64),
+            'shipment_quantity': np.array([shipment['quantity'] for _, shipment in shipments], dtype=np.int64),
+            'shipment_time_until_arrival': np.array([shipment['time_until_arrival'] for _, shipment in shipments],
+                                                    dtype=np.int64),
+        }
+        for name, array in arrays.items():
+            np.save(join(path, name + '.npy'), np.ascontiguousarray(array))
+        meta['network'] = {
+            'backend': 'csr' if isinstance(state['network'], CSRNetwork) else 'networkx',
+            'node_names': _json_value('node names', G.node_names),
+            'node_types': _json_value('node types', G.node_types),
+            'node_attributes': _json_value('node attributes', G._node_attributes),
+            'edge_attributes': _json_value('edge attributes', G._edge_attributes),
+            'shipment_ids': _json_value('shipment ids', [shipment['id'] for _, shipment in shipments]),
+        }
+
+    # meta.json is written last (and atomically), so a snapshot is complete once it exists.
+    tmp_path = join(path, _META + '.{}.tmp'.format(os.getpid()))
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, join(path, _META))
+
+
+def load_snapshot(path, network_backend=None, mmap=True, asin_ids=None):
+    """
+    Load the context and state saved at `path`; the network is built with
+    `network_backend` (by default, the backend it was saved from). With
+    `asin_ids`, only the ASINs with these ids are loaded.
+    """
+    with open(join(path, _META)) as f:
+        meta = json.load(f)
+    if meta.get('version') != _SNAPSHOT_VERSION:
+        raise ValueError("Unsupported snapshot version {}".format(meta.get('version')))
+
+    context = dict(meta['context'])
+    # New id of every ASIN of the snapshot, -1 for those not loaded.
+    new_ids = np.arange(len(context['asin_list']))
+    if asin_ids is not None:
+        asin_ids = np.asarray(asin_ids, dtype=np.int64)
+        new_ids = np.full(len(context['asin_list']), -1)
+        new_ids[asin_ids] = np.arange(len(asin_ids))
+        context['asin_list'] = [context['asin_list'][asin_id] for asin_id in asin_ids.tolist()]
+    context['asin_list'] = AsinTable(context['asin_list'])
+    state = dict(meta['state'])
+    state['date_time'] = datetime.datetime.fromisoformat(meta['date_time'])
+    if asin_ids is not None:
+        for name in _ORDERS:
+            if name in state:
+                state[name] = [dict(order, asin=int(new_ids[order['asin']])) for order in state[name]
+                               if new_ids[order['asin']] >= 0]
+
+    network = meta['network']
+    if network is not None:
+        arrays = {name: np.load(join(path, name + '.npy'), mmap_mode='c' if mmap else None)
+                  for name in _NETWORK_ARRAYS}
+        if asin_ids is not None:
+            # A private copy of the columns of the ASINs.
+            arrays['inventory'] = arrays['inventory'][:, asin_ids]
+        edge_shipments = [[] for _ in range(len(arrays['edge_origin']))]
+        node_names = network['node_names']
+        for edge_id, asin, quantity, time_until_arrival, shipment_id in zip(
+                arrays['shipment_edge'].tolist(), new_ids[arrays['shipment_asin']].tolist(),
+                arrays['shipment_quantity'].tolist(), arrays['shipment_time_until_arrival'].tolist(),
+                network['shipment_ids']):
+            if asin < 0:
+                continue
+            edge_shipments[edge_id].append({
+                'id': shipment_id,
+                'asin': asin,
+                'origin': node_names[arrays['edge_origin'][edge_id]],
+                'destination': node_names[arrays['edge_destination'][edge_id]],
+                'quantity': quantity,
+                'time_until_arrival': time_until_arrival
+            })
+
+        G = CSRNetwork(node_names, [network['node_types'][code] for code in arrays['node_type'].tolist()],
+                       arrays['location'], arrays['has_inventory'], arrays['inventory'],
+                       arrays['edge_origin'], arrays['edge_destination'], arrays['transit_time'],
+                       edge_shipments, network['node_attributes'], network['edge_attributes'])
+        if (network_backend or network['backend']) == 'networkx':
+            G = _to_networkx(G)
+        state['network'] = G
+
+    return context, state
+
+
+def _to_networkx(network):
+    G = nx.DiGraph()
+    for node, node_data in network.nodes(data=True):
+        attributes = dict(node_data)
+        if 'inventory' in attributes:
+            attributes['inventory'] = dict(attributes['inventory'])
+        G.add_node(node, **attributes)
+    for origin, destination, edge_data in network.edges(data=True):
+        G.add_edge(origin, destination, **dict(edge_data))
+    return G
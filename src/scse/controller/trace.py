@@ -0,0 +1,139 @@
+"""
+Action traces: the actions of the Agents of a run, to replay it without them.
+
+With the run parameter `action_trace` (a path), the Environment records, for
+every Agent call, the clock, the Agent, the actions it returned (and its next
+wakeup), as well as the uuids it generated for new orders and shipments. The
+trace is saved as a compressed numpy archive (.npz) at the end of the episode:
+typed columns for the actions, strings (node names, uuids) as codes into a
+table of strings.
+
+With the run parameter `replay_trace` (the path of a trace), the Environment
+instantiates only the Env modules of the profile (and the metric) and feeds
+the recorded actions to the controller, in the order the Agents returned them.
+Replaying a trace with the same Env parameters (seed, ASIN selection, ...)
+reproduces the states and rewards of the recorded run, without the cost of
+the Agents: useful for reproducing an incident, for regression tests of the
+controller and for profiling it.
+
+Node names and uuids are recorded as strings.
+"""
+import json
+from scse.api.actions import ActionBatch
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+_TRACE_VERSION = 1
+_NONE = -1
+# How the Agent returned its actions, so that they are replayed the same way.
+_DICTS = 0
+_BATCH = 1
+# Action columns, in the order they are recorded; strings are codes into the table of strings.
+_COLUMNS = (('type', 'int8'), ('asin', 'int64'), ('quantity', 'int64'), ('schedule', 'int64'),
+            ('origin', 'int32'), ('destination', 'int32'), ('uuid', 'int32'))
+
+
+class ActionTraceRecorder:
+    def __init__(self, asin_list, agent_names, metadata=None):
+        self._asin_list = asin_list
+        self._agent_index = {name: index for index, name in enumerate(agent_names)}
+        self._metadata = dict(metadata or {}, version=_TRACE_VERSION, agent_names=list(agent_names),
+                              asin_list=list(asin_list))
+        self._strings = {}
+        self._calls = []
+        self._batches = []
+        self._uuids = []
+
+    def _codes(self, values):
+        strings = self._strings
+        return np.array([_NONE if value is None else strings.setdefault(str(value), len(strings))
+                         for value in values], dtype=np.int32)
+
+    def record_call(self, clock, agent_name, actions, wakeup=None):
+        if isinstance(actions, ActionBatch):
+            kind, batch = _BATCH, actions
+        else:
+            kind, batch = _DICTS, ActionBatch.from_dicts(actions) if actions else None
+
+        count = 0
+        if batch is not None and len(batch):
+            count = len(batch)
+            asin = batch.asin
+            if asin.dtype.kind in 'OU':
+                asin = np.array([self._asin_list.id_of(a) for a in asin.tolist()], dtype=np.int64)
+            # Copies: the Environment may update the batch (or the dicts) as it executes them.
+            self._batches.append((batch.type.copy(), np.array(asin, dtype=np.int64),
+                                  np.array(batch.quantity, dtype=np.int64), batch.schedule.copy(),
+                                  self._codes(batch.origin.tolist()), self._codes(batch.destination.tolist()),
+                                  self._codes(batch.uuid.tolist())))
+        self._calls.append((clock, self._agent_index[agent_name], _NONE if wakeup is None else wakeup, kind, count))
+
+    def record_uuid(self, uuid):
+        self._uuids.append(self._strings.setdefault(str(uuid), len(self._strings)))
+
+    def save(self, path):
+        calls = np.array(self._calls, dtype=np.int64).reshape(len(self._calls), 5)
+        columns = {name: np.concatenate([batch[i] for batch in self._batches]) if self._batches
+                   else np.empty(0, dtype=dtype) for i, (name, dtype) in enumerate(_COLUMNS)}
+        strings = sorted(self._strings, key=self._strings.get)
+        with open(path, 'wb') as f:
+            np.savez_compressed(f,
+                                metadata=np.array(json.dumps(self._metadata)),
+                                strings=np.array(strings, dtype=str) if strings else np.empty(0, dtype='<U1'),
+                                call_clock=calls[:, 0], call_agent=calls[:, 1].astype(np.int16),
+                                call_wakeup=calls[:, 2], call_kind=calls[:, 3].astype(np.int8),
+                                call_count=calls[:, 4], uuids=np.array(self._uuids, dtype=np.int32),
+                                **columns)
+
+
+class ActionTrace:
+    def __init__(self, path):
+        with np.load(path, allow_pickle=False) as archive:
+            arrays = {name: archive[name] for name in archive.files}
+        self.metadata = json.loads(arrays.pop('metadata').item())
+        if self.metadata.get('version') != _TRACE_VERSION:
+            raise ValueError("Unsupported action trace version {}".format(self.metadata.get('version')))
+        self.agent_names = self.metadata['agent_names']
+        self.asin_list = self.metadata['asin_list']
+
+        # Strings, with None for the missing ones (code -1, i.e. the last entry).
+        self._strings = np.empty(len(arrays['strings']) + 1, dtype=object)
+        self._strings[:-1] = arrays['strings'].tolist()
+        self._strings[-1] = None
+        self._arrays = arrays
+        self._first_action = np.concatenate([[0], np.cumsum(arrays['call_count'])])
+        self._calls_by_clock = {}
+        for call, clock in enumerate(arrays['call_clock'].tolist()):
+            self._calls_by_clock.setdefault(clock, []).append(call)
+        self.reset()
+
+    def reset(self):
+        self._next_uuid = 0
+
+    def calls_at(self, clock):
+        """
+        Iterate over the (Agent name, actions, next wakeup) of the Agent calls at `clock`.
+        """
+        arrays = self._arrays
+        for call in self._calls_by_clock.get(clock, []):
+            start, end = self._first_action[call], self._first_action[call + 1]
+            batch = ActionBatch(type=arrays['type'][start:end],
+                                asin=arrays['asin'][start:end],
+                                quantity=arrays['quantity'][start:end],
+                                schedule=arrays['schedule'][start:end],
+                                origin=self._strings[arrays['origin'][start:end]],
+                                destination=self._strings[arrays['destination'][start:end]],
+                                uuid=self._strings[arrays['uuid'][start:end]])
+            actions = batch if arrays['call_kind'][call] == _BATCH else batch.to_dicts()
+            wakeup = int(arrays['call_wakeup'][call])
+            yield self.agent_names[arrays['call_agent'][call]], actions, None if wakeup == _NONE else wakeup
+
+    def next_uuid(self):
+        uuids = self._arrays['uuids']
+        if self._next_uuid >= len(uuids):
+            raise ValueError("The replay generated more uuids than the recorded run; "
+                             "were the Env parameters the same?")
+        uuid = self._strings[uuids[self._next_uuid]]
+        self._next_uuid += 1
+        return uuid
@@ -0,0 +1,392 @@
+"""
+Columnar, memory-mappable cache of CSV datasets.
+
+The first time a CSV file is opened it is parsed (in chunks) into one binary
+file per column plus an index of the rows of every ASIN. Later opens only
+check that the source file hasn't changed (size and modification time, then
+its SHA-256 checksum if these differ) and memory-map the columns, so reads no
+longer pay for CSV parsing and only touch the rows and columns they need.
+
+Layout of the cache directory:
+    meta.json               source checksum, parse options, row count and column types
+    column_<i>.bin          raw values of the i-th column (strings are
+                            dictionary encoded as int32 codes, -1 meaning missing)
+    column_<i>.bin.categories.json
+                            the dictionary of a string column
+    index.order.npy         row numbers sorted by ASIN
+    index.offsets.npy       where the rows of each ASIN code start in index.order.npy
+"""
+from os.path import join, isfile, isdir, dirname, abspath
+import os
+import shutil
+import tempfile
+import hashlib
+import json
+from scse.utils.lazy import lazy_import
+from scse.utils.storage import cache_root, file_checksum, file_lock
+
+np = lazy_import('numpy')
+pandas = lazy_import('pandas')
+
+import logging
+logger = logging.getLogger(__name__)
+
+# 2: the column types are inferred over the whole file.
+_FORMAT_VERSION = 2
+_CHUNK_SIZE = 500000
+_META_FILE = 'meta.json'
+_INDEX_ORDER_FILE = 'index.order.npy'
+_INDEX_OFFSETS_FILE = 'index.offsets.npy'
+_STRING_CODE_DTYPE = 'int32'
+
+# Names of the numpy comparison functions
+_FILTER_OPERATORS = {
+    '==': 'equal',
+    '!=': 'not_equal',
+    '<': 'less',
+    '<=': 'less_equal',
+    '>': 'greater',
+    '>=': 'greater_equal',
+}
+
+
+def default_cache_directory(fpath):
+    # Outside of the (possibly read-only) installed package, one per source file.
+    name = hashlib.sha256(abspath(fpath).encode('utf-8')).hexdigest()
+    return join(cache_root(), 'columnar', name)
+
+
+class ColumnarDataset:
+    def __init__(self, directory, meta):
+        self._directory = directory
+        self._meta = meta
+        self._columns = {}
+        self._categories = {}
+        self._code_maps = {}
+        self._index = None
+
+    @classmethod
+    def open(cls, source_path, cache_directory=None, date_columns=None, dtypes=None, index_column='asin'):
+        """
+        Open the cache of the CSV file `source_path`, (re)building it if the
+        source file changed since it was built.
+        """
+        if cache_directory is None:
+            cache_directory = default_cache_directory(source_path)
+
+        # A cache built with other parsing options (e.g. without parsing the dates) is rebuilt.
+        options = _parse_options(date_columns, dtypes, index_column)
+        meta = _read_meta(cache_directory)
+        if meta is not None and meta.get('options') != options:
+            meta = None
+        stat = os.stat(source_path)
+        if meta is not None and meta['size'] == stat.st_size and meta['mtime_ns'] == stat.st_mtime_ns:
+            return cls(cache_directory, meta)
+
+        checksum = file_checksum(source_path)
+        if meta is not None and meta['sha256'] == checksum:
+            # Touched, but not modified.
+            meta['size'] = stat.st_size
+            meta['mtime_ns'] = stat.st_mtime_ns
+            _write_json(join(cache_directory, _META_FILE), meta)
+            return cls(cache_directory, meta)
+
+        with file_lock(cache_directory.rstrip(os.sep) + '.lock'):
+            # Another process may have built it while we waited for the lock.
+            meta = _read_meta(cache_directory)
+            if meta is None or meta['sha256'] != checksum or meta.get('options') != options:
+                logger.info("Building columnar cache of {} in {}.".format(source_path, cache_directory))
+                meta = _build(source_path, cache_directory, checksum, stat, date_columns, dtypes, index_column,
+                              options)
+        return cls(cache_directory, meta)
+
+    def __len__(self):
+        return self._meta['rows']
+
+    @property
+    def columns(self):
+        return [column['name'] for column in self._meta['columns']]
+
+    def _column_meta(self, name):
+        for column in self._meta['columns']:
+            if column['name'] == name:
+                return column
+        raise KeyError("Unknown column {}".format(name))
+
+    def column(self, name):
+        """
+        Return the memory-mapped values of column `name` (zero-copy). For string
+        columns, these are the codes into `categories(name)`.
+        """
+        if name not in self._columns:
+            column = self._column_meta(name)
+            dtype = np.dtype(column['dtype'])
+            fpath = join(self._directory, column['file'])
+            if len(self) == 0:
+                values = np.empty(0, dtype=dtype)
+            else:
+                values = np.memmap(fpath, dtype=dtype, mode='r', shape=(len(self),))
+            self._columns[name] = values
+        return self._columns[name]
+
+    def categories(self, name):
+        if name not in self._categories:
+            column = self._column_meta(name)
+            if column['kind'] != 'string':
+                raise ValueError("Column {} is not a string column".format(name))
+            with open(join(self._directory, column['categories'])) as f:
+                self._categories[name] = json.load(f)
+        return self._categories[name]
+
+    def _code_of(self, name):
+        if name not in self._code_maps:
+            self._code_maps[name] = {value: code for code, value in enumerate(self.categories(name))}
+        return self._code_maps[name]
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = (np.load(join(self._directory, _INDEX_ORDER_FILE), mmap_mode='r'),
+                           np.load(join(self._directory, _INDEX_OFFSETS_FILE), mmap_mode='r'))
+        return self._index
+
+    def rows_of(self, asin_list):
+        """
+        Return the (sorted) row numbers of the ASINs in `asin_list`, using the index.
+        """
+        index_column = self._meta['index_column']
+        if index_column is None:
+            raise ValueError("The dataset has no ASIN index")
+
+        order, offsets = self._get_index()
+        code_of = self._code_of(index_column)
+        codes = [code_of[asin] for asin in asin_list if asin in code_of]
+        if not codes:
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.concatenate([order[offsets[code]:offsets[code + 1]] for code in codes])
+        rows.sort()
+        return rows
+
+    def _filter_mask(self, rows, column_name, operator, value):
+        column = self._column_meta(column_name)
+        values = self.column(column_name)
+        values = values if rows is None else values[rows]
+
+        if column['kind'] == 'string':
+            code_of = self._code_of(column_name)
+            if operator == 'in':
+                return np.isin(values, [code_of[v] for v in value if v in code_of])
+            if operator not in ('==', '!='):
+                raise ValueError("Only equality filters are supported on string column {}".format(column_name))
+            # Unknown values never match.
+            value = code_of.get(value, -2)
+        elif column['kind'] == 'datetime':
+            value = np.datetime64(value, 'ns') if operator != 'in' else [np.datetime64(v, 'ns') for v in value]
+
+        if operator == 'in':
+            return np.isin(values, value)
+        if operator not in _FILTER_OPERATORS:
+            raise ValueError("Unknown filter operator {}".format(operator))
+        return getattr(np, _FILTER_OPERATORS[operator])(values, value)
+
+    def read(self, columns=None, asin_list=None, filters=None):
+        """
+        Read the dataset as a DataFrame.
+
+        `asin_list` restricts the rows to the given ASINs (using the index) and
+        `filters` is a list of (column, operator, value) conditions, with
+        operators ==, !=, <, <=, >, >= and 'in'. Both are evaluated before any
+        of the other columns are read.
+        """
+        rows = None if asin_list is None else self.rows_of(asin_list)
+
+        for column_name, operator, value in (filters or []):
+            mask = self._filter_mask(rows, column_name, operator, value)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask]
+
+        data = {}
+        for name in (columns or self.columns):
+            column = self._column_meta(name)
+            values = self.column(name)
+            values = np.array(values) if rows is None else values[rows]
+            if column['kind'] == 'string':
+                categories = np.array(self.categories(name) + [None], dtype=object)
+                values = categories[values]
+            data[name] = values
+
+        return pandas.DataFrame(data)
+
+
+def _read_meta(cache_directory):
+    fpath = join(cache_directory, _META_FILE)
+    if not isfile(fpath):
+        return None
+    try:
+        with open(fpath) as f:
+            meta = json.load(f)
+    except ValueError:
+        return None
+    if meta.get('version') != _FORMAT_VERSION:
+        return None
+    return meta
+
+
+def _write_json(fpath, data):
+    tmp_fpath = fpath + '.tmp'
+    with open(tmp_fpath, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_fpath, fpath)
+
+
+def _parse_options(date_columns, dtypes, index_column):
+    # The options the CSV file is parsed with, as recorded in meta.json.
+    def dtype_name(dtype):
+        return dtype.__name__ if isinstance(dtype, type) else str(dtype)
+
+    if isinstance(dtypes, dict):
+        dtypes = {name: dtype_name(dtype) for name, dtype in dtypes.items()}
+    elif dtypes is not None:
+        dtypes = dtype_name(dtypes)
+    if date_columns is not None and not isinstance(date_columns, bool):
+        date_columns = list(date_columns)
+    return {'date_columns': date_columns, 'dtypes': dtypes, 'index_column': index_column}
+
+
+def _column_file(position):
+    # Column names may not be valid file names.
+    return 'column_{}.bin'.format(position)
+
+
+class _StringColumn(Exception):
+    # Raised when a column inferred as numeric from the first chunks turns out to hold strings.
+    def __init__(self, name):
+        super().__init__(name)
+        self.name = name
+
+
+def _build(source_path, cache_directory, checksum, stat, date_columns, dtypes, index_column, options):
+    parent = dirname(cache_directory.rstrip(os.sep)) or '.'
+    os.makedirs(parent, exist_ok=True)
+
+    if dtypes is None or isinstance(dtypes, dict):
+        # ASINs can look like numbers (e.g. ISBNs), but they must be indexed as strings.
+        dtypes = dict(dtypes or {})
+        dtypes.setdefault(index_column, str)
+
+    # The column types are inferred over the whole file: numeric types are
+    # promoted (e.g. int64 to float64 when values go missing) as the chunks
+    # come, rewriting what was written so far. The values already parsed as
+    # numbers can't be turned back into their text (e.g. "007"), so a column
+    # that turns out to hold strings is instead read again, as strings.
+    while True:
+        build_directory = tempfile.mkdtemp(prefix='.build-', dir=parent)
+        try:
+            return _build_columns(source_path, cache_directory, build_directory, checksum, stat, date_columns,
+                                  dtypes, index_column, options)
+        except _StringColumn as e:
+            shutil.rmtree(build_directory, ignore_errors=True)
+            if not isinstance(dtypes, dict) or dtypes.get(e.name) is str:
+                raise ValueError("Column {} changes type while loading; pass its dtype explicitly.".format(e.name))
+            logger.info("Column {} of {} holds strings, loading it again.".format(e.name, source_path))
+            dtypes[e.name] = str
+        except BaseException:
+            shutil.rmtree(build_directory, ignore_errors=True)
+            raise
+
+
+def _build_columns(source_path, cache_directory, build_directory, checksum, stat, date_columns, dtypes,
+                   index_column, options):
+    columns = None
+    dictionaries = {}
+    rows = 0
+    for chunk in pandas.read_csv(source_path, chunksize=_CHUNK_SIZE, parse_dates=date_columns, dtype=dtypes):
+        described = [_describe_column(position, name, chunk[name]) for position, name in enumerate(chunk.columns)]
+        if columns is None:
+            columns = described
+            dictionaries = {column['name']: {} for column in columns if column['kind'] == 'string'}
+        else:
+            for column, chunk_column in zip(columns, described):
+                _promote_column(build_directory, column, chunk_column, rows)
+
+        for column in columns:
+            values = _encode_chunk(column, chunk[column['name']], dictionaries)
+            with open(join(build_directory, column['file']), 'ab') as f:
+                f.write(values.tobytes())
+        rows += len(chunk)
+
+    columns = columns or []
+    for column in columns:
+        if column['kind'] == 'string':
+            column['categories'] = column['file'] + '.categories.json'
+            _write_json(join(build_directory, column['categories']), list(dictionaries[column['name']]))
+
+    if index_column not in [column['name'] for column in columns]:
+        index_column = None
+    if index_column is not None:
+        codes = np.fromfile(join(build_directory, _column_file(
+            [column['name'] for column in columns].index(index_column))), dtype=_STRING_CODE_DTYPE)
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=len(dictionaries.get(index_column, {})))
+        offsets = np.concatenate([[0], np.cumsum(counts)]) + np.count_nonzero(codes < 0)
+        np.save(join(build_directory, _INDEX_ORDER_FILE), order)
+        np.save(join(build_directory, _INDEX_OFFSETS_FILE), offsets)
+
+    meta = {
+        'version': _FORMAT_VERSION,
+        'source': source_path,
+        'sha256': checksum,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'rows': rows,
+        'columns': columns,
+        'index_column': index_column,
+        'options': options,
+    }
+    _write_json(join(build_directory, _META_FILE), meta)
+
+    if isdir(cache_directory):
+        shutil.rmtree(cache_directory)
+    os.replace(build_directory, cache_directory)
+    return meta
+
+
+def _describe_column(position, name, series):
+    if pandas.api.types.is_datetime64_any_dtype(series):
+        kind, dtype = 'datetime', 'datetime64[ns]'
+    elif pandas.api.types.is_bool_dtype(series) or pandas.api.types.is_numeric_dtype(series):
+        kind, dtype = 'numeric', series.dtype.str
+    else:
+        kind, dtype = 'string', np.dtype(_STRING_CODE_DTYPE).str
+    return {'name': name, 'kind': kind, 'dtype': dtype, 'file': _column_file(position)}
+
+
+def _promote_column(build_directory, column, chunk_column, rows):
+    # Update `column` to also hold the values of a chunk described as `chunk_column`.
+    if column['kind'] == chunk_column['kind'] == 'numeric':
+        dtype = np.result_type(np.dtype(column['dtype']), np.dtype(chunk_column['dtype']))
+        if dtype != np.dtype(column['dtype']):
+            fpath = join(build_directory, column['file'])
+            if rows:
+                np.fromfile(fpath, dtype=column['dtype']).astype(dtype).tofile(fpath)
+            column['dtype'] = dtype.str
+    elif column['kind'] != chunk_column['kind']:
+        if 'datetime' in (column['kind'], chunk_column['kind']):
+            raise ValueError("Column {} changes type from {} to {} while loading; pass its dtype explicitly.".format(
+                column['name'], column['dtype'], chunk_column['dtype']))
+        raise _StringColumn(column['name'])
+
+
+def _encode_chunk(column, series, dictionaries):
+    dtype = np.dtype(column['dtype'])
+    if column['kind'] == 'string':
+        dictionary = dictionaries[column['name']]
+        codes, uniques = pandas.factorize(series)
+        chunk_to_global = np.array([dictionary.setdefault(str(value), len(dictionary)) for value in uniques],
+                                   dtype=_STRING_CODE_DTYPE)
+        encoded = np.full(len(codes), -1, dtype=_STRING_CODE_DTYPE)
+        present = codes >= 0
+        encoded[present] = chunk_to_global[codes[present]]
+        return encoded
+
+    # Of a type the column was promoted to, see _promote_column().
+    return series.to_numpy().astype(dtype)
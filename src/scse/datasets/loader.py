@@ -2,73 +2,214 @@
 Utility for loading datasets as Dataframes from their source files.
 This also abstracts the fact that they are CSV.
 """
-from os.path import dirname, join, isfile
+from os.path import abspath, dirname, join, isfile
+import bisect
+import csv
+import hashlib
 import os
-import pandas
 import json
 import logging
-import boto3
+from scse.datasets.columnar import ColumnarDataset
+from scse.utils.lazy import lazy_import
+from scse.utils.storage import ContentCache, S3Store, cache_root, store_from_uri
+
+np = lazy_import('numpy')
+pandas = lazy_import('pandas')
 
 logger = logging.getLogger(__name__)
 
 """
-Datasets are simply modeled as files in S3. We do not, currently, treat
-datasets as date-based partitions in AWS Glue, which we may be forced to do as
-we expand the support for new datasets.
+Datasets are simply modeled as objects in a store (S3 by default). We do not,
+currently, treat datasets as date-based partitions in AWS Glue, which we may
+be forced to do as we expand the support for new datasets.
+
+Datasets shipped with the package are used as they are; all others are fetched
+into the local content-addressed cache (see scse.utils.storage). Set
+SCSE_DATASET_STORE to 's3://bucket/prefix/' or to a local directory to fetch
+them from somewhere else.
 """
 
 #Note you need to replace these (bucket, folder, filename) for your aws account
 _BUCKET_NAME = 'YOUR_BUCKET_NAME_HERE'
 _FOLDER_NAME = 'datasets/'
+_DATASET_STORE_VARIABLE = 'SCSE_DATASET_STORE'
 _SHIPCOST_ESTIMATOR = 'SHIPCOST_DATA_EXAMPLE.csv'
 
 
-def _download_s3_file(filename):
-    module_path = dirname(__file__)
+def get_dataset_store():
+    uri = os.environ.get(_DATASET_STORE_VARIABLE)
+    if uri:
+        return store_from_uri(uri)
+    return S3Store(_BUCKET_NAME, _FOLDER_NAME)
 
-    logger.info("Downloading S3 file = {}.".format(filename))
+
+def _fetch_file(filename, store = None):
+    store = store or get_dataset_store()
+    logger.info("Fetching dataset {} from {}.".format(filename, store.uri(filename)))
 
     # Catch two common cases so that we can log better messages, otherwise let the other exceptions
     # flow through.
     try:
-        s3 = boto3.client('s3')
-        s3.download_file(_BUCKET_NAME, join(_FOLDER_NAME, filename), join(module_path, filename))
+        return ContentCache().fetch(store, filename)
     except MemoryError:
-        msg = "Out of memory loading dataset {}.".format(name)
+        msg = "Out of memory loading dataset {}.".format(filename)
         logger.error(msg)
         raise ValueError(msg)
     except FileNotFoundError:
-        msg = "Error loading dataset {} from S3. You may not have the right credentials.".format(name)
+        msg = "Error loading dataset {} from {}. It may not exist or you may not have the right credentials.".format(
+            filename, store.uri(filename))
         logger.error(msg)
         raise ValueError(msg)
 
 
-def _load_csv(filename, date_columns = None, dtypes = None, low_memory = False, asin_list = []):
+def _local_path(filename):
     module_path = dirname(__file__)
     fpath = join(module_path, filename)
 
     if not isfile(fpath):
-        # Let's download the file locally, this not only expedites future use, but also allows people to more
+        # Fetch the file into the local cache, this not only expedites future use, but also allows people to more
         # easily play with the dataset.
         logger.info("Couldn't find local filepath = {}.".format(fpath))
-        _download_s3_file(filename)
+        fpath = _fetch_file(filename)
 
+    return fpath
+
+
+def _load_csv(filename, date_columns = None, dtypes = None, low_memory = False, asin_list = []):
+    fpath = _local_path(filename)
+
+    # The CSV is only parsed the first time (or after it changes); afterwards
+    # it is read from its memory-mapped columnar cache.
+    dataset = ColumnarDataset.open(fpath, date_columns = date_columns, dtypes = dtypes)
     if low_memory == True:
-        iter_csv = pandas.read_csv(fpath, iterator=True, chunksize=1000)
-        df = pandas.concat([chunk[chunk['asin'].isin(asin_list)] for chunk in iter_csv])
+        df = dataset.read(asin_list = asin_list)
     else:
-        df = pandas.read_csv(fpath, parse_dates = date_columns, dtype = dtypes)
+        df = dataset.read()
 
     return df
 
-def _load_json(filename):
-    module_path = dirname(__file__)
-    fpath = join(module_path, filename)
+def _iter_csv(filename, chunksize, date_columns = None, dtypes = None, usecols = None, offset = None):
+    fpath = _local_path(filename)
+    if offset is None:
+        return pandas.read_csv(fpath, chunksize = chunksize, parse_dates = date_columns,
+                               dtype = dtypes, usecols = usecols)
+    return _iter_csv_from(fpath, offset, chunksize, date_columns, dtypes, usecols)
 
-    if not isfile(fpath):
-        # Let's download the file locally, this not only expedites future use, but also allows people to more
-        # easily play with the dataset.
-        _download_s3_file(filename)
+
+def _iter_csv_from(fpath, offset, chunksize, date_columns, dtypes, usecols):
+    # The rows starting at byte `offset`, with the columns of the header.
+    with open(fpath, 'rb') as f:
+        header = _csv_row(f.readline())
+        f.seek(offset)
+        yield from pandas.read_csv(f, header = None, names = header, chunksize = chunksize,
+                                   parse_dates = date_columns, dtype = dtypes, usecols = usecols)
+
+
+def _csv_row(line):
+    return next(csv.reader([line.decode('utf-8')]))
+
+
+def _is_compressed(fpath):
+    return fpath.endswith(('.gz', '.bz2', '.zip', '.xz', '.zst'))
+
+
+def iter_chunks(filename, chunksize = 100000, dtypes = None, usecols = None):
+    """
+    Stream a CSV dataset as DataFrames of (at most) `chunksize` rows.
+    """
+    return _iter_csv(filename, chunksize, dtypes = dtypes, usecols = usecols)
+
+
+def date_partition_offsets(filename, date_column = 'date'):
+    """
+    Index of the date partitions of a CSV file sorted by `date_column` (with
+    one row per line): the dates, as they appear in the file, and the byte
+    offsets of their first rows. It is built by a single scan of the file,
+    and cached until the file changes.
+    """
+    fpath = _local_path(filename)
+    stat = os.stat(fpath)
+    key = hashlib.sha256('{}\0{}'.format(abspath(fpath), date_column).encode('utf-8')).hexdigest()
+    index_path = join(cache_root(), 'date_index', key + '.json')
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+        if index['size'] == stat.st_size and index['mtime_ns'] == stat.st_mtime_ns:
+            return index['dates'], index['offsets']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    dates, offsets = [], []
+    with open(fpath, 'rb') as f:
+        header = f.readline()
+        position = _csv_row(header).index(date_column)
+        offset = len(header)
+        previous = None
+        for line in f:
+            if line.strip():
+                if b'"' in line:
+                    date = _csv_row(line)[position]
+                else:
+                    date = line.split(b',', position + 1)[position].decode('utf-8')
+                date = date.strip()
+                if date != previous:
+                    dates.append(date)
+                    offsets.append(offset)
+                    previous = date
+            offset += len(line)
+
+    os.makedirs(dirname(index_path), exist_ok = True)
+    tmp_path = index_path + '.{}.tmp'.format(os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'dates': dates, 'offsets': offsets}, f)
+    os.replace(tmp_path, index_path)
+    return dates, offsets
+
+
+def iter_date_partitions(filename, date_column = 'date', chunksize = 100000, dtypes = None, start = None):
+    """
+    Stream a CSV file sorted by `date_column`, yielding one (date, DataFrame)
+    partition per distinct date, in order. Only one chunk of rows (plus the
+    rows of the date it ends on) is held in memory at a time.
+
+    With `start`, the partitions before that date are skipped: reading seeks
+    to the first row of the first partition on or after it (using
+    date_partition_offsets), unless the file is compressed.
+    """
+    offset = None
+    if start is not None and not _is_compressed(_local_path(filename)):
+        dates, offsets = date_partition_offsets(filename, date_column)
+        first = bisect.bisect_left(pandas.to_datetime(dates).tolist(), pandas.Timestamp(start))
+        if first == len(dates):
+            return
+        offset = offsets[first]
+
+    pending = None
+    last_date = None
+    for chunk in _iter_csv(filename, chunksize, date_columns = [date_column], dtypes = dtypes, offset = offset):
+        if pending is not None:
+            chunk = pandas.concat([pending, chunk], ignore_index = True)
+
+        dates = chunk[date_column].to_numpy()
+        if len(dates) == 0:
+            continue
+        if (last_date is not None and dates[0] < last_date) or (dates[1:] < dates[:-1]).any():
+            raise ValueError("Dataset {} is not sorted by {}.".format(filename, date_column))
+
+        # The last date may continue in the next chunk.
+        boundaries = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+        first_rows = np.concatenate([[0], boundaries])
+        for first_row, end_row in zip(first_rows[:-1], first_rows[1:]):
+            yield pandas.Timestamp(dates[first_row]), chunk.iloc[first_row:end_row]
+        pending = chunk.iloc[first_rows[-1]:]
+        last_date = dates[-1]
+
+    if pending is not None and len(pending) > 0:
+        yield pandas.Timestamp(last_date), pending
+
+
+def _load_json(filename):
+    fpath = _local_path(filename)
 
     with open(fpath) as f:
         data = json.load(f)
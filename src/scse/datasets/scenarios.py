@@ -0,0 +1,103 @@
+"""
+Pre-generated demand scenarios, to compare policies on common random numbers.
+
+A scenario set holds the demand of every replication, period and ASIN, drawn
+up front (one vectorized draw per replication) and stored as a single
+memory-mapped array, so that parallel workers share its pages instead of each
+re-drawing demand. Evaluating every policy against the same scenarios removes
+the sampling noise from the differences between them.
+
+Replication r is the demand PoissonDemandDistribution would realize for the
+ASINs of the scenarios with the simulation seed `seeds[r]`: the same mean
+demand (which the forecasting modules see) and the same realizations, drawn
+by the same functions. As the random numbers of an ASIN only depend on the
+seed, the ASIN and the period, the scenarios must be generated for the ASINs
+the runs select. The ScenarioCustomerOrder
+module (scse.modules.customer.scenario_customer_order) places these orders,
+picking the replication of its simulation seed.
+
+A scenario set is a directory holding:
+ - demand.npy: the demand (replications x periods x ASINs, int32),
+ - meta.json: the seeds of the replications, the ASINs and the demand
+   parameters; it is written last, so a scenario set is complete once it
+   exists.
+"""
+from os.path import join
+import json
+import os
+from scse.services.demand_distribution import asin_keys, draw_demand, draw_mean_demand, PoissonDemandDistribution
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+import logging
+logger = logging.getLogger(__name__)
+
+_SCENARIOS_VERSION = 1
+_META = 'meta.json'
+_DEMAND = 'demand.npy'
+
+
+def generate_scenarios(path, seeds, time_horizon, asin_list,
+                       customer_max_mean=PoissonDemandDistribution._DEFAULT_MAX_MEAN):
+    """
+    Draw the demand of a replication per seed in `seeds`, over `time_horizon`
+    periods for the ASINs of `asin_list`, and save it to the directory `path`.
+    """
+    asin_list = [str(asin) for asin in asin_list]
+    seeds = [int(seed) for seed in seeds]
+    if len(set(seeds)) != len(seeds):
+        raise ValueError("The seeds of the scenarios must be unique")
+    os.makedirs(path, exist_ok=True)
+    # Scenarios being overwritten are incomplete until the new meta.json is written.
+    if os.path.isfile(join(path, _META)):
+        os.remove(join(path, _META))
+
+    demand = np.lib.format.open_memmap(join(path, _DEMAND), mode='w+', dtype=np.int32,
+                                       shape=(len(seeds), time_horizon, len(asin_list)))
+    keys = asin_keys(asin_list)
+    periods = np.arange(time_horizon)
+    for replication, seed in enumerate(seeds):
+        # Like PoissonDemandDistribution: the means of the whole horizon, then their realizations.
+        mean_demand = draw_mean_demand(seed, keys, periods, customer_max_mean)
+        demand[replication] = draw_demand(seed, keys, periods, mean_demand)
+    demand.flush()
+    del demand
+
+    meta = {
+        'version': _SCENARIOS_VERSION,
+        'seeds': seeds,
+        'time_horizon': time_horizon,
+        'asin_list': asin_list,
+        'customer_max_mean': customer_max_mean,
+    }
+    tmp_path = join(path, _META + '.{}.tmp'.format(os.getpid()))
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, join(path, _META))
+    logger.debug("Generated {} demand scenarios in {}.".format(len(seeds), path))
+    return DemandScenarios(path)
+
+
+class DemandScenarios:
+    def __init__(self, path, mmap=True):
+        with open(join(path, _META)) as f:
+            meta = json.load(f)
+        if meta.get('version') != _SCENARIOS_VERSION:
+            raise ValueError("Unsupported demand scenarios version {}".format(meta.get('version')))
+        self.path = path
+        self.seeds = meta['seeds']
+        self.time_horizon = meta['time_horizon']
+        self.asin_list = meta['asin_list']
+        self.customer_max_mean = meta['customer_max_mean']
+        self._replications = {seed: replication for replication, seed in enumerate(self.seeds)}
+        # Read-only mapping: the pages are shared by all the processes reading the scenarios.
+        self.demand = np.load(join(path, _DEMAND), mmap_mode='r' if mmap else None)
+
+    def __len__(self):
+        return len(self.seeds)
+
+    def replication_of(self, seed):
+        if seed not in self._replications:
+            raise ValueError("No demand scenario for seed {} in {}".format(seed, self.path))
+        return self._replications[seed]
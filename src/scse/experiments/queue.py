@@ -0,0 +1,248 @@
+"""
+Durable queue of simulation runs, in a local SQLite database.
+
+Each job is a run spec: the keyword arguments of SupplyChainEnvironment
+(profile, seed, horizon, any module parameters) as a JSON object. Workers
+claim jobs atomically, run them and store their result (or error) back.
+
+Claimed jobs are leased: a worker holds a job for `lease_seconds`, and keeps
+extending the lease while it runs it. If the worker (or the whole driver)
+dies, the lease expires and the job is claimed again by the next worker, up
+to `max_attempts` times. Restarting the workers on the same database
+therefore resumes the experiment where it stopped.
+
+The database uses write-ahead logging, so that workers only wait for each
+other while they claim or complete a job (for a few milliseconds), not while
+jobs run.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+from scse.utils.sqlite import connect, Transaction
+
+import logging
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+Job = namedtuple('Job', ['id', 'spec', 'attempts'])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    spec TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    submitted REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+class JobQueue:
+    _DEFAULT_LEASE_SECONDS = 300
+    _DEFAULT_MAX_ATTEMPTS = 3
+    _BUSY_TIMEOUT_SECONDS = 60
+
+    def __init__(self, path, lease_seconds=_DEFAULT_LEASE_SECONDS, max_attempts=_DEFAULT_MAX_ATTEMPTS):
+        self._path = path
+        self._lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+        self._connection = connect(path, self._BUSY_TIMEOUT_SECONDS)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        self._connection.close()
+
+    def _transaction(self):
+        return Transaction(self._connection, self._lock)
+
+    def _query(self, sql, parameters=()):
+        # Reads don't take the database's write lock (no BEGIN IMMEDIATE): with WAL they see the
+        # last committed state without waiting for writers. self._lock only serializes the threads
+        # of this process sharing the connection (e.g. the lease heartbeat).
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def submit(self, specs):
+        """
+        Add the run specs `specs` to the queue, returning their job ids.
+        """
+        now = time.time()
+        ids = []
+        with self._transaction() as cursor:
+            for spec in specs:
+                cursor.execute('INSERT INTO jobs (spec, state, submitted, updated) VALUES (?, ?, ?, ?)',
+                               (json.dumps(spec, sort_keys=True), PENDING, now, now))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def claim(self, worker):
+        """
+        Lease the oldest pending job (or job with an expired lease) to `worker`,
+        returning it, or None if there is none.
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            # Jobs whose workers died too many times are given up on.
+            cursor.execute('UPDATE jobs SET state = ?, error = ?, lease_owner = NULL, updated = ? '
+                           'WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+                           (FAILED, 'lease expired after {} attempts'.format(self._max_attempts), now,
+                            RUNNING, now, self._max_attempts))
+            row = cursor.execute('SELECT id, spec, attempts FROM jobs '
+                                 'WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY id LIMIT 1',
+                                 (PENDING, RUNNING, now)).fetchone()
+            if row is None:
+                return None
+            job_id, spec, attempts = row
+            if attempts > 0:
+                logger.info("Resuming job {} (attempt {}).".format(job_id, attempts + 1))
+            cursor.execute('UPDATE jobs SET state = ?, attempts = ?, lease_owner = ?, lease_expires = ?, updated = ? '
+                           'WHERE id = ?', (RUNNING, attempts + 1, worker, now + self._lease_seconds, now, job_id))
+        return Job(job_id, json.loads(spec), attempts + 1)
+
+    def _update_leased(self, job_id, worker, assignments, values):
+        # Only the worker holding the lease may update the job.
+        with self._transaction() as cursor:
+            cursor.execute('UPDATE jobs SET {}, updated = ? WHERE id = ? AND state = ? AND lease_owner = ?'.format(
+                assignments), tuple(values) + (time.time(), job_id, RUNNING, worker))
+            return cursor.rowcount == 1
+
+    def extend_lease(self, job_id, worker):
+        return self._update_leased(job_id, worker, 'lease_expires = ?', [time.time() + self._lease_seconds])
+
+    def complete(self, job_id, worker, result):
+        """
+        Store the result of a job; returns False if `worker` lost its lease.
+        """
+        return self._update_leased(job_id, worker, 'state = ?, result = ?, error = NULL, lease_owner = NULL',
+                                   [DONE, json.dumps(result)])
+
+    def fail(self, job_id, worker, error):
+        """
+        Record the failure of a job, which is retried until it failed
+        `max_attempts` times.
+        """
+        with self._transaction() as cursor:
+            row = cursor.execute('SELECT attempts FROM jobs WHERE id = ? AND state = ? AND lease_owner = ?',
+                                 (job_id, RUNNING, worker)).fetchone()
+            if row is None:
+                return False
+            state = FAILED if row[0] >= self._max_attempts else PENDING
+            cursor.execute('UPDATE jobs SET state = ?, error = ?, lease_owner = NULL, lease_expires = NULL, '
+                           'updated = ? WHERE id = ?', (state, error, time.time(), job_id))
+        return True
+
+    def counts(self):
+        rows = self._query('SELECT state, COUNT(*) FROM jobs GROUP BY state')
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(rows)
+        return counts
+
+    def get(self, job_id):
+        """
+        Return the state, spec, attempts, result and error of a job.
+        """
+        rows = self._query('SELECT state, spec, attempts, result, error FROM jobs WHERE id = ?', (job_id,))
+        if not rows:
+            raise KeyError("Unknown job {}".format(job_id))
+        state, spec, attempts, result, error = rows[0]
+        return {'id': job_id, 'state': state, 'spec': json.loads(spec), 'attempts': attempts,
+                'result': None if result is None else json.loads(result), 'error': error}
+
+    def results(self):
+        """
+        Iterate over (job id, spec, result) of the completed jobs.
+        """
+        rows = self._query('SELECT id, spec, result FROM jobs WHERE state = ? ORDER BY id', (DONE,))
+        for job_id, spec, result in rows:
+            yield job_id, json.loads(spec), json.loads(result)
+
+
+def run_job(spec):
+    """
+    Default job: run the simulation, returning its summary.
+    """
+    from scse.controller.miniscot import SupplyChainEnvironment
+    start_time = time.time()
+    # Concurrent jobs would overwrite each other's csv log.
+    env = SupplyChainEnvironment(**dict(spec, metrics_log_path=None))
+    state = env.run()
+    return {'episode_reward': env.episode_reward, 'clock': state['clock'], 'wall_time': time.time() - start_time}
+
+
+def default_worker_name():
+    return '{}:{}:{}'.format(socket.gethostname(), os.getpid(), threading.get_ident())
+
+
+def work(queue_path, worker=None, execute=run_job, lease_seconds=JobQueue._DEFAULT_LEASE_SECONDS,
+         max_attempts=JobQueue._DEFAULT_MAX_ATTEMPTS, max_jobs=None):
+    """
+    Claim and execute jobs until the queue has no claimable job left (or
+    `max_jobs` were executed). Returns the number of jobs executed.
+    """
+    worker = worker or default_worker_name()
+    queue = JobQueue(queue_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    executed = 0
+    try:
+        while max_jobs is None or executed < max_jobs:
+            job = queue.claim(worker)
+            if job is None:
+                break
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_extend_lease, args=(queue, job.id, worker, lease_seconds, stop),
+                                         daemon=True)
+            heartbeat.start()
+            try:
+                result = execute(job.spec)
+            except Exception:
+                logger.exception("Job {} failed.".format(job.id))
+                stop.set()
+                heartbeat.join()
+                queue.fail(job.id, worker, traceback.format_exc())
+            else:
+                stop.set()
+                heartbeat.join()
+                if not queue.complete(job.id, worker, result):
+                    logger.warning("Lost the lease of job {}; its result was discarded.".format(job.id))
+            executed += 1
+    finally:
+        queue.close()
+    return executed
+
+
+def _extend_lease(queue, job_id, worker, lease_seconds, stop):
+    while not stop.wait(lease_seconds / 3):
+        if not queue.extend_lease(job_id, worker):
+            logger.warning("Lost the lease of job {}.".format(job_id))
+            return
+
+
+def run_workers(queue_path, workers=None, **work_parameters):
+    """
+    Execute the jobs of the queue in `workers` processes (by default, one per
+    core). Returns the number of jobs executed.
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(work, queue_path, **work_parameters) for _ in range(workers)]
+        return sum(future.result() for future in futures)
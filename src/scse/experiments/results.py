@@ -0,0 +1,258 @@
+"""
+Indexed store of the results of simulation runs, in a local SQLite database.
+
+Every recorded run appends:
+ - its metadata (profile, seed, horizon, all its parameters, the time profile
+   of the Environment) and summary (episode reward, number of steps, wall time),
+ - its parameters, one row per name and value, indexed so that runs can be
+   selected and grouped by any of them (e.g. by service level),
+ - its per-step rewards and the per-step quantities logged by the metric,
+ - its total reward per ASIN, indexed by ASIN.
+
+Unlike the (opt-in) csv log of the metric, which each run overwrites, the
+store keeps the results of all the runs, which makes cross-run analytics
+(e.g. the mean episode reward by service level over thousands of runs) a
+single indexed query. Workers of an experiment queue can share a store: use
+`functools.partial(record_job, results_path)` as their `execute` function.
+"""
+import inspect
+import json
+import threading
+import time
+from scse.utils.sqlite import connect, Transaction
+
+import logging
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    profile TEXT NOT NULL,
+    simulation_seed INTEGER,
+    time_horizon INTEGER,
+    parameters TEXT NOT NULL,
+    time_profile TEXT,
+    episode_reward REAL,
+    steps INTEGER,
+    wall_time REAL,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_profile ON runs (profile, episode_reward);
+CREATE TABLE IF NOT EXISTS run_parameters (
+    run_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS run_parameters_value ON run_parameters (name, value, run_id);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id INTEGER NOT NULL,
+    clock INTEGER NOT NULL,
+    reward REAL,
+    episode_reward REAL,
+    PRIMARY KEY (run_id, clock)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS step_metrics (
+    run_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    clock INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name, clock)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS asin_rewards (
+    run_id INTEGER NOT NULL,
+    asin TEXT NOT NULL,
+    reward REAL,
+    PRIMARY KEY (run_id, asin)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS asin_rewards_asin ON asin_rewards (asin, run_id);
+"""
+
+# Aggregates available to summarize()
+_AGGREGATES = ('AVG', 'MIN', 'MAX', 'SUM', 'COUNT')
+# Columns of runs which can be summarized
+_RUN_METRICS = ('episode_reward', 'steps', 'wall_time')
+
+
+def _parameter_value(value):
+    # Scalars are stored as such (so that they compare and sort as numbers), anything else as JSON.
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if hasattr(value, 'item'):
+        return value.item()
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def default_run_parameters():
+    """
+    The default arguments of SupplyChainEnvironment, recorded with every run
+    (so that runs can be grouped by them even if they were not given).
+    """
+    from scse.controller.miniscot import SupplyChainEnvironment
+    signature = inspect.signature(SupplyChainEnvironment.__init__)
+    return {name: parameter.default for name, parameter in signature.parameters.items()
+            if parameter.default is not inspect.Parameter.empty}
+
+
+class ResultsStore:
+    _BUSY_TIMEOUT_SECONDS = 60
+
+    def __init__(self, path):
+        self._path = path
+        self._connection = connect(path, self._BUSY_TIMEOUT_SECONDS)
+        self._lock = threading.Lock()
+        self._connection.executescript(_SCHEMA)
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        self._connection.close()
+
+    def query(self, sql, parameters=()):
+        """
+        Run a (read) SQL query on the store, returning its rows.
+        """
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def add_run(self, parameters, episode_reward, steps=(), asin_rewards=None, step_metrics=(),
+                time_profile=None, wall_time=None):
+        """
+        Append a run, returning its id:
+         - parameters: the arguments of SupplyChainEnvironment,
+         - steps: (clock, reward, episode reward) of each step,
+         - asin_rewards: {ASIN: total reward},
+         - step_metrics: (clock, {name: value}) of each step.
+        """
+        steps = list(steps)
+        parameters = dict(parameters)
+        with Transaction(self._connection, self._lock) as cursor:
+            cursor.execute('INSERT INTO runs (profile, simulation_seed, time_horizon, parameters, time_profile, '
+                           'episode_reward, steps, wall_time, recorded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (parameters.get('profile'), parameters.get('simulation_seed'),
+                            parameters.get('time_horizon'), json.dumps(parameters, sort_keys=True, default=str),
+                            None if time_profile is None else json.dumps(time_profile, sort_keys=True),
+                            float(episode_reward), len(steps), wall_time, time.time()))
+            run_id = cursor.lastrowid
+            cursor.executemany('INSERT INTO run_parameters (run_id, name, value) VALUES (?, ?, ?)',
+                               [(run_id, name, _parameter_value(value)) for name, value in parameters.items()])
+            cursor.executemany('INSERT INTO steps (run_id, clock, reward, episode_reward) VALUES (?, ?, ?, ?)',
+                               [(run_id, int(clock), float(reward), float(total)) for clock, reward, total in steps])
+            cursor.executemany('INSERT INTO step_metrics (run_id, name, clock, value) VALUES (?, ?, ?, ?)',
+                               [(run_id, name, int(clock), float(value))
+                                for clock, values in step_metrics for name, value in values.items()])
+            if asin_rewards:
+                cursor.executemany('INSERT INTO asin_rewards (run_id, asin, reward) VALUES (?, ?, ?)',
+                                   [(run_id, asin, float(reward)) for asin, reward in asin_rewards.items()])
+        return run_id
+
+    def record(self, **run_parameters):
+        """
+        Run the simulation defined by `run_parameters` (the arguments of
+        SupplyChainEnvironment) and append it, returning its id.
+        """
+        from scse.controller.miniscot import SupplyChainEnvironment
+        parameters = dict(default_run_parameters(), **run_parameters)
+        parameters.pop('metrics_log_path', None)
+
+        start_time = time.time()
+        # The store replaces the csv log.
+        env = SupplyChainEnvironment(**dict(parameters, metrics_log_path=None))
+        steps = []
+        reward_by_asin = 0
+        for record in env.iter_steps():
+            steps.append((record.clock, record.reward, record.episode_reward))
+            reward_by_asin = reward_by_asin + record.reward_by_asin
+        wall_time = time.time() - start_time
+
+        asin_rewards = dict(zip(env.asin_list, getattr(reward_by_asin, 'tolist', lambda: [])()))
+        get_metrics_log = getattr(env.metrics, 'get_metrics_log', None)
+        step_metrics = []
+        if get_metrics_log is not None:
+            for row in get_metrics_log():
+                row = dict(row)
+                step_metrics.append((row.pop('timestep'), row))
+
+        return self.add_run(parameters, env.episode_reward, steps, asin_rewards, step_metrics,
+                            env.time_profile, wall_time)
+
+    def run_ids(self, profile=None, **parameters):
+        """
+        Ids of the runs of `profile` (any, if None) with the given parameter values.
+        """
+        sql = 'SELECT id FROM runs'
+        conditions, values = [], []
+        if profile is not None:
+            conditions.append('profile = ?')
+            values.append(profile)
+        for name, value in parameters.items():
+            conditions.append('id IN (SELECT run_id FROM run_parameters WHERE name = ? AND value = ?)')
+            values += [name, _parameter_value(value)]
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return [run_id for run_id, in self.query(sql + ' ORDER BY id', values)]
+
+    def get_run(self, run_id):
+        rows = self.query('SELECT profile, simulation_seed, time_horizon, parameters, time_profile, episode_reward, '
+                          'steps, wall_time, recorded FROM runs WHERE id = ?', (run_id,))
+        if not rows:
+            raise KeyError("Unknown run {}".format(run_id))
+        profile, seed, horizon, parameters, time_profile, episode_reward, steps, wall_time, recorded = rows[0]
+        return {'id': run_id, 'profile': profile, 'simulation_seed': seed, 'time_horizon': horizon,
+                'parameters': json.loads(parameters),
+                'time_profile': None if time_profile is None else json.loads(time_profile),
+                'episode_reward': episode_reward, 'steps': steps, 'wall_time': wall_time, 'recorded': recorded}
+
+    def summarize(self, by, metric='episode_reward', aggregate='AVG', profile=None):
+        """
+        Aggregate `metric` (a column of the runs) over the runs, grouped by the
+        value of the parameter `by`: a list of (value, number of runs, aggregate).
+        """
+        if metric not in _RUN_METRICS:
+            raise ValueError("Unknown run metric {}, expected one of {}".format(metric, _RUN_METRICS))
+        if aggregate.upper() not in _AGGREGATES:
+            raise ValueError("Unknown aggregate {}, expected one of {}".format(aggregate, _AGGREGATES))
+        sql = ('SELECT p.value, COUNT(*), {}(r.{}) FROM run_parameters p JOIN runs r ON r.id = p.run_id '
+               'WHERE p.name = ?').format(aggregate.upper(), metric)
+        values = [by]
+        if profile is not None:
+            sql += ' AND r.profile = ?'
+            values.append(profile)
+        return self.query(sql + ' GROUP BY p.value ORDER BY p.value', values)
+
+    def steps(self, run_id):
+        """
+        (clock, reward, episode reward) of the steps of a run.
+        """
+        return self.query('SELECT clock, reward, episode_reward FROM steps WHERE run_id = ? ORDER BY clock',
+                          (run_id,))
+
+    def step_metrics(self, run_id, name):
+        """
+        (clock, value) of a quantity logged by the metric, over the steps of a run.
+        """
+        return self.query('SELECT clock, value FROM step_metrics WHERE run_id = ? AND name = ? ORDER BY clock',
+                          (run_id, name))
+
+    def asin_rewards(self, asin):
+        """
+        (run id, total reward) of an ASIN, over the runs which simulated it.
+        """
+        return self.query('SELECT run_id, reward FROM asin_rewards WHERE asin = ? ORDER BY run_id', (asin,))
+
+
+def record_job(results_path, spec):
+    """
+    Job (see scse.experiments.queue) recording the run in the results store at
+    `results_path`, returning its summary.
+    """
+    store = ResultsStore(results_path)
+    try:
+        run_id = store.record(**spec)
+        run = store.get_run(run_id)
+    finally:
+        store.close()
+    return {'run_id': run_id, 'episode_reward': run['episode_reward'], 'steps': run['steps'],
+            'wall_time': run['wall_time']}
@@ -0,0 +1,248 @@
+"""
+Headless command line for batch runs.
+
+    scse run --profile newsvendor_demo_profile --horizon 100 --seeds 1-100 \
+             --workers 8 --output results.db
+
+runs a replication of the simulation per seed (in parallel with --workers),
+quietly, and prints a JSON summary of the episode rewards, throughput and
+timing. --output appends every run to a results store (a .db file, see
+scse.experiments.results) or to a JSON lines file.
+
+    scse scenarios --horizon 100 --seeds 1-100 --output scenarios/
+
+pre-generates the demand of a replication per seed (see
+scse.datasets.scenarios), to evaluate several policies on exactly the same
+demand with `--profile newsvendor_scenario_profile --param
+demand_scenarios=scenarios/` and the same seeds.
+
+Unlike the interactive `miniscot` debugger, it doesn't import cmd2 and loads
+the simulation only when running it, so starting it costs little more than
+importing the package.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PROFILE = 'newsvendor_demo_profile'
+_DEFAULT_HORIZON = 100
+# Same default as the environment; the CSR backend is opt-in.
+_DEFAULT_NETWORK_BACKEND = 'networkx'
+
+
+def parse_seeds(seeds):
+    """
+    Seeds given as comma separated values or inclusive ranges, e.g. "1,5,10-20".
+    """
+    values = []
+    for part in seeds.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        try:
+            values += range(int(first), int(last or first) + 1)
+        except ValueError:
+            raise ValueError("Invalid seeds {}, expected e.g. 1,5,10-20".format(seeds))
+    if not values:
+        raise ValueError("No seeds in {}".format(seeds))
+    return values
+
+
+def _parameter(assignment):
+    name, separator, value = assignment.partition('=')
+    if not separator or not name:
+        raise argparse.ArgumentTypeError("Invalid parameter {}, expected name=value".format(assignment))
+    # Values are JSON when they parse as such (numbers, lists, ...), strings otherwise.
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def _argument_parser():
+    parser = argparse.ArgumentParser(prog='scse', description="Headless batch runs of miniSCOT.")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help="run replications of a simulation, one per seed")
+    run_parser.add_argument('--profile', default=_DEFAULT_PROFILE, help="profile (default %(default)s)")
+    run_parser.add_argument('--horizon', type=int, default=_DEFAULT_HORIZON,
+                            help="total time units to simulate (default %(default)s)")
+    run_parser.add_argument('--seeds', type=parse_seeds, default=[12345],
+                            help="simulation seeds, e.g. 1-100 or 1,2,3 (default 12345)")
+    run_parser.add_argument('--start-date', default='2019-01-01', help="simulation start date (default %(default)s)")
+    run_parser.add_argument('--time-increment', default='daily', help="timestep increment (default %(default)s)")
+    run_parser.add_argument('--time-advance', default='fixed', choices=['fixed', 'next_event'],
+                            help="time advance (default %(default)s)")
+    run_parser.add_argument('--asin-selection', type=int, default=1,
+                            help="number of ASINs to simulate (default %(default)s)")
+    run_parser.add_argument('--network-backend', default=_DEFAULT_NETWORK_BACKEND, choices=['networkx', 'csr'],
+                            help="network backend (default %(default)s)")
+    run_parser.add_argument('--param', type=_parameter, action='append', default=[], metavar='NAME=VALUE',
+                            help="further run parameter, passed along to the modules (repeatable)")
+    run_parser.add_argument('--workers', type=int, default=1,
+                            help="number of replications to run in parallel (default %(default)s)")
+    run_parser.add_argument('--output', help="results store (.db) or JSON lines file (.jsonl) to append runs to")
+    run_parser.add_argument('--log-level', default='WARNING', help="log level (default %(default)s)")
+
+    scenarios_parser = commands.add_parser('scenarios', help="pre-generate demand scenarios, one per seed")
+    scenarios_parser.add_argument('--horizon', type=int, default=_DEFAULT_HORIZON,
+                                  help="time units of demand (default %(default)s)")
+    scenarios_parser.add_argument('--seeds', type=parse_seeds, default=[12345],
+                                  help="simulation seeds of the scenarios, e.g. 1-100 (default 12345)")
+    scenarios_parser.add_argument('--profile', default=_DEFAULT_PROFILE,
+                                  help="profile selecting the ASINs (default %(default)s)")
+    scenarios_parser.add_argument('--asin-selection', type=int, default=1,
+                                  help="number of ASINs (default %(default)s)")
+    scenarios_parser.add_argument('--customer-max-mean', type=float, default=10,
+                                  help="maximum mean demand (default %(default)s)")
+    scenarios_parser.add_argument('--output', required=True, help="directory of the scenarios")
+    scenarios_parser.add_argument('--log-level', default='WARNING', help="log level (default %(default)s)")
+    return parser
+
+
+def _run_specs(args):
+    parameters = dict(args.param)
+    return [dict(parameters,
+                 profile=args.profile,
+                 simulation_seed=seed,
+                 start_date=args.start_date,
+                 time_increment=args.time_increment,
+                 time_horizon=args.horizon,
+                 time_advance=args.time_advance,
+                 asin_selection=args.asin_selection,
+                 network_backend=args.network_backend,
+                 metrics_log_path=None)
+            for seed in args.seeds]
+
+
+def run_replication(spec, results_path=None):
+    """
+    Run the simulation defined by `spec`, returning its summary; the run is
+    appended to the results store at `results_path`, if any.
+    """
+    if results_path is not None:
+        from scse.experiments.results import record_job
+        return record_job(results_path, spec)
+
+    from scse.controller.miniscot import SupplyChainEnvironment
+    start_time = time.time()
+    env = SupplyChainEnvironment(**spec)
+    steps = sum(1 for _ in env.iter_steps())
+    return {'episode_reward': env.episode_reward, 'steps': steps, 'wall_time': time.time() - start_time}
+
+
+def _summary(specs, outcomes, wall_time):
+    results = [result for result, _ in outcomes if result is not None]
+    rewards = [result['episode_reward'] for result in results]
+    run_times = [result['wall_time'] for result in results]
+    steps = sum(result['steps'] for result in results)
+    summary = {
+        'profile': specs[0]['profile'],
+        'time_horizon': specs[0]['time_horizon'],
+        'runs': len(results),
+        'failed_runs': len(outcomes) - len(results),
+        'steps': steps,
+        'wall_time': wall_time,
+        'runs_per_second': len(results) / wall_time if wall_time > 0 else None,
+        'steps_per_second': steps / wall_time if wall_time > 0 else None,
+        'mean_run_time': sum(run_times) / len(run_times) if run_times else None,
+        'max_run_time': max(run_times) if run_times else None,
+        'episode_reward': None,
+    }
+    if rewards:
+        mean = sum(rewards) / len(rewards)
+        summary['episode_reward'] = {
+            'mean': mean,
+            'std': (sum((reward - mean) ** 2 for reward in rewards) / len(rewards)) ** 0.5,
+            'min': min(rewards),
+            'max': max(rewards),
+        }
+    return summary
+
+
+def run(args, out=sys.stdout):
+    specs = _run_specs(args)
+    results_path = args.output if args.output and not args.output.endswith('.jsonl') else None
+    jsonl = open(args.output, 'a') if args.output and results_path is None else None
+
+    start_time = time.time()
+    outcomes = []
+    try:
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                futures = [executor.submit(run_replication, spec, results_path) for spec in specs]
+                for spec, future in zip(specs, futures):
+                    outcomes.append(_outcome(spec, future.result))
+                    _write_run(jsonl, spec, outcomes[-1])
+        else:
+            for spec in specs:
+                outcomes.append(_outcome(spec, lambda: run_replication(spec, results_path)))
+                _write_run(jsonl, spec, outcomes[-1])
+    finally:
+        if jsonl is not None:
+            jsonl.close()
+
+    summary = _summary(specs, outcomes, time.time() - start_time)
+    json.dump(summary, out, sort_keys=True)
+    out.write('\n')
+    return summary
+
+
+def _outcome(spec, get_result):
+    # A failed replication is reported (and counted), without stopping the others.
+    try:
+        return get_result(), None
+    except Exception as error:
+        logger.exception("Run with seed {} failed.".format(spec['simulation_seed']))
+        return None, repr(error)
+
+
+def _write_run(jsonl, spec, outcome):
+    if jsonl is None:
+        return
+    result, error = outcome
+    jsonl.write(json.dumps({'spec': spec, 'result': result, 'error': error}, sort_keys=True) + '\n')
+
+
+def scenarios(args, out=sys.stdout):
+    from scse.controller.miniscot import SupplyChainEnvironment
+    from scse.datasets.scenarios import generate_scenarios
+    start_time = time.time()
+    # The ASINs the runs will select.
+    env = SupplyChainEnvironment(profile=args.profile, time_horizon=args.horizon, asin_selection=args.asin_selection,
+                                 metrics_log_path=None)
+    context, _ = env.get_initial_env_values()
+    generated = generate_scenarios(args.output, args.seeds, args.horizon, context['asin_list'],
+                                   args.customer_max_mean)
+    summary = {
+        'path': args.output,
+        'replications': len(generated),
+        'time_horizon': generated.time_horizon,
+        'asin_list': generated.asin_list,
+        'bytes': generated.demand.nbytes,
+        'wall_time': time.time() - start_time,
+    }
+    json.dump(summary, out, sort_keys=True)
+    out.write('\n')
+    return summary
+
+
+def main(argv=None):
+    args = _argument_parser().parse_args(argv)
+    logging.basicConfig(level=getattr(logging, args.log_level.upper(), logging.WARNING))
+    if args.command == 'scenarios':
+        scenarios(args)
+        return 0
+    summary = run(args)
+    return 1 if summary['failed_runs'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,11 @@
 from __future__ import print_function
 import sys
 import argparse
+import logging
 import cmd2
 import pprint
-import networkx as nx
 from scse.controller import miniscot as miniSCOT
+from scse.api.actions import iter_actions
 
 class MiniSCOTDebuggerApp(cmd2.Cmd):
     _DEFAULT_START_DATE = '2019-01-01'
@@ -39,6 +40,8 @@ class MiniSCOTDebuggerApp(cmd2.Cmd):
         self._actions = []
         self._breakpoints = []
 
+        if getattr(self, '_env', None) is not None:
+            self._env.close()
         self._env = miniSCOT.SupplyChainEnvironment(**run_parameters)
 
         self._context, self._state = self._env.get_initial_env_values()
@@ -69,8 +72,9 @@ class MiniSCOTDebuggerApp(cmd2.Cmd):
 
     def do_run(self, arguments):
         """Run simulation until the first break-point or, if none are enabled, until the end of time (the specified horizon)."""
-        for t in range(self._state['clock'], self._horizon):
-            if t in self._breakpoints:
+        # The clock may skip timesteps when time advances from event to event.
+        while self._state['clock'] < self._horizon:
+            if self._state['clock'] in self._breakpoints:
                 break
             else:
                 self._state, self._actions, self._reward = self._env.step(self._state, self._actions)
@@ -83,23 +87,34 @@ class MiniSCOTDebuggerApp(cmd2.Cmd):
         elif args == 'edges':
             msg = self._print_edges()
         elif args == 'actions':
-            msg = pprint.pformat(self._actions)
+            msg = pprint.pformat(self._decode(self._actions))
         elif args == 'orders':
-            msg = pprint.pformat(self._state['customer_orders'])
+            msg = pprint.pformat(self._decode(self._state['customer_orders']))
         elif args == "POs":
-            msg = pprint.pformat(self._state['purchase_orders'])
+            msg = pprint.pformat(self._decode(self._state['purchase_orders']))
         elif args == "reward":
-            msg = pprint.pformat(self._reward)
+            reward = dict(self._reward)
+            reward['timestep_reward'] = dict(reward['timestep_reward'], by_asin=miniSCOT.reward_by_asin_dict(
+                reward['timestep_reward']['by_asin'], self._context['asin_list']))
+            msg = pprint.pformat(reward)
         else:
             msg = """Valid options are: nodes | edges | actions | orders | POs | reward"""
 
         self.poutput(msg)
 
+    # The state refers to ASINs by id; print the ASINs instead.
+    def _decode(self, records):
+        return [self._context['asin_list'].decode(record) for record in iter_actions(records)]
+
     def _print_nodes(self):
-        return pprint.pformat([(node, node_data) for node, node_data in self._state['network'].nodes(data = True)])
+        asin_list = self._context['asin_list']
+        return pprint.pformat([(node, dict(node_data, inventory=asin_list.decode_inventory(node_data['inventory']))
+                                if 'inventory' in node_data else node_data)
+                               for node, node_data in self._state['network'].nodes(data = True)])
 
     def _print_edges(self):
-        return pprint.pformat([(source_node, dest_node, edge_data) for source_node, dest_node, edge_data in self._state["network"].edges(data = True)])
+        return pprint.pformat([(source_node, dest_node, dict(edge_data, shipments=self._decode(edge_data['shipments'])))
+                               for source_node, dest_node, edge_data in self._state["network"].edges(data = True)])
 
     bp_parser = argparse.ArgumentParser()
     bp_parser.add_argument('time', help='time when to break')
@@ -110,6 +125,8 @@ class MiniSCOTDebuggerApp(cmd2.Cmd):
         self._breakpoints.append(int(args.time))
 
 def main():
+    # The debugger shows everything the simulation logs.
+    logging.basicConfig(level=logging.DEBUG)
     app = MiniSCOTDebuggerApp()
     sys.exit(app.cmdloop())
 
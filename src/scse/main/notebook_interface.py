@@ -1,3 +1,4 @@
+import logging
 from scse.controller import miniscot as miniSCOT
 
 
@@ -9,42 +10,55 @@ class miniSCOTnotebook():
     DEFAULT_ASIN_SELECTION = 1
     DEFAULT_PROFILE = 'newsvendor_demo_profile'
 
-    def __init__(self):
+    def __init__(self, record_history=False, log_level=logging.DEBUG):
+        logging.basicConfig(level=log_level)
         self.start(simulation_seed=self.DEFAULT_SIMULATION_SEED,
                    start_date=self.DEFAULT_START_DATE,
                    time_increment=self.DEFAULT_TIME_INCREMENT,
                    time_horizon=self.DEFAULT_HORIZON,
                    asin_selection=self.DEFAULT_ASIN_SELECTION,
-                   profile=self.DEFAULT_PROFILE)
+                   profile=self.DEFAULT_PROFILE,
+                   record_history=record_history)
 
     def start(self, **run_parameters):
         self.horizon = run_parameters['time_horizon']
         self.actions = []
         self.breakpoints = []
 
+        if getattr(self, 'env', None) is not None:
+            self.env.close()
         self.env = miniSCOT.SupplyChainEnvironment(**run_parameters)
 
         self.context, self.state = self.env.get_initial_env_values()
         self.env.reset_agents(self.context, self.state)
 
+    @property
+    def history(self):
+        """The StateHistory of the run, if started with record_history=True (e.g. history.frame('inventory'))."""
+        return self.env.history
+
     def next(self):
         """Execute a single time unit."""
         self.state, self.actions, self.reward = self.env.step(self.state, self.actions)
 
     def run(self):
         """Run simulation until the first break-point or, if none are enabled, until the end of time (the specified horizon)."""
-        for t in range(self.state['clock'], self.horizon):
-            if t in self.breakpoints:
+        while self.state['clock'] < self.horizon:
+            if self.state['clock'] in self.breakpoints:
                 break
             else:
                 self.state, self.actions, self.reward = self.env.step(self.state, self.actions)
 
 
-m = miniSCOTnotebook()
+# Nothing runs at import; create the simulation in the notebook:
+# m = miniSCOTnotebook(record_history=True)
 
 # Can use the following line to step through simulation
 # m.next()
 
+# and the following to look at the history of the run so far
+# m.history.frame('inventory')
+
 # Example below of injecting an action into the simulation.  Note this will raise an error since CHA1 doesn't have 5 units onhand!
 # action={"schedule": 0, "type": "inbound_shipment", "asin": "9780465024759", "origin": "Manufacturer", "destination": "Newsvendor", "quantity": 5}
 # actions = [action]
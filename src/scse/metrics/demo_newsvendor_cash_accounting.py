@@ -2,19 +2,57 @@
 Rewards for the simulation, cash accounting
 """
 import logging
-from os.path import dirname, join
 import csv
+from scse.api.actions import ACTION_TYPE_CODES
+from scse.api.csr_network import CSRNetwork
+from scse.api.events import INVENTORY_CHANGED, ORDER_CREATED, ORDER_REMOVED
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
 logger = logging.getLogger(__name__)
 
 
 class CashAccounting():
+    _DEFAULT_METRICS_LOG_PATH = None
+
     def __init__(self, run_parameters):
         self._time_horizon = run_parameters['time_horizon']
+        # Where the csv log is written at the end of the episode; by default (None) it isn't,
+        # as concurrent runs would overwrite each other's (get_metrics_log() returns it).
+        self._metrics_log_path = run_parameters.get('metrics_log_path', self._DEFAULT_METRICS_LOG_PATH)
         # Hardcoding vendor cost, customer price, holding cost, and lost demand penalty
         self._cost = 5
         self._price = 10
         self._holding_cost = 0.5
         self._lost_demand_penalty = 0
+        # Whether the state is tracked from the events of the Environment (see subscribe).
+        self._incremental = False
+
+    def get_name(self):
+        return 'cash_accounting'
+
+    def is_asin_separable(self):
+        # Rewards and logged quantities are sums over the ASINs.
+        return True
+
+    def subscribe(self, events):
+        # Track the warehouse inventory and the new customer orders as they
+        # change, rather than scanning the whole state at every step.
+        self._incremental = True
+        events.subscribe(INVENTORY_CHANGED, self._on_inventory_changed)
+        events.subscribe(ORDER_CREATED, self._on_order_created)
+        events.subscribe(ORDER_REMOVED, self._on_order_removed)
+
+    def _on_inventory_changed(self, node, asin, quantity):
+        if node in self._warehouses:
+            self._warehouse_inventory[asin] += quantity
+
+    def _on_order_created(self, order):
+        if order['type'] == 'customer_order':
+            self._new_customer_orders[order['uuid']] = order
+
+    def _on_order_removed(self, order):
+        self._new_customer_orders.pop(order['uuid'], None)
 
     def reset(self, context, state):
         self._context = {}
@@ -26,6 +64,20 @@ class CashAccounting():
         self._timestep_sales_quantity = 0
         # We'll use this to track unfilled demand, since this builds up
         self._cumulative_customer_orders = []
+        if self._incremental:
+            # The only scan of the state: afterwards, it is tracked from the events.
+            G = state['network']
+            self._warehouses = {node for node, node_data in G.nodes(data=True)
+                                if node_data['node_type'] == 'warehouse'}
+            self._warehouse_inventory = np.zeros(len(context['asin_list']), dtype=np.int64)
+            if isinstance(G, CSRNetwork):
+                self._warehouse_inventory += G.inventory[G.nodes_of_type('warehouse')].sum(axis=0)
+            else:
+                for node in self._warehouses:
+                    for asin_id, quantity in G.nodes[node]['inventory'].items():
+                        self._warehouse_inventory[asin_id] += quantity
+            # Customer orders not yet accounted for in the unfilled demand, by uuid
+            self._new_customer_orders = {order['uuid']: order for order in state['customer_orders']}
         # We'll print a csv log, with structure:
         self._log_header = [
             "timestep", 
@@ -38,6 +90,31 @@ class CashAccounting():
         ]
         self._metrics_log = [self._log_header]
 
+    def get_metrics_log(self):
+        """
+        The logged quantities of the steps so far, as a list of dicts.
+        """
+        return [dict(zip(self._log_header, row)) for row in self._metrics_log[1:]]
+
+    def compute_batch_reward(self, state, batch):
+        # Vectorized compute_reward, for the shipments of an ActionBatch
+        outbound = batch.type == ACTION_TYPE_CODES['outbound_shipment']
+        inbound = batch.type == ACTION_TYPE_CODES['inbound_shipment']
+        if not (outbound | inbound).all():
+            raise ValueError(
+                "Unknown action types {}, no reward to vend".format(np.unique(batch.type[~(outbound | inbound)]).tolist()))
+
+        rewards = np.zeros(len(batch))
+        rewards[outbound] = self._price * batch.quantity[outbound]
+        rewards[inbound] = -self._cost * batch.quantity[inbound]
+
+        # add to timestep aggregate metrics, to be logged later
+        self._timestep_revenue += rewards[outbound].sum()
+        self._timestep_sales_quantity += int(batch.quantity[outbound].sum())
+        self._timestep_vendor_cost -= rewards[inbound].sum()
+
+        return rewards
+
     def compute_reward(self, state, action):
         # cash accounting
         actionType = action['type']
@@ -64,19 +141,32 @@ class CashAccounting():
             reward = -1 * cost
 
         elif actionType == 'advance_time':
+            # Number of timesteps the state stays unchanged for (more than one when
+            # the Environment skips timesteps without events).
+            elapsed = action.get('elapsed', 1)
             reward = {}
-            reward_by_asin = {k: 0 for k in self._context['asin_list']}
+            # Indexed by ASIN id
+            reward_by_asin = np.zeros(len(self._context['asin_list']))
             reward['total'] = 0
             timestep_inventory_by_asin_fc = {}
             total_holding_cost = 0
             G = state['network']
-            for node, node_data in G.nodes(data=True):
-                if node_data['node_type'] == 'warehouse':
-                    for asin in G.nodes[node]['inventory']:
-                        asin_holding_cost = self._holding_cost
-                        reward_by_asin[asin] -= asin_holding_cost
-                        total_holding_cost += G.nodes[node]['inventory'][
-                            asin] * asin_holding_cost
+            if self._incremental:
+                holding_cost_by_asin = self._warehouse_inventory * self._holding_cost * elapsed
+                reward_by_asin -= holding_cost_by_asin
+                total_holding_cost = holding_cost_by_asin.sum()
+            elif isinstance(G, CSRNetwork):
+                # All the warehouses and ASINs at once
+                holding_cost_by_asin = G.inventory[G.nodes_of_type('warehouse')].sum(axis=0) * self._holding_cost * elapsed
+                reward_by_asin -= holding_cost_by_asin
+                total_holding_cost = holding_cost_by_asin.sum()
+            else:
+                for node, node_data in G.nodes(data=True):
+                    if node_data['node_type'] == 'warehouse':
+                        for asin_id, quantity in node_data['inventory'].items():
+                            asin_holding_cost = quantity * self._holding_cost * elapsed
+                            reward_by_asin[asin_id] -= asin_holding_cost
+                            total_holding_cost += asin_holding_cost
 
             self._timestep_holding_cost += total_holding_cost
 
@@ -84,16 +174,21 @@ class CashAccounting():
 
             timestep_unfilled_demand = 0
 
-            for order in state['customer_orders']:
-                if order not in self._cumulative_customer_orders:
-                    quantity = order['quantity']
-                    timestep_unfilled_demand += quantity
-                    self._cumulative_customer_orders.append(order)
+            if self._incremental:
+                new_orders = list(self._new_customer_orders.values())
+                self._new_customer_orders.clear()
+            else:
+                new_orders = [order for order in state['customer_orders'] if order not in self._cumulative_customer_orders]
+                self._cumulative_customer_orders.extend(new_orders)
+
+            for order in new_orders:
+                quantity = order['quantity']
+                timestep_unfilled_demand += quantity
 
-                    lost_demand_penalty = self._lost_demand_penalty
+                lost_demand_penalty = self._lost_demand_penalty
 
-                    reward['total'] -= lost_demand_penalty*quantity
-                    reward_by_asin[order['asin']] -= lost_demand_penalty*quantity
+                reward['total'] -= lost_demand_penalty*quantity
+                reward_by_asin[order['asin']] -= lost_demand_penalty*quantity
 
             timestep_log = [
                 str(state['clock']), self._timestep_revenue,
@@ -109,11 +204,8 @@ class CashAccounting():
             self._timestep_sales_quantity = 0
 
             # If we're at the end of the episode, print the csv log
-            if state['clock'] == (self._time_horizon - 1):
-                module_path = dirname(__file__)
-                filename = "metrics_log.csv"
-                filepath = join(module_path, filename)
-                with open(filepath, "w", newline="") as f:
+            if state['clock'] + elapsed >= self._time_horizon and self._metrics_log_path is not None:
+                with open(self._metrics_log_path, "w", newline="") as f:
                     writer = csv.writer(f)
                     writer.writerows(self._metrics_log)
 
@@ -0,0 +1,108 @@
+"""
+Fill rate: the share of the customer demand which was shipped.
+
+The reward of a step is the number of units shipped to customers (outbound
+shipments), so that the episode reward is the filled demand; `fill_rate()`
+divides it by the customer demand, counted as customer orders are created.
+"""
+from scse.api.actions import ACTION_TYPE_CODES
+from scse.api.events import ORDER_CREATED
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+
+class FillRate():
+    def __init__(self, run_parameters):
+        # Whether the customer orders are counted from the events of the Environment (see subscribe).
+        self._incremental = False
+
+    def get_name(self):
+        return 'fill_rate'
+
+    def is_asin_separable(self):
+        return True
+
+    def subscribe(self, events):
+        # Orders are counted when they are created, even if they are filled within the same step.
+        self._incremental = True
+        events.subscribe(ORDER_CREATED, self._on_order_created)
+
+    def _on_order_created(self, order):
+        if order['type'] == 'customer_order':
+            self._timestep_demand[order['asin']] += order['quantity']
+
+    def reset(self, context, state):
+        asin_count = len(context['asin_list'])
+        self._demand = np.zeros(asin_count, dtype=np.int64)
+        self._filled = np.zeros(asin_count, dtype=np.int64)
+        self._timestep_demand = np.zeros(asin_count, dtype=np.int64)
+        self._timestep_filled = np.zeros(asin_count, dtype=np.int64)
+        # The open orders are demand too.
+        for order in state['customer_orders']:
+            self._timestep_demand[order['asin']] += order['quantity']
+        # Without the events, the uuids of the orders open at the end of the previous step, already counted.
+        self._open_orders = {order['uuid'] for order in state['customer_orders']}
+        self._metrics_log = []
+
+    def fill_rate(self):
+        """
+        Filled over total customer demand so far (None before any demand).
+        """
+        demand = self._demand.sum()
+        return self._filled.sum() / demand if demand else None
+
+    def get_metrics_log(self):
+        return list(self._metrics_log)
+
+    def merge_metrics_logs(self, logs):
+        """
+        Merge the metrics logs of the shards of a run (see
+        scse.controller.sharding): the quantities add up, the fill rate is
+        computed again from their totals.
+        """
+        from scse.controller.sharding import merge_metrics_logs
+        rows = merge_metrics_logs(logs)
+        demand = filled = 0
+        for row in rows:
+            demand += row['customer_demand_quantity']
+            filled += row['shipped_quantity']
+            row['fill_rate'] = filled / demand if demand else None
+        return rows
+
+    def compute_batch_reward(self, state, batch):
+        rewards = np.zeros(len(batch))
+        outbound = batch.type == ACTION_TYPE_CODES['outbound_shipment']
+        rewards[outbound] = batch.quantity[outbound]
+        np.add.at(self._timestep_filled, batch.asin[outbound], batch.quantity[outbound])
+        return rewards
+
+    def compute_reward(self, state, action):
+        if action['type'] == 'advance_time':
+            return self._advance_time(state)
+        if action['type'] == 'outbound_shipment':
+            self._timestep_filled[action['asin']] += action['quantity']
+            return action['quantity']
+        return 0
+
+    def _advance_time(self, state):
+        if not self._incremental:
+            # Without the events, only the orders still open at the end of the step are seen.
+            for order in state['customer_orders']:
+                if order['uuid'] not in self._open_orders:
+                    self._on_order_created(order)
+            self._open_orders = {order['uuid'] for order in state['customer_orders']}
+
+        self._demand += self._timestep_demand
+        self._filled += self._timestep_filled
+        self._metrics_log.append({
+            'timestep': state['clock'],
+            'customer_demand_quantity': int(self._timestep_demand.sum()),
+            'shipped_quantity': int(self._timestep_filled.sum()),
+            'fill_rate': self.fill_rate()
+        })
+        self._timestep_demand[:] = 0
+        self._timestep_filled[:] = 0
+
+        # The units are rewarded when they are shipped.
+        return {'total': 0, 'by_asin': np.zeros(len(self._demand))}
@@ -1,27 +1,29 @@
 """
 An agent representing the (retail) customer behavior following a Poisson distribution for demand.
 """
-import networkx as nx
+from scse.api.actions import ActionBatch
 from scse.api.module import Agent
-import numpy as np
+from scse.utils.lazy import lazy_import
+from scse.services.service_registry import get_registry
+
+np = lazy_import('numpy')
 
 import logging
 logger = logging.getLogger(__name__)
 
 
 class PoissonCustomerOrder(Agent):
-    _DEFAULT_MAX_MEAN = 10
-
     def __init__(self, run_parameters):
-        simulation_seed = run_parameters['simulation_seed']
-        self._rng = np.random.RandomState(simulation_seed)
-        self._max_mean = run_parameters.get('customer_max_mean',
-                                            self._DEFAULT_MAX_MEAN)
+        # Demand (mean in range [0, customer_max_mean]) is shared with the forecasting modules.
+        self._demand = get_registry(run_parameters).load_service('demand_distribution', run_parameters)
         self._DEFAULT_NEWSVENDOR_CUSTOMER = 'Customer'
 
     def get_name(self):
         return 'order_generator'
 
+    def is_asin_separable(self):
+        return True
+
     def reset(self, context, state):
         self._asin_list = context['asin_list']
 
@@ -29,21 +31,17 @@ class PoissonCustomerOrder(Agent):
         # There are two modes of operation: (a) simulates the ASIN selection itself, (b) simulates
         # for a requested set of ASINs. This is defined in the context.
 
-        actions = []
-        for asin in self._asin_list:
-            # Generate demand from poisson distribution with mean in range [0, max]
-            mean_demand = self._rng.rand() * self._max_mean
-            demand_realization = round(max(1, self._rng.poisson(mean_demand)))
-            action = {
-                'type': 'customer_order',
-                'asin': asin,
-                'origin': None,
-                'destination': self._DEFAULT_NEWSVENDOR_CUSTOMER,
-                'quantity': demand_realization,
-                'schedule': state['clock']
-            }
-            logger.debug("{} bought {} units of {}.".format(
-                self._DEFAULT_NEWSVENDOR_CUSTOMER, demand_realization, asin))
-            actions.append(action)
-
-        return actions
+        demand = self._demand.sample_demand(state['clock'])
+        quantities = np.maximum(1, demand.astype(np.int64))
+        if logger.isEnabledFor(logging.DEBUG):
+            for asin, quantity in zip(self._asin_list, quantities.tolist()):
+                logger.debug("{} bought {} units of {}.".format(
+                    self._DEFAULT_NEWSVENDOR_CUSTOMER, quantity, asin))
+
+        # One order per ASIN, as a batch
+        return ActionBatch(type='customer_order',
+                           asin=np.arange(len(quantities)),
+                           quantity=quantities,
+                           schedule=state['clock'],
+                           origin=None,
+                           destination=self._DEFAULT_NEWSVENDOR_CUSTOMER)
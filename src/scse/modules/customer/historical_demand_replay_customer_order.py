@@ -0,0 +1,133 @@
+"""
+An agent replaying recorded customer demand instead of sampling it.
+
+The order history (a CSV dataset sorted by date, with at least the columns
+'date', 'asin' and 'quantity', and optionally 'customer') is streamed one date
+partition at a time by a background thread, which reads up to
+`demand_history_read_ahead` partitions ahead of the simulation clock. Memory
+use is therefore bounded by the read-ahead, regardless of the length of the
+history. Every reset seeks to the partition of the start date (see
+loader.date_partition_offsets) instead of reading the history from its start,
+and the reader is stopped when the Environment is closed.
+
+The orders of a step are placed as one ActionBatch.
+"""
+import datetime
+import queue
+import threading
+from scse.api.actions import ActionBatch
+from scse.api.module import Agent
+from scse.datasets import loader
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+import logging
+logger = logging.getLogger(__name__)
+
+_END_OF_HISTORY = object()
+
+
+class HistoricalDemandReplay(Agent):
+    _DEFAULT_READ_AHEAD = 8
+    _DEFAULT_CHUNKSIZE = 100000
+    _DEFAULT_CUSTOMER = 'Customer'
+
+    def __init__(self, run_parameters):
+        self._history = run_parameters['demand_history']
+        self._read_ahead = run_parameters.get('demand_history_read_ahead', self._DEFAULT_READ_AHEAD)
+        self._chunksize = run_parameters.get('demand_history_chunksize', self._DEFAULT_CHUNKSIZE)
+        if run_parameters['time_increment'] == 'daily':
+            self._time_increment = datetime.timedelta(days=1)
+        elif run_parameters['time_increment'] == 'hourly':
+            self._time_increment = datetime.timedelta(hours=1)
+        else:
+            raise ValueError("Unknown time increment arg {}".format(run_parameters['time_increment']))
+        self._reader = None
+
+    def get_name(self):
+        return 'order_generator'
+
+    def is_asin_separable(self):
+        return True
+
+    def reset(self, context, state):
+        self._asin_list = context['asin_list']
+        self._stop_reader()
+
+        self._partitions = queue.Queue(maxsize=self._read_ahead)
+        self._stop = threading.Event()
+        self._next_partition = None
+        # Reading starts at the partition of the start date, wherever it is in the history.
+        self._reader = threading.Thread(target=self._read_partitions,
+                                        args=(self._partitions, self._stop, state['date_time']), daemon=True)
+        self._reader.start()
+
+    def _read_partitions(self, partitions, stop, start):
+        try:
+            partitions_in_history = loader.iter_date_partitions(self._history, chunksize=self._chunksize,
+                                                                dtypes={'asin': str, 'customer': str},
+                                                                start=start)
+            for partition in partitions_in_history:
+                while not stop.is_set():
+                    try:
+                        partitions.put(partition, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            partitions.put(_END_OF_HISTORY)
+        except Exception as e:
+            # Surface the error to the simulation thread.
+            partitions.put(e)
+
+    def close(self):
+        # The reader holds the history open: stop it as soon as the run ends.
+        self._stop_reader()
+
+    def _stop_reader(self):
+        if self._reader is not None:
+            self._stop.set()
+            self._reader.join()
+            self._reader = None
+
+    def _get_partition(self):
+        if self._next_partition is None:
+            self._next_partition = self._partitions.get()
+            if isinstance(self._next_partition, Exception):
+                raise self._next_partition
+        return self._next_partition
+
+    def compute_actions(self, state):
+        window_start = state['date_time']
+        window_end = window_start + self._time_increment
+
+        batches = []
+        partition = self._get_partition()
+        while partition is not _END_OF_HISTORY and partition[0] < window_end:
+            date, orders = partition
+            if date >= window_start:
+                batches.append(self._to_batch(orders, state['clock']))
+            self._next_partition = None
+            partition = self._get_partition()
+
+        if not batches:
+            return []
+        batch = batches[0] if len(batches) == 1 else ActionBatch.concatenate(batches)
+        logger.debug("Replaying {} customer orders for {}.".format(len(batch), window_start))
+        return batch
+
+    def _to_batch(self, orders, clock):
+        # The history refers to ASINs, the simulation to their ids.
+        orders = orders[orders['asin'].isin(self._asin_list) & (orders['quantity'] > 0)]
+        if 'customer' in orders:
+            customers = orders['customer'].tolist()
+        else:
+            customers = self._DEFAULT_CUSTOMER
+        return ActionBatch(type='customer_order',
+                           asin=np.array(self._asin_list.ids_of(orders['asin'].tolist()), dtype=np.int64),
+                           quantity=orders['quantity'].to_numpy(dtype=np.int64),
+                           schedule=clock,
+                           origin=None,
+                           destination=customers)
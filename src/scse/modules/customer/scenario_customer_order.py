@@ -0,0 +1,64 @@
+"""
+An agent placing the customer orders of a pre-generated demand scenario (see
+scse.datasets.scenarios), instead of sampling demand.
+
+The run parameter `demand_scenarios` is the directory of the scenarios; the
+replication is the one of the simulation seed, unless `scenario_replication`
+chooses it. Runs of different policies with the same seeds therefore face
+exactly the same demand.
+"""
+from scse.api.actions import ActionBatch
+from scse.api.module import Agent
+from scse.datasets.scenarios import DemandScenarios
+from scse.services.demand_distribution import PoissonDemandDistribution
+from scse.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ScenarioCustomerOrder(Agent):
+    _DEFAULT_CUSTOMER = 'Customer'
+
+    def __init__(self, run_parameters):
+        self._scenarios = DemandScenarios(run_parameters['demand_scenarios'])
+        replication = run_parameters.get('scenario_replication')
+        if replication is None:
+            replication = self._scenarios.replication_of(run_parameters['simulation_seed'])
+        elif not 0 <= replication < len(self._scenarios):
+            raise ValueError("Unknown scenario replication {}, there are {}".format(
+                replication, len(self._scenarios)))
+        # (periods x ASINs), still memory-mapped
+        self._demand = self._scenarios.demand[replication]
+        customer_max_mean = run_parameters.get('customer_max_mean', PoissonDemandDistribution._DEFAULT_MAX_MEAN)
+        if customer_max_mean != self._scenarios.customer_max_mean:
+            logger.warning("The demand scenarios were drawn with customer_max_mean={}, the forecasts use {}.".format(
+                self._scenarios.customer_max_mean, customer_max_mean))
+
+    def get_name(self):
+        return 'order_generator'
+
+    def is_asin_separable(self):
+        return True
+
+    def reset(self, context, state):
+        self._asin_list = context['asin_list']
+        if [str(asin) for asin in self._asin_list] != self._scenarios.asin_list:
+            raise ValueError("The demand scenarios are for the ASINs {}, not those of the run".format(
+                self._scenarios.asin_list))
+
+    def compute_actions(self, state):
+        clock = state['clock']
+        if clock >= len(self._demand):
+            raise ValueError("The demand scenarios end at clock {}".format(len(self._demand)))
+
+        # Like PoissonCustomerOrder: one order per ASIN, of at least one unit.
+        quantities = np.maximum(1, self._demand[clock].astype(np.int64))
+        return ActionBatch(type='customer_order',
+                           asin=np.arange(len(quantities)),
+                           quantity=quantities,
+                           schedule=clock,
+                           origin=None,
+                           destination=self._DEFAULT_CUSTOMER)
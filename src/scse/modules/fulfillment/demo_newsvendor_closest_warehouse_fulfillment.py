@@ -1,7 +1,7 @@
 """
 Agent that fulfills orders always from the closest warehouse.
 """
-import networkx as nx
+from scse.api.actions import ActionBatch
 from scse.api.module import Agent
 from scse.api.network import get_asin_inventory_in_node
 import logging
@@ -15,12 +15,16 @@ class ClosestWarehouseFulfillment(Agent):
     def get_name(self):
         return 'fulfiller'
 
+    def is_asin_separable(self):
+        return True
+
     def reset(self, context, state):
         self._asin_list = context['asin_list']
 
     def compute_actions(self, state):
         # Get locations of customer orders, match with closest warehouse with sufficient inventory, and fulfill it.
-        actions = []
+        # Columns of the outbound shipments batch
+        asins, origins, destinations, schedules, quantities, uuids = [], [], [], [], [], []
         G = state['network']
         # We need to virtually track the inventory as we allocate it, so we don't reuse inventory in separate orders
         inventory_tracker = {}
@@ -55,19 +59,16 @@ class ClosestWarehouseFulfillment(Agent):
                     logger.debug("Fulfilling order {} from warehouse {}.".format(
                         order, closest_warehouse))
 
-                    action = {
-                        'type': 'outbound_shipment',
-                        'asin': asin,
-                        'origin': closest_warehouse,
-                        'destination': customer_id,
-                        'schedule': order['schedule'],
-                        'quantity': order['quantity'],
-                        'uuid': order['uuid']
-                    }
-                    actions.append(action)
+                    asins.append(asin)
+                    origins.append(closest_warehouse)
+                    destinations.append(customer_id)
+                    schedules.append(order['schedule'])
+                    quantities.append(order['quantity'])
+                    uuids.append(order['uuid'])
                     inventory_tracker[closest_warehouse][asin] -= quantity
 
-        return actions
+        return ActionBatch(type='outbound_shipment', asin=asins, origin=origins, destination=destinations,
+                           schedule=schedules, quantity=quantities, uuid=uuids)
 
 
 def _distance(s, d):
@@ -0,0 +1,178 @@
+"""
+Selection of a (stratified) random sample of ASINs from a catalog dataset.
+
+The catalog, a CSV dataset with one row per ASIN, is streamed through the
+loader in chunks, so it can be much larger than memory. Every ASIN gets a
+random key (from the seeded generator) and each stratum keeps the ASINs with
+the `asin_selection` smallest keys: a uniform sample of the stratum, in one
+pass and with memory bounded by the sample size times the number of strata.
+At the end, the sample size is allocated to the strata in proportion to their
+number of ASINs.
+
+Run parameters:
+ - asin_selection: the number of ASINs to select (or an explicit list),
+ - catalog: the catalog dataset,
+ - catalog_strata: None (simple random sample), 'category', 'velocity' or
+   'price_band'; velocities and prices are banded with
+   catalog_velocity_bands / catalog_price_bands,
+ - catalog_sampling_seed: defaults to the simulation seed.
+
+Samples are cached (under the local cache directory, see scse.utils.storage),
+keyed by the catalog file and the sampling parameters, so runs sharing them
+don't stream the catalog again.
+"""
+from os.path import join, isfile
+import hashlib
+import json
+import os
+from scse.api.asin import AsinTable
+from scse.api.module import Env
+from scse.datasets import loader
+from scse.utils.lazy import lazy_import
+from scse.utils.storage import cache_root
+
+np = lazy_import('numpy')
+
+import logging
+logger = logging.getLogger(__name__)
+
+_STRATA = (None, 'category', 'velocity', 'price_band')
+
+
+class CatalogSamplingSelection(Env):
+    _DEFAULT_CHUNKSIZE = 100000
+    _DEFAULT_VELOCITY_BANDS = [1, 10, 100]
+    _DEFAULT_PRICE_BANDS = [10, 25, 50, 100]
+    _ASIN_COLUMN = 'asin'
+    _STRATUM_COLUMNS = {'category': 'category', 'velocity': 'velocity', 'price_band': 'price'}
+
+    def __init__(self, run_parameters):
+        self._asin_selection = run_parameters['asin_selection']
+        self._catalog = run_parameters.get('catalog')
+        self._strata = run_parameters.get('catalog_strata')
+        self._velocity_bands = run_parameters.get('catalog_velocity_bands', self._DEFAULT_VELOCITY_BANDS)
+        self._price_bands = run_parameters.get('catalog_price_bands', self._DEFAULT_PRICE_BANDS)
+        self._seed = run_parameters.get('catalog_sampling_seed', run_parameters['simulation_seed'])
+        self._chunksize = run_parameters.get('catalog_chunksize', self._DEFAULT_CHUNKSIZE)
+        self._use_cache = run_parameters.get('catalog_sampling_cache', True)
+
+        if self._strata not in _STRATA:
+            raise ValueError("Unknown catalog strata {}, expected one of {}".format(self._strata, _STRATA))
+
+    def get_name(self):
+        return 'asin_list'
+
+    def is_asin_separable(self):
+        return True
+
+    def get_context(self):
+        if isinstance(self._asin_selection, list):
+            return AsinTable(self._asin_selection)
+        if not isinstance(self._asin_selection, int) or self._asin_selection < 1:
+            raise ValueError("Catalog sampling requires a list of ASINs or a positive number of ASINs to select")
+        if self._catalog is None:
+            raise ValueError("Catalog sampling requires the 'catalog' run parameter")
+
+        fpath = loader._local_path(self._catalog)
+        cache_path = self._cache_path(fpath) if self._use_cache else None
+        if cache_path is not None and isfile(cache_path):
+            logger.info("Using cached selection {}.".format(cache_path))
+            with open(cache_path) as f:
+                return AsinTable(json.load(f)['asins'])
+
+        asins, stratum_sizes = self._sample()
+        logger.info("Selected {} ASINs from {} ({} strata).".format(len(asins), self._catalog, len(stratum_sizes)))
+
+        if cache_path is not None:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = cache_path + '.{}.tmp'.format(os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump({'asins': asins, 'stratum_sizes': stratum_sizes}, f)
+            os.replace(tmp_path, cache_path)
+
+        return AsinTable(asins)
+
+    def _cache_path(self, fpath):
+        stat = os.stat(fpath)
+        key = json.dumps([os.path.abspath(fpath), stat.st_size, stat.st_mtime_ns, self._asin_selection, self._strata,
+                          self._velocity_bands, self._price_bands, self._seed, self._chunksize])
+        return join(cache_root(), 'selections', hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _strata_of(self, chunk):
+        if self._strata is None:
+            return np.zeros(len(chunk), dtype=object)
+        values = chunk[self._STRATUM_COLUMNS[self._strata]]
+        if self._strata == 'category':
+            return values.fillna('').astype(str).to_numpy(dtype=object)
+        bands = self._velocity_bands if self._strata == 'velocity' else self._price_bands
+        return np.digitize(values.fillna(0).to_numpy(dtype=float), bands).astype(object)
+
+    def _sample(self):
+        """
+        Return the sampled ASINs and the number of ASINs of each stratum.
+        """
+        size = self._asin_selection
+        rng = np.random.default_rng(self._seed)
+        # Per stratum: the smallest keys seen so far and their ASINs, plus how many ASINs it has.
+        reservoirs = {}
+        stratum_sizes = {}
+
+        usecols = [self._ASIN_COLUMN] + ([self._STRATUM_COLUMNS[self._strata]] if self._strata else [])
+        for chunk in loader.iter_chunks(self._catalog, chunksize=self._chunksize,
+                                        dtypes={self._ASIN_COLUMN: str}, usecols=usecols):
+            keys = rng.random(len(chunk))
+            asins = chunk[self._ASIN_COLUMN].to_numpy(dtype=object)
+            # Group the rows of the chunk by stratum
+            strata, codes = np.unique(self._strata_of(chunk), return_inverse=True)
+            order = np.argsort(codes, kind='stable')
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(strata)))])
+            for stratum, start, end in zip(strata.tolist(), bounds[:-1], bounds[1:]):
+                rows = order[start:end]
+                stratum_sizes[stratum] = stratum_sizes.get(stratum, 0) + len(rows)
+                reservoir_keys, reservoir_asins = reservoirs.get(stratum, (np.empty(0), np.empty(0, dtype=object)))
+                reservoir_keys = np.concatenate([reservoir_keys, keys[rows]])
+                reservoir_asins = np.concatenate([reservoir_asins, asins[rows]])
+                # Pruning only once the reservoir doubled amortizes its cost.
+                if len(reservoir_keys) > 2 * size:
+                    reservoir_keys, reservoir_asins = _smallest(reservoir_keys, reservoir_asins, size)
+                reservoirs[stratum] = (reservoir_keys, reservoir_asins)
+
+        allocation = _allocate(size, stratum_sizes)
+        selected_keys, selected_asins = [], []
+        for stratum, count in allocation.items():
+            stratum_keys, stratum_asins = _smallest(*reservoirs[stratum], count)
+            selected_keys.append(stratum_keys)
+            selected_asins.append(stratum_asins)
+        if not selected_keys:
+            return [], {}
+
+        keys = np.concatenate(selected_keys)
+        asins = np.concatenate(selected_asins)[np.argsort(keys, kind='stable')]
+        return asins.tolist(), {str(stratum): count for stratum, count in stratum_sizes.items()}
+
+
+def _smallest(keys, values, count):
+    if len(keys) > count:
+        index = np.argpartition(keys, count - 1)[:count] if count > 0 else np.empty(0, dtype=int)
+        keys, values = keys[index], values[index]
+    order = np.argsort(keys, kind='stable')
+    return keys[order], values[order]
+
+
+def _allocate(size, stratum_sizes):
+    """
+    Split `size` among the strata in proportion to their sizes (largest
+    remainder), capped by the size of each stratum.
+    """
+    total = sum(stratum_sizes.values())
+    if total <= size:
+        return dict(stratum_sizes)
+
+    strata = sorted(stratum_sizes, key=str)
+    quotas = np.array([size * stratum_sizes[stratum] / total for stratum in strata])
+    allocation = np.floor(quotas).astype(int)
+    remainders = quotas - allocation
+    # Ties are broken by stratum, for reproducibility.
+    for i in np.argsort(-remainders, kind='stable')[:size - allocation.sum()]:
+        allocation[i] += 1
+    return {stratum: int(count) for stratum, count in zip(strata, allocation) if count > 0}
@@ -1,6 +1,7 @@
 """
 Selection for Newsvendor Demo
 """
+from scse.api.asin import AsinTable
 from scse.api.module import Env
 import logging
 
@@ -14,6 +15,9 @@ class SimpleSelectionAgent(Env):
     def get_name(self):
         return 'asin_list'
 
+    def is_asin_separable(self):
+        return True
+
     def get_context(self):
         if isinstance(self._asin_selection, list):
             asin_list = self._asin_selection
@@ -26,4 +30,4 @@ class SimpleSelectionAgent(Env):
             raise ValueError("Newsvendor demo selection reqires list (e.g. ['9780465024759']) or int (e.g. 1) asin_selection run parameter")
 
         logger.debug("asins selected = {}".format(asin_list))
-        return asin_list
\ No newline at end of file
+        return AsinTable(asin_list)
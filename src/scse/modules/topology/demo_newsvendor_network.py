@@ -1,8 +1,10 @@
 """
 Baseline Agent representing the Newsvendor Network.
 """
-import networkx as nx
 from scse.api.module import Env
+from scse.utils.lazy import lazy_import
+
+nx = lazy_import('networkx')
 
 
 class SimpleNetwork(Env):
@@ -19,6 +21,9 @@ class SimpleNetwork(Env):
     def get_name(self):
         return 'network'
 
+    def is_asin_separable(self):
+        return True
+
     def get_initial_state(self, context):
         G = nx.DiGraph()
         asin_list = context['asin_list']
@@ -33,7 +38,7 @@ class SimpleNetwork(Env):
         G.add_node("Newsvendor",
                     node_type = 'warehouse',
                     location = (41.7436169,-92.7281291),
-                    inventory = dict.fromkeys(asin_list, self._initial_inventory)
+                    inventory = dict.fromkeys(asin_list.ids, self._initial_inventory)
                     )
         G.add_node("Customer",
                     node_type = 'customer',
@@ -35,14 +35,18 @@ def load_profile(profile_configuration):
     return profile
 
 
-def instantiate_class(full_class_name, **parameters):
+def load_class(full_class_name):
     last_dot = full_class_name.rindex('.')
     module_name = full_class_name[:last_dot]
     #logger.debug("module_name is {}".format(module_name))
     class_name = full_class_name[last_dot + 1:]
 
     module = importlib.import_module(module_name)
-    agent_class = getattr(module, class_name)
+    return getattr(module, class_name)
+
+
+def instantiate_class(full_class_name, **parameters):
+    agent_class = load_class(full_class_name)
     agent_instance = agent_class(parameters)
 
     return agent_instance
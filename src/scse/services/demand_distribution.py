@@ -0,0 +1,167 @@
+"""
+Poisson demand distribution shared by the modules that realize demand (customers)
+and the modules that forecast it (e.g. buying).
+
+The per-ASIN, per-period mean demand is drawn once per run, and every query is
+answered for all ASINs at once, as an array indexed like context['asin_list'].
+The random numbers are keyed by ASIN and period (see keyed_uniforms): all the
+ASINs are drawn in one vectorized operation, and the demand of an ASIN is the
+same whatever the other ASINs of the run.
+"""
+import hashlib
+from scse.api.module import Service
+from scse.utils.lazy import lazy_import
+from scse.utils.lru import LRUCache
+
+np = lazy_import('numpy')
+stats = lazy_import('scipy.stats')
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# Streams of keyed_uniforms.
+PARAMETERS, REALIZATIONS = 1, 2
+
+_GOLDEN = 0x9E3779B97F4A7C15
+
+
+def asin_keys(asin_list):
+    """
+    The random keys of the ASINs of `asin_list` (uint64), from a hash of the
+    ASINs: the same in every process and whatever the other ASINs.
+    """
+    return np.array([int.from_bytes(hashlib.sha256(str(asin).encode('utf-8')).digest()[:8], 'little')
+                     for asin in asin_list], dtype=np.uint64)
+
+
+def _mix(x):
+    # SplitMix64 finalizer, on uint64 arrays (which wrap around on overflow).
+    x = x + np.uint64(_GOLDEN)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def keyed_uniforms(simulation_seed, stream, keys, periods):
+    """
+    Uniform numbers in (0, 1), one per period of `periods` and key of `keys`
+    (periods x keys), drawn from `stream` for `simulation_seed`.
+
+    They are counter-based: every number is a hash of (seed, stream, key,
+    period), so the demand of an ASIN doesn't depend on the other ASINs
+    simulated with it (e.g. in shards, see scse.controller.sharding), nor on
+    which periods were drawn before.
+    """
+    with np.errstate(over='ignore'):
+        base = _mix(np.array([simulation_seed % 2 ** 64], dtype=np.uint64) ^ np.uint64(stream))
+        keyed = _mix(base ^ np.asarray(keys, dtype=np.uint64))
+        bits = _mix(_mix(keyed[np.newaxis, :] + np.asarray(periods, dtype=np.uint64)[:, np.newaxis]))
+    # The top 53 bits, centered so that neither 0 nor 1 is drawn.
+    return ((bits >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+
+def poisson_inverse_cdf(uniforms, means):
+    """
+    The Poisson quantiles of `uniforms` for the means `means` (same shapes),
+    by inversion: like scipy.stats.poisson.ppf, but much faster for the small
+    means of the demand.
+    """
+    quantiles = np.zeros(np.shape(uniforms), dtype=np.int64)
+    probability = np.exp(-np.asarray(means, dtype=np.float64))
+    cdf = probability.copy()
+    k = 0
+    # Stops once the terms underflow, should a uniform be above the cdf computed in floats.
+    while True:
+        above = (uniforms > cdf) & (probability > 0)
+        if not above.any():
+            return quantiles
+        quantiles += above
+        k += 1
+        probability = probability * means / k
+        cdf += probability
+
+
+def draw_mean_demand(simulation_seed, keys, periods, max_mean):
+    """
+    The mean demand (periods x keys), uniform in [0, max_mean].
+    """
+    return keyed_uniforms(simulation_seed, PARAMETERS, keys, periods) * max_mean
+
+
+def draw_demand(simulation_seed, keys, periods, mean_demand):
+    """
+    The demand realizations (periods x keys) of the mean demand `mean_demand`.
+    """
+    return poisson_inverse_cdf(keyed_uniforms(simulation_seed, REALIZATIONS, keys, periods), mean_demand)
+
+
+class PoissonDemandDistribution(Service):
+    _DEFAULT_MAX_MEAN = 10
+    _DEFAULT_CACHE_SIZE = 128
+
+    def __init__(self, run_parameters):
+        self._simulation_seed = run_parameters['simulation_seed']
+        self._time_horizon = run_parameters.get('time_horizon', 1)
+        self._max_mean = run_parameters.get('customer_max_mean',
+                                            self._DEFAULT_MAX_MEAN)
+        cache_size = run_parameters.get('demand_cache_size', self._DEFAULT_CACHE_SIZE)
+        self._quantiles = LRUCache(cache_size)
+        self._pmfs = LRUCache(cache_size)
+
+    def get_name(self):
+        return 'demand_distribution'
+
+    def reset(self, context):
+        self._asin_list = context['asin_list']
+        self._keys = asin_keys(self._asin_list)
+        self._mean_demand = self._draw_means(0, max(1, self._time_horizon))
+        self._quantiles.clear()
+        self._pmfs.clear()
+
+    def _draw_means(self, start, periods):
+        return draw_mean_demand(self._simulation_seed, self._keys, np.arange(start, start + periods), self._max_mean)
+
+    def _ensure_periods(self, periods):
+        # Runs may be stepped past the horizon (e.g. from the CLI).
+        missing = periods - self._mean_demand.shape[0]
+        if missing > 0:
+            self._mean_demand = np.vstack([self._mean_demand,
+                                           self._draw_means(self._mean_demand.shape[0], missing)])
+
+    def get_mean_demand(self, clock, horizon=1):
+        """
+        Mean demand of every ASIN over the `horizon` periods starting at `clock`.
+        """
+        self._ensure_periods(clock + horizon)
+        return self._mean_demand[clock:clock + horizon].sum(axis=0)
+
+    def sample_demand(self, clock):
+        """
+        Draw a demand realization of every ASIN for period `clock` (the same
+        one for every call with that clock).
+        """
+        return draw_demand(self._simulation_seed, self._keys, [clock], self.get_mean_demand(clock)[np.newaxis, :])[0]
+
+    def get_quantile(self, clock, service_level, horizon=1):
+        """
+        Demand quantile of every ASIN over the `horizon` periods starting at `clock`.
+        """
+        return self._quantiles.get_or_compute(
+            (clock, service_level, horizon),
+            lambda: _read_only(stats.poisson.ppf(service_level, self.get_mean_demand(clock, horizon))))
+
+    def get_pmf(self, clock, quantity, horizon=1):
+        """
+        Probability of every ASIN's demand over the `horizon` periods starting at
+        `clock` being exactly `quantity`.
+        """
+        return self._pmfs.get_or_compute(
+            (clock, quantity, horizon),
+            lambda: _read_only(stats.poisson.pmf(quantity, self.get_mean_demand(clock, horizon))))
+
+
+def _read_only(array):
+    # Cached arrays are shared by every caller: none of them may modify them.
+    array.flags.writeable = False
+    return array
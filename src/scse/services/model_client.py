@@ -0,0 +1,123 @@
+"""
+Client for containerized model services (e.g. forecasting or buying models
+started with scse.utils.docker.run_container).
+
+Agents load it from the service registry and ask for the predictions of all
+the ASINs they need in a timestep with a single `predict()` call. The client
+then:
+ - skips the (ASIN, clock, features) combinations it has already seen,
+ - splits the remaining ones into batches of `model_service_batch_size`,
+ - sends up to `model_service_max_in_flight` batches concurrently, over a pool
+   of keep-alive connections.
+
+The endpoint is taken from the 'model_service_endpoint' run parameter, or set
+with `connect()` / `connect_to_container()`.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from scse.api.module import Service
+from scse.utils.lazy import lazy_import
+from scse.utils.lru import LRUCache
+
+requests = lazy_import('requests')
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class ModelServiceClient(Service):
+    _DEFAULT_BATCH_SIZE = 256
+    _DEFAULT_MAX_IN_FLIGHT = 4
+    _DEFAULT_TIMEOUT = 30
+    _DEFAULT_CACHE_SIZE = 100000
+    _INVOCATIONS_PATH = '/invocations'
+
+    def __init__(self, run_parameters):
+        self._endpoint = run_parameters.get('model_service_endpoint')
+        self._batch_size = run_parameters.get('model_service_batch_size', self._DEFAULT_BATCH_SIZE)
+        self._max_in_flight = run_parameters.get('model_service_max_in_flight', self._DEFAULT_MAX_IN_FLIGHT)
+        self._timeout = run_parameters.get('model_service_timeout', self._DEFAULT_TIMEOUT)
+        self._cache = LRUCache(run_parameters.get('model_service_cache_size', self._DEFAULT_CACHE_SIZE))
+        self._session = None
+        self._executor = None
+
+    def get_name(self):
+        return 'model_client'
+
+    def reset(self, context):
+        self._cache.clear()
+
+    def connect(self, endpoint):
+        self.close()
+        self._endpoint = endpoint.rstrip('/')
+
+    def connect_to_container(self, container, host='localhost'):
+        from scse.utils.docker import get_host_port
+        self.connect('http://{}:{}'.format(host, get_host_port(container)))
+
+    def _get_session(self):
+        if self._session is None:
+            if not self._endpoint:
+                raise ValueError("No model service endpoint; set the 'model_service_endpoint' run parameter or call connect().")
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self._max_in_flight)
+            self._session.mount('http://', adapter)
+            self._session.mount('https://', adapter)
+            self._executor = ThreadPoolExecutor(max_workers=self._max_in_flight)
+        return self._session
+
+    def predict(self, clock, asins, features=None):
+        """
+        Return the predictions for `asins` at `clock`, in the same order.
+
+        `features`, if given, holds one sequence of (hashable) feature values
+        per ASIN.
+        """
+        if features is None:
+            features = [()] * len(asins)
+        keys = [(asin, clock, tuple(asin_features)) for asin, asin_features in zip(asins, features)]
+
+        predictions = [self._cache.get(key, _MISSING) for key in keys]
+        # Deduplicate, so that an ASIN requested twice is only sent once.
+        missing = list(dict.fromkeys(key for key, prediction in zip(keys, predictions) if prediction is _MISSING))
+
+        if missing:
+            session = self._get_session()
+            batches = [missing[i:i + self._batch_size] for i in range(0, len(missing), self._batch_size)]
+            logger.debug("Requesting {} predictions in {} batches.".format(len(missing), len(batches)))
+            fetched = {}
+            for batch, batch_predictions in zip(batches, self._executor.map(lambda b: self._invoke(session, b), batches)):
+                for key, prediction in zip(batch, batch_predictions):
+                    self._cache.put(key, prediction)
+                    fetched[key] = prediction
+
+            predictions = [fetched[key] if prediction is _MISSING else prediction
+                           for key, prediction in zip(keys, predictions)]
+
+        return predictions
+
+    def _invoke(self, session, batch):
+        instances = [{'asin': asin, 'clock': clock, 'features': list(asin_features)}
+                     for asin, clock, asin_features in batch]
+        response = session.post(self._endpoint + self._INVOCATIONS_PATH,
+                                json={'instances': instances}, timeout=self._timeout)
+        if response.status_code != 200:
+            msg = "Model service returned {}: {}".format(response.status_code, response.text)
+            logger.error(msg)
+            raise ValueError(msg)
+
+        predictions = response.json()['predictions']
+        if len(predictions) != len(instances):
+            raise ValueError("Model service returned {} predictions for {} instances.".format(
+                len(predictions), len(instances)))
+        return predictions
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+_MISSING = object()
@@ -20,37 +20,163 @@ changed.
 """
 ServiceRegistry implemented as a simple dictionary.
 
+Services are discovered lazily, the first time they are listed or loaded, from
+two sources:
+ - the Python modules in the `scse.services` package (keyed by module name), and
+ - the `scse.services` entry point group, e.g. in setup.py:
+       entry_points={'scse.services': ['demand = my_pkg.demand:DemandService']}
+
+A service can declare its name explicitly either through an entry point or by
+calling `register_service(name, 'my_pkg.module.ClassName')`. Modules found by
+package scanning must contain exactly one `Service` subclass (defined in the
+module itself), otherwise they must be registered explicitly.
+
+The manifest of available services is shared (and cached) by all registries in
+the process, while service instances are not: each simulation run should use
+its own scope (see `ServiceRegistry.scoped()`), so that parallel runs in the
+same process do not share mutable service instances.
+
 TODO As the number of Modules and Services grow, we should change this to keep
  explicit track of consumers and producers.
 """
-import os
 import importlib
+import importlib.util
 import inspect
+import logging
+import pkgutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_SERVICES_PACKAGE = 'scse.services'
+_ENTRY_POINT_GROUP = 'scse.services'
+# Modules of the services package that are not services themselves.
+_NON_SERVICE_MODULES = ['service_registry']
+
+# The manifest maps service names to either a module name or a full class name
+# ('package.module.ClassName' or 'package.module:ClassName').
+_manifest = None
+_explicit_services = {}
+_manifest_lock = threading.Lock()
+
+
+def register_service(service_name, target):
+    """
+    Explicitly declare `service_name` as implemented by `target`, the full name
+    of the service class (e.g. 'scse.services.demand.PoissonDemand').
+    """
+    with _manifest_lock:
+        _explicit_services[service_name] = target
+        if _manifest is not None:
+            _manifest[service_name] = target
+
+
+def unregister_service(service_name):
+    """
+    Undo register_service(), e.g. at the end of a test.
+    """
+    global _manifest
+    with _manifest_lock:
+        _explicit_services.pop(service_name, None)
+        # Discovered again, in case the registration replaced a discovered service.
+        _manifest = None
+
+
+def _discover_services():
+    manifest = {}
+
+    package = importlib.import_module(_DEFAULT_SERVICES_PACKAGE)
+    for module_info in pkgutil.iter_modules(package.__path__):
+        if module_info.name not in _NON_SERVICE_MODULES:
+            manifest[module_info.name] = _DEFAULT_SERVICES_PACKAGE + '.' + module_info.name
+
+    try:
+        from importlib.metadata import entry_points
+        discovered = entry_points()
+        if hasattr(discovered, 'select'):
+            discovered = discovered.select(group=_ENTRY_POINT_GROUP)
+        else:
+            discovered = discovered.get(_ENTRY_POINT_GROUP, [])
+        for entry_point in discovered:
+            manifest[entry_point.name] = entry_point.value
+    except Exception as e:
+        # A broken distribution must not prevent the built-in services from loading.
+        logger.warning("Could not read service entry points: {}".format(e))
+
+    manifest.update(_explicit_services)
+    logger.debug("Discovered services = {}.".format(sorted(manifest)))
+
+    return manifest
+
+
+def _get_manifest():
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = _discover_services()
+    return _manifest
+
+
+def _find_module(name):
+    try:
+        return importlib.util.find_spec(name)
+    except ModuleNotFoundError:
+        # A parent isn't a package (or can't be imported, which importing the class will report).
+        return None
+
+
+def _resolve_service_class(service_name, target):
+    from scse.api.module import Service
+
+    if ':' in target:
+        module_name, class_name = target.split(':', 1)
+        return getattr(importlib.import_module(module_name), class_name)
+
+    if _find_module(target) is None:
+        # Not a module, so it must be a full class name.
+        last_dot = target.rindex('.')
+        module = importlib.import_module(target[:last_dot])
+        return getattr(module, target[last_dot + 1:])
+    # Errors importing an actual module (e.g. a missing dependency) are not hidden.
+    module = importlib.import_module(target)
+
+    service_classes = [obj for _, obj in inspect.getmembers(module, inspect.isclass)
+                       if issubclass(obj, Service) and obj is not Service
+                       and obj.__module__ == module.__name__]
+    if len(service_classes) != 1:
+        raise ValueError("Service module {} defines {} services; ".format(target, len(service_classes)) +
+                         "use register_service() to declare which class implements {}.".format(service_name))
+    return service_classes[0]
+
 
 class ServiceRegistry:
     def __init__(self):
-        self._registry = [os.path.splitext(filename)[0] for filename in os.listdir() if os.path.splitext(filename)[1] == '.py' and filename not in ['__init__.py']]
         self._signed_in_services = {}
+        self._lock = threading.RLock()
+
+    def scoped(self):
+        """
+        Return a new, empty registry sharing the (cached) service manifest.
+
+        Use one scope per simulation run to keep service instances isolated.
+        """
+        return ServiceRegistry()
 
     def list_available_services(self):
-        return self._registry
+        return sorted(_get_manifest())
 
     def load_service(self, service_name, run_parameters):
         # if the service has already been initialized, we want to return the same instance of the service
-        if service_name in self._signed_in_services:
-            service_instance = self._signed_in_services[service_name]
-        else:
-            _DEFAULT_SERVICES_PATH = 'scse.services.'
-            target_service_package = _DEFAULT_SERVICES_PATH+service_name
-            current_service = importlib.import_module(target_service_package)
-            class_to_return = []
-            for name, obj in inspect.getmembers(current_service):
-                if inspect.isclass(obj) and name not in ['Service', 'datetime', 'timedelta']:
-                    class_to_return.append(name)
-            if len(class_to_return) != 1:
-                raise ValueError("Tried to load service without exactly one class")
+        with self._lock:
+            if service_name in self._signed_in_services:
+                service_instance = self._signed_in_services[service_name]
             else:
-                service_class = getattr(current_service, class_to_return[0])
+                manifest = _get_manifest()
+                if service_name not in manifest:
+                    raise ValueError("Unknown service {}. Available services are {}.".format(
+                        service_name, sorted(manifest)))
+                service_class = _resolve_service_class(service_name, manifest[service_name])
                 service_instance = service_class(run_parameters)
                 self._signed_in_services[service_name] = service_instance
 
@@ -59,7 +185,30 @@ class ServiceRegistry:
     def reset_signed_in_services(self, context):
         for service_name in self._signed_in_services:
             self._signed_in_services[service_name].reset(context)
+
+    def close(self):
+        """
+        Close the signed-in services (e.g. their connection pools), at the end
+        of the run of this scope. They may be reset and used again.
+        """
+        with self._lock:
+            services = list(self._signed_in_services.values())
+        for service in services:
+            close = getattr(service, 'close', None)
+            if close is not None:
+                close()
 """
 Singleton Service Registry
+
+Prefer the per-run scope that the controller passes to modules as the
+'service_registry' run parameter; the singleton remains for modules used
+outside of a SupplyChainEnvironment.
 """
 singleton = ServiceRegistry()
+
+
+def get_registry(run_parameters):
+    """
+    Return the registry scoped to the run described by `run_parameters`.
+    """
+    return run_parameters.get('service_registry', singleton)
@@ -1,8 +1,11 @@
 """
 Utilities for dealing with AWS.
 """
-import boto3
-from botocore.exceptions import ClientError
+import logging
+from scse.utils.lazy import lazy_import
+
+boto3 = lazy_import('boto3')
+botocore_exceptions = lazy_import('botocore.exceptions')
 
 
 def get_object(bucket_name, object_name):
@@ -17,7 +20,7 @@ def get_object(bucket_name, object_name):
     s3 = boto3.client('s3')
     try:
         response = s3.get_object(Bucket=bucket_name, Key=object_name)
-    except ClientError as e:
+    except botocore_exceptions.ClientError as e:
         # AllAccessDisabled error == bucket or object not found
         logging.error(e)
         return None
@@ -1,5 +1,7 @@
-import docker
 import logging
+from scse.utils.lazy import lazy_import
+
+docker = lazy_import('docker')
 
 logger = logging.getLogger(__name__)
 
@@ -0,0 +1,29 @@
+"""
+Deferred imports of heavy dependencies.
+
+`np = lazy_import('numpy')` binds a placeholder that imports numpy the first
+time one of its attributes is used, so that importing scse (e.g. in every
+worker process of a parallel run) only pays for the dependencies a run
+actually uses.
+"""
+import importlib
+import types
+
+
+class _LazyModule(types.ModuleType):
+    def _load(self):
+        module = self.__dict__.get('_lazy_module')
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(module_name):
+    return _LazyModule(module_name)
@@ -0,0 +1,103 @@
+"""
+In-process stand-in for a containerized model service (see scse.utils.docker),
+meant for tests and local development.
+
+It speaks the same protocol as the inference containers: `GET /ping` for
+health checks and `POST /invocations` with a JSON body
+`{"instances": [...]}`, answered with `{"predictions": [...]}`.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+_PING_PATH = '/ping'
+_INVOCATIONS_PATH = '/invocations'
+
+
+class LocalModelServer:
+    def __init__(self, predict, host='127.0.0.1', port=0):
+        """
+        `predict` receives a single instance (a dict with 'asin', 'clock' and
+        'features') and returns its prediction.
+        """
+        self._predict = predict
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.instance_count = 0
+
+    @property
+    def endpoint(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._server = ThreadingHTTPServer(self._address, self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.debug("Local model server listening on {}.".format(self.endpoint))
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _invoke(self, instances):
+        with self._lock:
+            self.request_count += 1
+            self.instance_count += len(instances)
+        return [self._predict(instance) for instance in instances]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive, like the real containers do.
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if self.path == _PING_PATH:
+                    self._reply(200, {})
+                else:
+                    self._reply(404, {'error': 'unknown path {}'.format(self.path)})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                if self.path != _INVOCATIONS_PATH:
+                    self._reply(404, {'error': 'unknown path {}'.format(self.path)})
+                    return
+                try:
+                    instances = json.loads(body)['instances']
+                    self._reply(200, {'predictions': server._invoke(instances)})
+                except Exception as e:
+                    logger.error(e)
+                    self._reply(500, {'error': str(e)})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
@@ -0,0 +1,45 @@
+"""
+SQLite helpers shared by the local databases of the experiments (the job
+queue and the results store), which are written by several workers.
+"""
+import sqlite3
+
+
+def connect(path, timeout):
+    """
+    Open the database `path` in autocommit mode (transactions are explicit,
+    see Transaction) with write-ahead logging, so that readers don't block the
+    writer. `timeout` is how long to wait for another writer, in seconds.
+    """
+    connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class Transaction:
+    """
+    Context manager running a write transaction on `connection`, and
+    returning its cursor. `lock` serializes the threads sharing the
+    connection.
+    """
+    # BEGIN IMMEDIATE takes the write lock upfront, so that two workers can't
+    # both read a row (e.g. a job as claimable) before either of them updates it.
+    def __init__(self, connection, lock):
+        self._connection = connection
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            self._connection.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._connection.cursor()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        try:
+            self._connection.execute('ROLLBACK' if exc_type is not None else 'COMMIT')
+        finally:
+            self._lock.release()
@@ -0,0 +1,294 @@
+"""
+Object stores that datasets are fetched from, and the local cache they are
+fetched into.
+
+Two backends are provided:
+ - LocalFileSystemStore, for datasets on a (possibly shared) file system, and
+ - S3Store, which downloads large objects as parallel ranged GETs, all pinned
+   to the ETag of the object (IfMatch), so that an object overwritten during
+   the download fails it instead of mixing versions. Its client can be
+   replaced by any object with boto3's `head_object` and `get_object` methods
+   (e.g. a local stand-in in tests).
+
+Fetched objects are kept in a content-addressed cache (by default under
+~/.cache/scse, or $SCSE_CACHE_DIR) rather than in the installed package.
+Blobs are stored under their SHA-256 checksum (which `fetch(verify=True)`
+checks again), after their size, and their SHA-256 checksum when the store
+knows it, have been checked against the store's. They
+are written to a temporary file then atomically renamed, under a per-object
+file lock, so that worker processes can safely fetch the same object at the
+same time.
+"""
+from os.path import join, isfile, expanduser, basename
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+import abc
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from scse.utils.lazy import lazy_import
+
+import logging
+logger = logging.getLogger(__name__)
+
+boto3 = lazy_import('boto3')
+
+try:
+    import fcntl
+except ImportError:
+    # Without file locks (e.g. on Windows) we only rely on atomic renames.
+    fcntl = None
+
+_CACHE_DIR_VARIABLE = 'SCSE_CACHE_DIR'
+_DEFAULT_PART_SIZE = 8 * 1024 * 1024
+_DEFAULT_MAX_WORKERS = 8
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# sha256: hex digest of the content, when the store knows it, or None.
+ObjectInfo = namedtuple('ObjectInfo', ['size', 'version', 'sha256'], defaults=(None,))
+
+
+def cache_root():
+    root = os.environ.get(_CACHE_DIR_VARIABLE) or join(expanduser('~'), '.cache', 'scse')
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def file_checksum(fpath):
+    digest = hashlib.sha256()
+    with open(fpath, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def file_lock(fpath):
+    """
+    Exclusive lock between processes, held for the duration of the `with` block.
+    """
+    # Also for a lock in the current directory, e.g. 'cache.lock'.
+    os.makedirs(os.path.dirname(os.path.abspath(fpath)), exist_ok=True)
+    with open(fpath, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ObjectStore(abc.ABC):
+    @abc.abstractmethod
+    def uri(self, key):
+        """
+        Return a URI uniquely identifying object `key`.
+        """
+
+    @abc.abstractmethod
+    def stat(self, key):
+        """
+        Return the ObjectInfo of object `key`; its version changes whenever the
+        object does. Raise FileNotFoundError if there is no such object.
+        """
+
+    @abc.abstractmethod
+    def download(self, key, fpath, info=None):
+        """
+        Write object `key` to the local file `fpath`. With `info` (an
+        ObjectInfo from stat()), raise IOError if the object isn't that
+        version anymore.
+        """
+
+
+class LocalFileSystemStore(ObjectStore):
+    def __init__(self, root):
+        self._root = root
+
+    def _path(self, key):
+        return join(self._root, key)
+
+    def uri(self, key):
+        return 'file://' + os.path.abspath(self._path(key))
+
+    def stat(self, key):
+        stat = os.stat(self._path(key))
+        return ObjectInfo(stat.st_size, '{}-{}'.format(stat.st_size, stat.st_mtime_ns))
+
+    def download(self, key, fpath, info=None):
+        shutil.copyfile(self._path(key), fpath)
+        if info is not None and self.stat(key).version != info.version:
+            raise IOError("{} changed while it was downloaded.".format(self.uri(key)))
+
+
+class S3Store(ObjectStore):
+    def __init__(self, bucket, prefix='', client=None,
+                 part_size=_DEFAULT_PART_SIZE, max_workers=_DEFAULT_MAX_WORKERS):
+        self._bucket = bucket
+        self._prefix = prefix
+        self._client = client
+        self._part_size = part_size
+        self._max_workers = max_workers
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = boto3.client('s3')
+        return self._client
+
+    def _key(self, key):
+        return self._prefix + key
+
+    def uri(self, key):
+        return 's3://{}/{}'.format(self._bucket, self._key(key))
+
+    def stat(self, key):
+        client = self._get_client()
+        try:
+            response = client.head_object(Bucket=self._bucket, Key=self._key(key), ChecksumMode='ENABLED')
+        except Exception as e:
+            # botocore signals missing objects with a ClientError carrying a 404.
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                raise FileNotFoundError(self.uri(key))
+            raise
+        # Only a checksum of the whole object (not of its parts, 'xxx-N') is that of the content.
+        checksum = response.get('ChecksumSHA256')
+        sha256 = base64.b64decode(checksum).hex() if checksum and '-' not in checksum else None
+        return ObjectInfo(response['ContentLength'], response.get('ETag'), sha256)
+
+    def download(self, key, fpath, info=None):
+        info = info or self.stat(key)
+        size = info.size
+        ranges = [(start, min(start + self._part_size, size) - 1)
+                  for start in range(0, size, self._part_size)]
+        logger.debug("Downloading {} ({} bytes) in {} parts.".format(self.uri(key), size, len(ranges)))
+
+        with open(fpath, 'wb') as f:
+            f.truncate(size)
+            fd = f.fileno()
+
+            def download_part(byte_range):
+                start, end = byte_range
+                try:
+                    response = self._get_client().get_object(Bucket=self._bucket, Key=self._key(key),
+                                                             Range='bytes={}-{}'.format(start, end),
+                                                             IfMatch=info.version)
+                except Exception as e:
+                    if getattr(e, 'response', {}).get('Error', {}).get('Code') in ('412', 'PreconditionFailed'):
+                        raise IOError("{} changed while it was downloaded.".format(self.uri(key)))
+                    raise
+                if response.get('ETag', info.version) != info.version:
+                    raise IOError("{} changed while it was downloaded.".format(self.uri(key)))
+                data = response['Body'].read()
+                if len(data) != end - start + 1:
+                    raise IOError("Short read of {} bytes {}-{}".format(self.uri(key), start, end))
+                os.pwrite(fd, data, start)
+
+            if len(ranges) > 1:
+                with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+                    list(executor.map(download_part, ranges))
+            else:
+                for byte_range in ranges:
+                    download_part(byte_range)
+
+
+def store_from_uri(uri):
+    """
+    Return the store for 's3://bucket/prefix/' or a local directory.
+    """
+    if uri.startswith('s3://'):
+        bucket, _, prefix = uri[len('s3://'):].partition('/')
+        return S3Store(bucket, prefix)
+    if uri.startswith('file://'):
+        uri = uri[len('file://'):]
+    return LocalFileSystemStore(uri)
+
+
+class ContentCache:
+    def __init__(self, root=None):
+        self._root = root or cache_root()
+
+    def _ref_path(self, uri):
+        return join(self._root, 'refs', hashlib.sha256(uri.encode('utf-8')).hexdigest() + '.json')
+
+    def _blob_path(self, digest, extension):
+        return join(self._root, 'blobs', digest[:2], digest + extension)
+
+    def _read_ref(self, uri):
+        ref_path = self._ref_path(uri)
+        if not isfile(ref_path):
+            return None
+        try:
+            with open(ref_path) as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    def _cached_blob(self, uri, info, verify):
+        ref = self._read_ref(uri)
+        if ref is None or ref['version'] != info.version or ref['size'] != info.size:
+            return None
+        blob_path = self._blob_path(ref['sha256'], ref['extension'])
+        if not isfile(blob_path) or os.path.getsize(blob_path) != info.size:
+            return None
+        if verify and file_checksum(blob_path) != ref['sha256']:
+            logger.warning("Cached copy of {} is corrupted; fetching it again.".format(uri))
+            return None
+        return blob_path
+
+    def fetch(self, store, key, verify=False):
+        """
+        Return the path of a local copy of object `key` of `store`, downloading
+        it if it isn't cached or changed. With `verify`, the checksum of an
+        already cached copy is checked too.
+        """
+        uri = store.uri(key)
+        info = store.stat(key)
+
+        blob_path = self._cached_blob(uri, info, verify)
+        if blob_path is not None:
+            return blob_path
+
+        with file_lock(self._ref_path(uri) + '.lock'):
+            # Another process may have fetched it while we waited for the lock.
+            blob_path = self._cached_blob(uri, info, verify)
+            if blob_path is not None:
+                return blob_path
+
+            logger.info("Fetching {} into the local cache.".format(uri))
+            tmp_directory = join(self._root, 'tmp')
+            os.makedirs(tmp_directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=tmp_directory)
+            os.close(fd)
+            try:
+                store.download(key, tmp_path, info)
+                if os.path.getsize(tmp_path) != info.size:
+                    raise IOError("Downloaded {} bytes of {}, expected {}.".format(
+                        os.path.getsize(tmp_path), uri, info.size))
+                digest = file_checksum(tmp_path)
+                if info.sha256 is not None and digest != info.sha256:
+                    raise IOError("The checksum of {} doesn't match the store's.".format(uri))
+                # Keep the extension(s), e.g. so that pandas can infer the compression.
+                name = basename(key)
+                extension = name[name.index('.'):] if '.' in name else ''
+                blob_path = self._blob_path(digest, extension)
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_path, blob_path)
+            except BaseException:
+                if isfile(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            ref = {'uri': uri, 'version': info.version, 'size': info.size,
+                   'sha256': digest, 'extension': extension}
+            os.makedirs(os.path.dirname(self._ref_path(uri)), exist_ok=True)
+            tmp_ref_path = self._ref_path(uri) + '.tmp'
+            with open(tmp_ref_path, 'w') as f:
+                json.dump(ref, f)
+            os.replace(tmp_ref_path, self._ref_path(uri))
+
+        return blob_path
@@ -0,0 +1,77 @@
+"""
+Startup-time benchmark.
+
+Measures, in fresh interpreters, the cumulative `python -X importtime` of the
+modules every worker process imports, and the wall time to build and run a
+one-step demo environment. Each is compared to a baseline measured alongside
+it on the same machine, rather than to an absolute time, so that the budgets
+hold on slower or busier machines. Exits with a non-zero status if any of
+them is over its budget.
+
+    PYTHONPATH=src python test/benchmark/import_time.py
+"""
+import subprocess
+import sys
+import time
+
+# Cumulative import time budgets, as a ratio to the import time of numpy (that
+# the lazy imports keep out of these modules).
+_IMPORT_BASELINE = 'numpy'
+_IMPORT_BUDGETS = {
+    'scse.controller.miniscot': 1.0,
+}
+
+# Wall time budget for importing, building and running a one-step demo
+# environment, as a ratio to the wall time of importing its heavy dependencies.
+_STARTUP_BASELINE_SCRIPT = "import numpy, scipy.stats, networkx"
+_STARTUP_BUDGET = 2.0
+
+_STARTUP_SCRIPT = """
+import scse.controller.miniscot as miniSCOT
+miniSCOT.SupplyChainEnvironment(time_horizon = 1).run()
+"""
+
+
+def measure_import_time_us(module_name):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module_name],
+                            stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module_name:
+            return int(fields[1])
+    raise ValueError("No import time reported for {}".format(module_name))
+
+
+def measure_run_time_s(script):
+    start_time = time.time()
+    subprocess.run([sys.executable, '-c', script], stderr=subprocess.DEVNULL, check=True)
+    return time.time() - start_time
+
+
+def _best_ratio(measure, baseline, runs=3):
+    # Alternate the two, so that both see the same load; take the best of a few runs to reduce noise.
+    measured, reference = zip(*[(measure(), baseline()) for _ in range(runs)])
+    return min(measured), min(reference)
+
+
+def main():
+    over_budget = False
+    for module_name, budget in sorted(_IMPORT_BUDGETS.items()):
+        measured, reference = _best_ratio(lambda: measure_import_time_us(module_name),
+                                          lambda: measure_import_time_us(_IMPORT_BASELINE))
+        over_budget |= measured > budget * reference
+        print("import {}: {} us, {:.2f}x import {} (budget {}x)".format(
+            module_name, measured, measured / reference, _IMPORT_BASELINE, budget))
+
+    measured, reference = _best_ratio(lambda: measure_run_time_s(_STARTUP_SCRIPT),
+                                      lambda: measure_run_time_s(_STARTUP_BASELINE_SCRIPT))
+    over_budget |= measured > _STARTUP_BUDGET * reference
+    print("startup of a one-step run: {:.3f} s, {:.2f}x importing its dependencies (budget {}x)".format(
+        measured, measured / reference, _STARTUP_BUDGET))
+
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import json
+import pytest
+from scse.api.module import Agent
+
+_REVIEW_PERIOD = 10
+
+
+class PeriodicReplenishment(Agent):
+    """
+    Ships a fixed quantity to the warehouse every review period, and only then.
+    """
+    def __init__(self, run_parameters):
+        pass
+
+    def get_name(self):
+        return 'periodic_replenishment'
+
+    def reset(self, context, state):
+        self._asin_list = context['asin_list']
+
+    def compute_actions(self, state):
+        if state['clock'] % _REVIEW_PERIOD != 0:
+            return []
+        return [{'type': 'inbound_shipment', 'asin': asin, 'origin': 'Manufacturer',
+                 'destination': 'Newsvendor', 'quantity': 3, 'schedule': state['clock']}
+                for asin in self._asin_list]
+
+    def get_next_wakeup(self, state):
+        return state['clock'] + _REVIEW_PERIOD
+
+
+@pytest.fixture
+def periodic_profile(tmp_path):
+    """
+    Path of a profile whose only Agent is PeriodicReplenishment (which isn't
+    ASIN separable).
+    """
+    profile = {
+        'name': 'periodic_replenishment',
+        'modules': [
+            'scse.modules.selection.demo_newsvendor_selection.SimpleSelectionAgent',
+            'scse.modules.topology.demo_newsvendor_network.SimpleNetwork',
+            __name__ + '.PeriodicReplenishment'
+        ],
+        'metrics': ['scse.metrics.demo_newsvendor_cash_accounting.CashAccounting']
+    }
+    fpath = str(tmp_path / 'periodic_profile.json')
+    with open(fpath, 'w') as f:
+        json.dump(profile, f)
+    return fpath
@@ -0,0 +1,41 @@
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.api.module import Agent
+
+_PARAMETERS = dict(time_horizon = 20, metrics_log_path = None)
+
+
+def _records(env):
+    return [(record.clock, record.reward, record.reward_by_asin.tolist()) for record in env.iter_steps()]
+
+
+def test_replay_reproduces_run(tmp_path):
+    trace_path = str(tmp_path / 'trace.npz')
+    recorded = miniSCOT.SupplyChainEnvironment(action_trace = trace_path, **_PARAMETERS)
+    recorded_steps = _records(recorded)
+
+    replay = miniSCOT.SupplyChainEnvironment(replay_trace = trace_path, **_PARAMETERS)
+    # Only the Env modules are instantiated
+    assert not any(isinstance(module, Agent) for module in replay._modules)
+    assert _records(replay) == recorded_steps
+    assert replay.episode_reward == recorded.episode_reward
+
+
+def test_replay_next_event(tmp_path, periodic_profile):
+    trace_path = str(tmp_path / 'trace.npz')
+    parameters = dict(_PARAMETERS, profile = periodic_profile, time_advance = 'next_event', action_trace = trace_path)
+    recorded_steps = _records(miniSCOT.SupplyChainEnvironment(**parameters))
+
+    parameters = dict(_PARAMETERS, profile = periodic_profile, time_advance = 'next_event', replay_trace = trace_path)
+    assert _records(miniSCOT.SupplyChainEnvironment(**parameters)) == recorded_steps
+    assert [clock for clock, _, _ in recorded_steps] == [0, 2, 10, 12]
+
+
+def test_replay_requires_same_asins(tmp_path):
+    trace_path = str(tmp_path / 'trace.npz')
+    miniSCOT.SupplyChainEnvironment(action_trace = trace_path, **_PARAMETERS).run()
+
+    replay = miniSCOT.SupplyChainEnvironment(replay_trace = trace_path, asin_selection = ['0000000000'],
+                                             **_PARAMETERS)
+    with pytest.raises(ValueError):
+        replay.run()
@@ -0,0 +1,131 @@
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.api.actions import ActionBatch, iter_actions
+from scse.api.events import ORDER_CREATED, SHIPMENT_CREATED
+
+_HORIZON = 10
+
+
+def _start(**run_parameters):
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = _HORIZON, **run_parameters)
+    context, state = env.get_initial_env_values()
+    env.reset_agents(context, state)
+    return env, context, state
+
+
+def _customer_order(**fields):
+    action = {'type': 'customer_order', 'asin': 0, 'origin': None, 'destination': 'Customer',
+              'quantity': 1, 'schedule': 0}
+    action.update(fields)
+    return action
+
+
+def test_batch_round_trip():
+    actions = [_customer_order(quantity = 2),
+               {'type': 'outbound_shipment', 'asin': 1, 'origin': 'Newsvendor', 'destination': 'Customer',
+                'quantity': 1, 'schedule': 3, 'uuid': 'abcd1234'}]
+    batch = ActionBatch.from_dicts(actions)
+
+    assert len(batch) == 2
+    assert batch.to_dicts() == actions
+    assert list(iter_actions([batch, actions[0]])) == actions + [actions[0]]
+    assert batch.take(batch.schedule > 0).to_dicts() == actions[1:]
+    assert ActionBatch.concatenate([batch, batch]).to_dicts() == actions + actions
+
+
+def test_batch_columns_broadcast():
+    batch = ActionBatch(type = 'customer_order', asin = [0, 1, 2], quantity = [1, 2, 3],
+                        schedule = 4, destination = 'Customer')
+
+    assert batch.schedule.tolist() == [4, 4, 4]
+    assert batch.destination.tolist() == ['Customer'] * 3
+    assert batch.uuid.tolist() == [None] * 3
+
+    with pytest.raises(ValueError):
+        ActionBatch(type = 'customer_order', asin = [0, 1], quantity = [1, 2, 3], schedule = 0)
+
+
+def test_batch_validation():
+    env, context, state = _start()
+
+    with pytest.raises(ValueError, match = 'negative'):
+        env._execute_actions([ActionBatch.from_dicts([_customer_order(quantity = -1)])], state)
+    with pytest.raises(ValueError, match = 'integer'):
+        env._execute_actions([ActionBatch(type = 'customer_order', asin = [0], quantity = [1.5], schedule = 0)], state)
+
+
+def test_batch_scheduling_and_orders():
+    env, context, state = _start()
+    batch = ActionBatch.from_dicts([_customer_order(quantity = 2), _customer_order(quantity = 3, schedule = 5)])
+
+    state, unexecuted, reward = env._execute_actions([batch], state)
+
+    assert [order['quantity'] for order in state['customer_orders']] == [2]
+    assert 'uuid' in state['customer_orders'][0]
+    assert [action['quantity'] for action in iter_actions(unexecuted)] == [3]
+    assert reward['total'] == 0
+
+
+def test_batch_of_the_agent_is_not_modified():
+    env, context, state = _start()
+    asin = context['asin_list'][0]
+    batch = ActionBatch(type = 'customer_order', asin = [asin], quantity = [1], schedule = 0, destination = 'Customer')
+
+    state, _, _ = env._execute_actions([batch], state)
+    assert [order['asin'] for order in state['customer_orders']] == [0]
+    assert batch.asin.tolist() == [asin]
+
+
+def test_batch_creates_orders_before_shipments():
+    for as_batch, expected in [(False, ['shipment', 'order']), (True, ['order', 'shipment'])]:
+        env, context, state = _start()
+        created = []
+        env._events.subscribe(ORDER_CREATED, lambda order: created.append('order'))
+        env._events.subscribe(SHIPMENT_CREATED, lambda shipment: created.append('shipment'))
+        actions = [{'type': 'inbound_shipment', 'asin': 0, 'origin': 'Manufacturer', 'destination': 'Newsvendor',
+                    'quantity': 4, 'schedule': 0},
+                   _customer_order()]
+        env._execute_actions([ActionBatch.from_dicts(actions)] if as_batch else actions, state)
+        assert created == expected
+
+
+def test_batch_shipments_match_dicts():
+    # The same shipments, as dicts or as a batch, have the same effects and rewards
+    results = []
+    for as_batch in [False, True]:
+        env, context, state = _start()
+        state, _, _ = env._execute_actions([_customer_order(quantity = 1)], state)
+        order = state['customer_orders'][0]
+        shipments = [{'type': 'outbound_shipment', 'asin': 0, 'origin': 'Newsvendor', 'destination': 'Customer',
+                      'quantity': 1, 'schedule': 0, 'uuid': order['uuid']},
+                     {'type': 'inbound_shipment', 'asin': 0, 'origin': 'Manufacturer', 'destination': 'Newsvendor',
+                      'quantity': 4, 'schedule': 0}]
+        if as_batch:
+            shipments = [ActionBatch.from_dicts(shipments)]
+        state, _, reward = env._execute_actions(shipments, state)
+
+        results.append((reward['total'], reward['by_asin'].tolist(), len(state['customer_orders']),
+                        state['network'].nodes['Newsvendor']['inventory'][0],
+                        [shipment['quantity'] for _, _, data in state['network'].edges(data = True)
+                         for shipment in data['shipments']]))
+
+    assert results[0] == results[1]
+    assert results[0][2] == 0
+
+
+def test_run_with_batches_is_unchanged(monkeypatch):
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = _HORIZON)
+    env.run()
+    batch_reward = env.episode_reward
+
+    # The demo customers and fulfillment return batches; make them return dicts instead
+    from scse.modules.customer.demo_newsvendor_poisson_customer_order import PoissonCustomerOrder
+    from scse.modules.fulfillment.demo_newsvendor_closest_warehouse_fulfillment import ClosestWarehouseFulfillment
+    for agent_class in [PoissonCustomerOrder, ClosestWarehouseFulfillment]:
+        compute_actions = agent_class.compute_actions
+        monkeypatch.setattr(agent_class, 'compute_actions',
+                            lambda self, state, compute_actions = compute_actions: compute_actions(self, state).to_dicts())
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = _HORIZON)
+    env.run()
+
+    assert env.episode_reward == pytest.approx(batch_reward)
@@ -0,0 +1,52 @@
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.api.asin import AsinTable
+from scse.main.cli import MiniSCOTDebuggerApp
+
+
+def test_asin_table():
+    asin_list = AsinTable(['9780465024759', 'B00000002'])
+
+    assert list(asin_list) == ['9780465024759', 'B00000002']
+    assert asin_list == ['9780465024759', 'B00000002']
+    assert asin_list.id_of('B00000002') == 1
+    assert asin_list.asin_of(1) == asin_list[1] == 'B00000002'
+    assert asin_list.ids_of(['B00000002', 'unknown', '9780465024759']) == [1, 0]
+    assert 'B00000002' in asin_list and 'unknown' not in asin_list
+    assert asin_list.decode({'asin': 1, 'quantity': 2}) == {'asin': 'B00000002', 'quantity': 2}
+
+    with pytest.raises(KeyError):
+        asin_list.id_of('unknown')
+    with pytest.raises(ValueError):
+        AsinTable(['B00000002', 'B00000002'])
+
+
+def test_state_uses_asin_ids():
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = 3)
+    context, state = env.get_initial_env_values()
+    env.reset_agents(context, state)
+
+    assert isinstance(context['asin_list'], AsinTable)
+    assert list(state['network'].nodes['Newsvendor']['inventory']) == [0]
+
+    state, actions, _ = env.step(state, [])
+    assert {order['asin'] for order in state['customer_orders']} <= {0}
+
+    # Injected actions may still use the ASIN
+    action = {'type': 'customer_order', 'asin': '9780465024759', 'origin': None,
+              'destination': 'Customer', 'quantity': 1, 'schedule': state['clock']}
+    state, actions, _ = env.step(state, [action])
+    assert action['asin'] == '9780465024759'
+    assert {order['asin'] for order in state['customer_orders']} <= {0}
+
+    with pytest.raises(ValueError, match = 'Unknown action type return'):
+        env.step(state, [dict(action, type = 'return')])
+
+
+def test_cli_prints_asins():
+    app = MiniSCOTDebuggerApp()
+    app.do_start("-seed 12345 -horizon 3")
+    app.do_next("")
+
+    assert "'9780465024759'" in app._print_nodes()
+    assert "'asin': '9780465024759'" in app._print_edges()
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.modules.buying.demo_newsvendor_service_level_buying_policy import ServiceLevelBuying
+from scse.modules.fulfillment.demo_newsvendor_closest_warehouse_fulfillment import ClosestWarehouseFulfillment
+from scse.modules.vendor.demo_newsvendor_infinite_inventory import InfiniteInventoryVendor
+
+_PARAMETERS = dict(time_horizon = 10, metrics_log_path = None)
+
+
+def _make_async(monkeypatch, agent_class, delay, calls = None):
+    async def compute_actions_async(self, state):
+        if calls is not None:
+            calls.append(('start', self.get_name()))
+        await asyncio.sleep(delay)
+        if calls is not None:
+            calls.append(('end', self.get_name()))
+        return self.compute_actions(state)
+
+    monkeypatch.setattr(agent_class, 'compute_actions_async', compute_actions_async, raising = False)
+
+
+def _rewards(**parameters):
+    env = miniSCOT.SupplyChainEnvironment(**dict(_PARAMETERS, **parameters))
+    return [record.reward for record in env.iter_steps()], env
+
+
+def test_single_async_agent_gives_the_same_run(monkeypatch):
+    rewards, _ = _rewards()
+    _make_async(monkeypatch, InfiniteInventoryVendor, 0)
+    assert _rewards()[0] == rewards
+
+
+@pytest.mark.parametrize('delays', [(0.02, 0.001), (0.001, 0.02)])
+def test_async_agents_run_concurrently_and_merge_in_profile_order(monkeypatch, delays):
+    calls = []
+    _make_async(monkeypatch, ClosestWarehouseFulfillment, delays[0], calls)
+    _make_async(monkeypatch, ServiceLevelBuying, delays[1], calls)
+    rewards, _ = _rewards(time_horizon = 3)
+    # Both Agents start before either completes.
+    assert calls[:2] == [('start', 'fulfiller'), ('start', 'buying')]
+
+    # Whichever completes first, the results are the same.
+    monkeypatch.undo()
+    _make_async(monkeypatch, ClosestWarehouseFulfillment, 0)
+    _make_async(monkeypatch, ServiceLevelBuying, 0)
+    assert _rewards(time_horizon = 3)[0] == rewards
+
+
+def test_agent_exceeding_its_budget_takes_no_actions(monkeypatch):
+    _make_async(monkeypatch, InfiniteInventoryVendor, 1)
+    env = miniSCOT.SupplyChainEnvironment(**dict(_PARAMETERS, time_horizon = 2, agent_time_budget = {'vendor': 0.01}))
+    state = env.run()
+    # Purchase orders are never fulfilled.
+    assert state['purchase_orders']
+    assert not any(edge_data['shipments'] for _, destination, edge_data in state['network'].edges(data = True)
+                   if destination == 'Newsvendor')
+
+
+def _threads():
+    return [thread.name for thread in threading.enumerate() if thread.name.startswith(('agents', 'metrics'))]
+
+
+def test_environment_is_closed_at_the_horizon(monkeypatch):
+    _make_async(monkeypatch, InfiniteInventoryVendor, 0)
+    parameters = dict(_PARAMETERS, profile = 'newsvendor_service_metrics_profile')
+    env = miniSCOT.SupplyChainEnvironment(**parameters)
+    rewards = [record.reward for record in env.iter_steps()]
+    assert env._event_loop is None and not _threads()
+    # A closed environment can run again.
+    assert env.run() is not None and not _threads()
+
+    # Runs stepped by hand are closed by the context manager.
+    with miniSCOT.SupplyChainEnvironment(**parameters) as env:
+        context, state = env.get_initial_env_values()
+        env.reset_agents(context, state)
+        actions = []
+        while state['clock'] < _PARAMETERS['time_horizon']:
+            state, actions, reward = env.step(state, actions)
+        assert _threads()
+    assert reward['timestep_reward']['total'] == rewards[-1] and not _threads()
+
+
+def test_time_budget_of_unknown_agent():
+    with pytest.raises(ValueError):
+        miniSCOT.SupplyChainEnvironment(agent_time_budget = {'forecaster': 1}, **_PARAMETERS)
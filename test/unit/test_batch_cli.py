@@ -0,0 +1,40 @@
+import io
+import json
+import pytest
+from scse.experiments.results import ResultsStore
+from scse.main import batch
+
+
+def test_parse_seeds():
+    assert batch.parse_seeds('1-3,7') == [1, 2, 3, 7]
+    with pytest.raises(ValueError):
+        batch.parse_seeds('a-b')
+
+
+def test_run_prints_summary(tmp_path):
+    args = batch._argument_parser().parse_args(['run', '--horizon', '5', '--seeds', '1-3',
+                                                '--output', str(tmp_path / 'runs.jsonl')])
+    out = io.StringIO()
+    summary = batch.run(args, out = out)
+
+    assert json.loads(out.getvalue()) == summary
+    assert (summary['runs'], summary['failed_runs'], summary['steps']) == (3, 0, 15)
+    assert summary['steps_per_second'] > 0
+    runs = [json.loads(line) for line in (tmp_path / 'runs.jsonl').read_text().splitlines()]
+    assert [run['spec']['simulation_seed'] for run in runs] == [1, 2, 3]
+
+
+def test_parallel_runs_match_and_are_stored(tmp_path):
+    results_path = str(tmp_path / 'results.db')
+    serial = batch.run(batch._argument_parser().parse_args(['run', '--horizon', '5', '--seeds', '1,2']),
+                       out = io.StringIO())
+    parallel = batch.run(batch._argument_parser().parse_args(['run', '--horizon', '5', '--seeds', '1,2',
+                                                             '--workers', '2', '--output', results_path]),
+                         out = io.StringIO())
+
+    assert parallel['episode_reward'] == serial['episode_reward']
+    assert [seed for seed, _, _ in ResultsStore(results_path).summarize('simulation_seed')] == [1, 2]
+
+
+def test_failed_runs_are_reported():
+    assert batch.main(['run', '--horizon', '2', '--asin-selection', '2']) == 1
@@ -0,0 +1,57 @@
+import pytest
+from scse.datasets import loader
+from scse.modules.selection.catalog_sampling_selection import CatalogSamplingSelection
+
+_CATEGORIES = ['books'] * 60 + ['toys'] * 30 + ['games'] * 10
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCSE_CACHE_DIR', str(tmp_path / 'cache'))
+    fpath = str(tmp_path / 'catalog.csv')
+    with open(fpath, 'w') as f:
+        f.write('asin,category,velocity,price\n')
+        for i, category in enumerate(_CATEGORIES):
+            f.write('{:010d},{},{},{}\n'.format(i, category, i % 20, 5 + i))
+    return fpath
+
+
+def _select(catalog, **run_parameters):
+    parameters = dict(asin_selection = 10, simulation_seed = 12345, catalog = catalog, catalog_chunksize = 7)
+    parameters.update(run_parameters)
+    return CatalogSamplingSelection(parameters).get_context()
+
+
+def test_sample_is_seeded(catalog):
+    selection = _select(catalog, catalog_sampling_cache = False)
+
+    assert len(selection) == 10
+    assert len(set(selection)) == 10
+    assert all(asin.startswith('0') for asin in selection)
+    assert list(_select(catalog, catalog_sampling_cache = False)) == list(selection)
+    assert list(_select(catalog, catalog_sampling_cache = False, simulation_seed = 1)) != list(selection)
+
+
+def test_stratified_sample(catalog):
+    selection = _select(catalog, catalog_strata = 'category', catalog_sampling_cache = False)
+    categories = [_CATEGORIES[int(asin)] for asin in selection]
+
+    # Proportional allocation
+    assert sorted(categories) == ['books'] * 6 + ['games'] + ['toys'] * 3
+
+
+def test_sample_larger_than_catalog(catalog):
+    selection = _select(catalog, asin_selection = 1000, catalog_strata = 'velocity', catalog_sampling_cache = False)
+
+    assert sorted(selection) == ['{:010d}'.format(i) for i in range(len(_CATEGORIES))]
+
+
+def test_selection_is_cached(catalog, tmp_path, monkeypatch):
+    selection = _select(catalog, catalog_strata = 'price_band')
+    assert len(list((tmp_path / 'cache' / 'selections').iterdir())) == 1
+
+    # Served from the cache, without streaming the catalog again
+    def fail(*args, **kwargs):
+        raise AssertionError("the catalog was streamed")
+    monkeypatch.setattr(loader, 'iter_chunks', fail)
+    assert list(_select(catalog, catalog_strata = 'price_band')) == list(selection)
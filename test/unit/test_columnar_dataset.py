@@ -0,0 +1,94 @@
+import os
+import pandas
+import scse.datasets.columnar as columnar
+from scse.datasets.columnar import ColumnarDataset
+
+_CSV = """date,asin,quantity,price
+2019-01-01,9780465024759,3,10.5
+2019-01-01,B00000002,1,7.0
+2019-01-02,9780465024759,5,10.5
+2019-01-03,B00000003,2,1.25
+2019-01-03,9780465024759,1,10.5
+"""
+
+
+def _write_csv(tmp_path, content = _CSV):
+    fpath = str(tmp_path / 'orders.csv')
+    with open(fpath, 'w') as f:
+        f.write(content)
+    return fpath
+
+
+def _open(fpath, tmp_path):
+    return ColumnarDataset.open(fpath, cache_directory = str(tmp_path / 'cache'), date_columns = ['date'])
+
+
+def test_read_by_asin_and_filter(tmp_path):
+    dataset = _open(_write_csv(tmp_path), tmp_path)
+
+    df = dataset.read(asin_list = ['9780465024759'], filters = [('date', '>=', '2019-01-02')])
+
+    assert list(df['quantity']) == [5, 1]
+    assert list(df['asin']) == ['9780465024759', '9780465024759']
+    assert df['date'].iloc[0] == pandas.Timestamp('2019-01-02')
+
+
+def test_columns_are_memory_mapped(tmp_path):
+    dataset = _open(_write_csv(tmp_path), tmp_path)
+
+    quantity = dataset.column('quantity')
+    assert quantity.sum() == 12
+    assert not quantity.flags.writeable
+
+
+def test_rebuilt_only_when_source_changes(tmp_path):
+    fpath = _write_csv(tmp_path)
+    _open(fpath, tmp_path)
+    column_fpath = str(tmp_path / 'cache' / 'column_0.bin')
+    built_at = os.stat(column_fpath).st_mtime_ns
+
+    # Same content, new modification time: no rebuild.
+    os.utime(fpath, ns = (built_at + 10**9, built_at + 10**9))
+    assert len(_open(fpath, tmp_path)) == 5
+    assert os.stat(column_fpath).st_mtime_ns == built_at
+
+    _write_csv(tmp_path, _CSV + "2019-01-04,B00000002,4,7.0\n")
+    dataset = _open(fpath, tmp_path)
+    assert len(dataset) == 6
+    assert list(dataset.read(asin_list = ['B00000002'])['quantity']) == [1, 4]
+
+
+def test_rebuilt_when_parse_options_change(tmp_path):
+    fpath = _write_csv(tmp_path)
+    cache_directory = str(tmp_path / 'cache')
+    dataset = ColumnarDataset.open(fpath, cache_directory = cache_directory)
+    assert dataset.categories('date')[0] == '2019-01-01'
+
+    dataset = _open(fpath, tmp_path)
+    df = dataset.read(filters = [('date', '>=', '2019-01-03')])
+    assert list(df['quantity']) == [2, 1]
+
+    dataset = ColumnarDataset.open(fpath, cache_directory = cache_directory, date_columns = ['date'],
+                                   dtypes = {'quantity': float})
+    assert dataset.column('quantity').dtype == 'float64'
+    assert len(dataset) == 5
+
+
+def test_types_are_inferred_over_the_whole_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar, '_CHUNK_SIZE', 2)
+    # quantity goes missing, and code holds strings, after the first chunk.
+    fpath = _write_csv(tmp_path, """asin,quantity,code
+B00000001,3,007
+B00000002,1,12
+B00000001,,X1
+B00000003,2,13
+B00000001,4,
+""")
+    dataset = ColumnarDataset.open(fpath, cache_directory = str(tmp_path / 'cache'))
+
+    assert dataset.column('quantity').dtype == 'float64'
+    df = dataset.read(asin_list = ['B00000001'])
+    assert df['quantity'].tolist()[0::2] == [3.0, 4.0]
+    assert pandas.isna(df['quantity'].iloc[1])
+    assert df['code'].tolist()[:2] == ['007', 'X1']
+    assert pandas.isna(df['code'].iloc[2])
@@ -0,0 +1,75 @@
+import pytest
+import networkx as nx
+import scse.controller.miniscot as miniSCOT
+from scse.api.csr_network import CSRNetwork
+from scse.api.network import get_asin_inventory_in_network, get_asin_inventory_on_all_inbound_arcs
+from scse.api.network import get_asin_inventory_on_inbound_arcs_to_node
+
+_HORIZON = 20
+
+
+def _network():
+    G = nx.DiGraph()
+    G.add_node('Vendor', node_type = 'vendor', location = (1.0, 2.0))
+    G.add_node('Warehouse', node_type = 'warehouse', location = (3.0, 4.0), inventory = {0: 5, 1: 2})
+    G.add_node('Customer', node_type = 'customer', location = (5.0, 6.0), delivered = 0)
+    G.add_edge('Warehouse', 'Customer', transit_time = 1, shipments = [])
+    G.add_edge('Vendor', 'Warehouse', transit_time = 2,
+               shipments = [{'id': 'a', 'asin': 1, 'origin': 'Vendor', 'destination': 'Warehouse',
+                             'quantity': 3, 'time_until_arrival': 2}])
+    return G
+
+
+def test_networkx_compatible_view():
+    G = _network()
+    csr = CSRNetwork.from_networkx(G, asin_count = 2)
+
+    assert list(csr.nodes) == list(G.nodes)
+    assert sorted(csr.edges()) == sorted(G.edges())
+    assert csr.indptr.tolist() == [0, 1, 2, 2]
+    for node, node_data in csr.nodes(data = True):
+        assert dict(node_data) == G.nodes[node]
+    for origin, destination, edge_data in csr.edges(data = True):
+        assert dict(edge_data) == G.get_edge_data(origin, destination)
+    assert csr.get_edge_data('Customer', 'Vendor') is None
+    assert list(csr.successors('Vendor')) == ['Warehouse']
+    assert list(csr.predecessors('Warehouse')) == ['Vendor']
+
+    # Data views write through to the columns
+    csr.nodes['Warehouse']['inventory'][0] -= 1
+    csr.nodes['Customer']['delivered'] += 2
+    assert csr.inventory[csr.node_id('Warehouse')].tolist() == [4, 2]
+    assert csr.nodes['Customer']['delivered'] == 2
+
+    with pytest.raises(TypeError):
+        csr.add_node('Other')
+
+
+def test_network_helpers():
+    G = _network()
+    csr = CSRNetwork.from_networkx(G, asin_count = 2)
+
+    for network in [G, csr]:
+        assert get_asin_inventory_in_network(network, 0) == 5
+        assert get_asin_inventory_on_all_inbound_arcs(network, 1) == 3
+        assert get_asin_inventory_on_all_inbound_arcs(network, 0) == 0
+        assert get_asin_inventory_on_inbound_arcs_to_node(network, 1, 'Warehouse') == 3
+
+
+@pytest.mark.parametrize('time_advance', ['fixed', 'next_event'])
+def test_csr_backend_matches_networkx(time_advance):
+    results = []
+    for backend in ['networkx', 'csr']:
+        env = miniSCOT.SupplyChainEnvironment(time_horizon = _HORIZON, time_advance = time_advance,
+                                              network_backend = backend)
+        state = env.run()
+        results.append((env.episode_reward, state['network'].nodes['Newsvendor']['inventory'][0],
+                        state['network'].nodes['Customer']['delivered']))
+
+    assert isinstance(state['network'], CSRNetwork)
+    assert results[0] == results[1]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        miniSCOT.SupplyChainEnvironment(network_backend = 'graph')
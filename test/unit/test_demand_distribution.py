@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+from scse.services.service_registry import ServiceRegistry
+
+_ASINS = ['9780465024759', '9780465024760', '9780465024761']
+
+
+def _create_service(seed = 12345):
+    run_parameters = {'simulation_seed': seed, 'time_horizon': 5}
+    service = ServiceRegistry().load_service('demand_distribution', run_parameters)
+    service.reset({'asin_list': _ASINS})
+    return service
+
+
+def test_parameters_are_drawn_once_per_run():
+    service = _create_service()
+    mean = service.get_mean_demand(2)
+
+    service.sample_demand(2)
+    assert np.array_equal(service.get_mean_demand(2), mean)
+    assert np.array_equal(_create_service().get_mean_demand(2), mean)
+    assert mean.shape == (len(_ASINS),)
+
+
+def test_quantiles_are_memoized():
+    service = _create_service()
+    quantiles = service.get_quantile(0, 0.9, 2)
+
+    assert service.get_quantile(0, 0.9, 2) is quantiles
+    assert np.all(quantiles >= service.get_quantile(0, 0.5, 2))
+    # Shared by all callers, so read-only.
+    with pytest.raises(ValueError):
+        quantiles[0] = 0
+    with pytest.raises(ValueError):
+        service.get_pmf(0, 1)[0] = 0
+
+
+def test_runs_past_the_horizon():
+    service = _create_service()
+
+    assert service.sample_demand(10).shape == (len(_ASINS),)
+    assert service.get_pmf(10, 0).shape == (len(_ASINS),)
+
+
+def test_demand_of_an_asin_does_not_depend_on_the_others():
+    service = _create_service()
+    other = ServiceRegistry().load_service('demand_distribution', {'simulation_seed': 12345, 'time_horizon': 5})
+    other.reset({'asin_list': _ASINS[2:] + ['B00000002']})
+
+    assert other.get_mean_demand(3)[0] == service.get_mean_demand(3)[2]
+    assert other.sample_demand(3)[0] == service.sample_demand(3)[2]
+    # Counter-based: the same for every call, and past the horizon too.
+    assert np.array_equal(service.sample_demand(12), service.sample_demand(12))
+    assert other.sample_demand(12)[0] == service.sample_demand(12)[2]
@@ -0,0 +1,59 @@
+import io
+import pytest
+import numpy as np
+import scse.controller.miniscot as miniSCOT
+from scse.datasets.scenarios import generate_scenarios, DemandScenarios
+from scse.main import batch
+from scse.services.demand_distribution import PoissonDemandDistribution
+
+_PARAMETERS = dict(time_horizon = 20, metrics_log_path = None)
+_ASINS = ['9780465024759', 'B00000002', 'B00000003', 'B00000004']
+
+
+def test_generate_scenarios(tmp_path):
+    scenarios = generate_scenarios(str(tmp_path / 'scenarios'), [3, 1, 2], 20, _ASINS)
+    assert scenarios.demand.shape == (3, 20, 4) and scenarios.demand.dtype == np.int32
+    assert isinstance(scenarios.demand, np.memmap) and not scenarios.demand.flags.writeable
+    assert scenarios.replication_of(2) == 2
+    with pytest.raises(ValueError):
+        scenarios.replication_of(4)
+
+    # The demand of an ASIN only depends on the seed and the ASIN.
+    fewer = generate_scenarios(str(tmp_path / 'fewer'), [2], 20, _ASINS[2:])
+    assert np.array_equal(fewer.demand[0], scenarios.demand[2, :, 2:])
+    assert np.array_equal(DemandScenarios(str(tmp_path / 'fewer'), mmap = False).demand, fewer.demand)
+
+
+def test_scenarios_are_the_demand_of_the_distribution(tmp_path):
+    scenarios = generate_scenarios(str(tmp_path / 'scenarios'), [5, 6], 20, _ASINS)
+    for replication, seed in enumerate(scenarios.seeds):
+        service = PoissonDemandDistribution({'simulation_seed': seed, 'time_horizon': 20})
+        service.reset({'asin_list': _ASINS})
+        sampled = np.array([service.sample_demand(clock) for clock in range(20)])
+        assert np.array_equal(scenarios.demand[replication], sampled)
+
+
+def test_scenario_runs_match_sampled_demand(tmp_path):
+    path = str(tmp_path / 'scenarios')
+    generate_scenarios(path, [1, 2], 20, [_ASINS[0]])
+    for seed in [1, 2]:
+        sampled = miniSCOT.SupplyChainEnvironment(simulation_seed = seed, **_PARAMETERS)
+        replayed = miniSCOT.SupplyChainEnvironment(profile = 'newsvendor_scenario_profile', simulation_seed = seed,
+                                                   demand_scenarios = path, **_PARAMETERS)
+        assert [record.reward for record in replayed.iter_steps()] == \
+            [record.reward for record in sampled.iter_steps()]
+
+    with pytest.raises(ValueError):
+        miniSCOT.SupplyChainEnvironment(profile = 'newsvendor_scenario_profile', simulation_seed = 3,
+                                        demand_scenarios = path, **_PARAMETERS)
+
+
+def test_scenarios_command(tmp_path):
+    path = str(tmp_path / 'scenarios')
+    args = batch._argument_parser().parse_args(['scenarios', '--horizon', '5', '--seeds', '1-3', '--output', path])
+    summary = batch.scenarios(args, out = io.StringIO())
+    assert (summary['replications'], summary['time_horizon'], len(summary['asin_list'])) == (3, 5, 1)
+
+    args = batch._argument_parser().parse_args(['run', '--profile', 'newsvendor_scenario_profile', '--horizon', '5',
+                                                '--seeds', '1-3', '--param', 'demand_scenarios=' + path])
+    assert batch.run(args, out = io.StringIO())['failed_runs'] == 0
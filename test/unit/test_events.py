@@ -0,0 +1,55 @@
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.api.events import EventBus, EVENT_TYPES, INVENTORY_CHANGED, ORDER_CREATED, ORDER_REMOVED, SHIPMENT_CREATED, \
+    SHIPMENT_ARRIVED
+from scse.metrics.demo_newsvendor_cash_accounting import CashAccounting
+
+_PARAMETERS = dict(time_horizon = 30, metrics_log_path = None)
+
+
+def _run(**parameters):
+    env = miniSCOT.SupplyChainEnvironment(**dict(_PARAMETERS, **parameters))
+    rewards = [(record.reward, record.reward_by_asin.tolist()) for record in env.iter_steps()]
+    return rewards, env.metrics.get_metrics_log()
+
+
+@pytest.mark.parametrize('network_backend', ['networkx', 'csr'])
+def test_incremental_cash_accounting_matches_scan(monkeypatch, network_backend):
+    incremental = _run(network_backend = network_backend)
+    monkeypatch.setattr(CashAccounting, 'subscribe', lambda self, events: None)
+    assert _run(network_backend = network_backend) == incremental
+
+
+@pytest.mark.parametrize('network_backend', ['networkx', 'csr'])
+def test_events_track_state(network_backend):
+    env = miniSCOT.SupplyChainEnvironment(network_backend = network_backend, **_PARAMETERS)
+    counts = dict.fromkeys(EVENT_TYPES, 0)
+    inventory = {}
+    open_orders = set()
+
+    def count(event_type):
+        def callback(*args):
+            counts[event_type] += 1
+        return callback
+
+    def on_inventory_changed(node, asin, quantity):
+        inventory[node, asin] = inventory.get((node, asin), 0) + quantity
+
+    for event_type in EVENT_TYPES:
+        env._events.subscribe(event_type, count(event_type))
+    env._events.subscribe(INVENTORY_CHANGED, on_inventory_changed)
+    env._events.subscribe(ORDER_CREATED, lambda order: open_orders.add(order['uuid']))
+    env._events.subscribe(ORDER_REMOVED, lambda order: open_orders.discard(order['uuid']))
+
+    state = env.run()
+    # Inventory deltas add up to the change of the warehouse inventory (initially 1)
+    assert 1 + inventory[('Newsvendor', 0)] == state['network'].nodes['Newsvendor']['inventory'][0]
+    assert open_orders == {order['uuid'] for order in state['customer_orders']}
+    in_transit = sum(len(shipments) for _, _, edge_data in state['network'].edges(data = True)
+                     for shipments in [edge_data['shipments']])
+    assert counts[SHIPMENT_CREATED] - counts[SHIPMENT_ARRIVED] == in_transit
+
+
+def test_unknown_event_type():
+    with pytest.raises(ValueError):
+        EventBus().subscribe('inventory', print)
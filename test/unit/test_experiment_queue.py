@@ -0,0 +1,76 @@
+import pytest
+from scse.experiments.queue import JobQueue, work, run_workers, DONE, FAILED, PENDING, RUNNING
+
+
+def _square(spec):
+    return {'value': spec['x'] ** 2}
+
+
+def _fail(spec):
+    raise RuntimeError("no luck")
+
+
+def test_claim_and_complete(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'))
+    ids = queue.submit([{'x': 1}, {'x': 2}])
+
+    job = queue.claim('a')
+    assert job.id == ids[0] and job.spec == {'x': 1} and job.attempts == 1
+    assert queue.claim('b').id == ids[1]
+    assert queue.claim('c') is None
+
+    # Only the lease holder can complete a job
+    assert not queue.complete(job.id, 'b', {'value': 0})
+    assert queue.complete(job.id, 'a', {'value': 1})
+    assert queue.counts() == {PENDING: 0, RUNNING: 1, DONE: 1, FAILED: 0}
+    assert list(queue.results()) == [(ids[0], {'x': 1}, {'value': 1})]
+
+
+def test_expired_lease_is_resumed(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.db'), lease_seconds = -1, max_attempts = 2)
+    job_id, = queue.submit([{'x': 3}])
+
+    # The first worker "dies" holding the job
+    assert queue.claim('dead').attempts == 1
+    job = queue.claim('alive')
+    assert (job.id, job.attempts) == (job_id, 2)
+    assert not queue.complete(job_id, 'dead', {'value': 0})
+
+    # Once out of attempts, the job is given up on
+    assert queue.claim('other') is None
+    assert queue.get(job_id)['state'] == FAILED
+
+
+def test_failures_are_retried(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queue = JobQueue(path, max_attempts = 2)
+    job_id, = queue.submit([{'x': 3}])
+
+    assert work(path, execute = _fail, max_attempts = 2) == 2
+    job = queue.get(job_id)
+    assert job['state'] == FAILED and job['attempts'] == 2
+    assert 'no luck' in job['error']
+
+
+def test_workers_execute_every_job_once(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queue = JobQueue(path)
+    queue.submit([{'x': x} for x in range(20)])
+
+    assert run_workers(path, workers = 3, execute = _square) == 20
+    assert queue.counts()[DONE] == 20
+    assert sorted(result['value'] for _, _, result in queue.results()) == [x ** 2 for x in range(20)]
+
+
+def test_simulation_job(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queue = JobQueue(path)
+    log_path = str(tmp_path / 'metrics_log.csv')
+    job_id, = queue.submit([{'time_horizon': 3, 'simulation_seed': 7, 'metrics_log_path': log_path}])
+
+    assert work(path) == 1
+    result = queue.get(job_id)['result']
+    assert result['clock'] == 3
+    assert 'episode_reward' in result
+    # Concurrent jobs don't write the csv log.
+    assert not (tmp_path / 'metrics_log.csv').exists()
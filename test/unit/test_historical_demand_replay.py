@@ -0,0 +1,98 @@
+import json
+import threading
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.api.actions import ActionBatch
+from scse.datasets.loader import date_partition_offsets, iter_date_partitions
+from scse.profiles.profile import load_profile
+
+_HISTORY = """date,asin,quantity
+2018-12-31,9780465024759,7
+2019-01-01,9780465024759,2
+2019-01-01,9780465024759,1
+2019-01-01,B00000002,4
+2019-01-03,9780465024759,3
+2019-01-04,9780465024759,2
+"""
+
+
+@pytest.fixture(autouse = True)
+def _cache_directory(tmp_path, monkeypatch):
+    # Indexes of the histories
+    monkeypatch.setenv('SCSE_CACHE_DIR', str(tmp_path / 'cache'))
+
+
+def _write_history(tmp_path):
+    fpath = str(tmp_path / 'history.csv')
+    with open(fpath, 'w') as f:
+        f.write(_HISTORY)
+    return fpath
+
+
+def _write_replay_profile(tmp_path):
+    profile = load_profile('newsvendor_demo_profile')
+    profile['modules'] = [
+        'scse.modules.customer.historical_demand_replay_customer_order.HistoricalDemandReplay'
+        if module.endswith('PoissonCustomerOrder') else module
+        for module in profile['modules']]
+    fpath = str(tmp_path / 'replay_profile.json')
+    with open(fpath, 'w') as f:
+        json.dump(profile, f)
+    return fpath
+
+
+def test_partitions_span_chunks(tmp_path):
+    partitions = list(iter_date_partitions(_write_history(tmp_path), chunksize = 2))
+
+    assert [len(orders) for _, orders in partitions] == [1, 3, 1, 1]
+    assert [date.day for date, _ in partitions] == [31, 1, 3, 4]
+
+
+def test_partitions_start_at_a_date(tmp_path):
+    fpath = _write_history(tmp_path)
+    dates, offsets = date_partition_offsets(fpath)
+    assert dates == ['2018-12-31', '2019-01-01', '2019-01-03', '2019-01-04']
+    with open(fpath, 'rb') as f:
+        f.seek(offsets[2])
+        assert f.readline() == b'2019-01-03,9780465024759,3\n'
+
+    partitions = list(iter_date_partitions(fpath, chunksize = 2, start = miniSCOT.datetime.datetime(2019, 1, 2)))
+    assert [date.day for date, _ in partitions] == [3, 4]
+    assert list(partitions[0][1]['quantity']) == [3]
+    assert list(iter_date_partitions(fpath, start = '2019-02-01')) == []
+
+
+def test_replay_emits_only_current_window(tmp_path):
+    env = miniSCOT.SupplyChainEnvironment(profile = _write_replay_profile(tmp_path),
+                                          time_horizon = 3,
+                                          demand_history = _write_history(tmp_path),
+                                          demand_history_chunksize = 2)
+    context, state = env.get_initial_env_values()
+    env.reset_agents(context, state)
+    replay = env.modules['order_generator']
+
+    quantities = []
+    asin_ids = set()
+    for _ in range(3):
+        actions = replay.compute_actions(state)
+        assert isinstance(actions, ActionBatch) or actions == []
+        quantities.append([action['quantity'] for action in actions])
+        asin_ids.update(action['asin'] for action in actions)
+        state['date_time'] += miniSCOT.datetime.timedelta(days = 1)
+
+    assert quantities == [[2, 1], [], [3]]
+    # ASINs are translated to their ids
+    assert asin_ids == {context['asin_list'].id_of('9780465024759')}
+
+
+def test_replay_runs(tmp_path):
+    env = miniSCOT.SupplyChainEnvironment(profile = _write_replay_profile(tmp_path),
+                                          time_horizon = 5,
+                                          demand_history = _write_history(tmp_path))
+    readers = threading.active_count()
+    final_state = env.run()
+
+    assert final_state['clock'] == 5
+    # The reader is stopped when the run ends, not at the next reset.
+    assert env.modules['order_generator']._reader is None
+    assert threading.active_count() <= readers
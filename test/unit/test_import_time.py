@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+_HEAVY_DEPENDENCIES = ['numpy', 'scipy', 'pandas', 'networkx', 'boto3', 'cmd2', 'requests', 'docker']
+
+
+def _imported_heavy_dependencies(statement):
+    script = statement + "\nimport sys\nprint(' '.join(m for m in {!r} if m in sys.modules))".format(
+        _HEAVY_DEPENDENCIES)
+    result = subprocess.run([sys.executable, '-c', script], stdout = subprocess.PIPE,
+                            universal_newlines = True, check = True)
+    return result.stdout.split()
+
+
+def test_controller_import_is_lazy():
+    assert _imported_heavy_dependencies('import scse.controller.miniscot') == []
+
+
+def test_dataset_and_service_imports_are_lazy():
+    statement = '\n'.join(['import scse.datasets.loader',
+                           'import scse.services.demand_distribution',
+                           'import scse.services.model_client',
+                           'import scse.utils.docker',
+                           'import scse.utils.aws'])
+    assert _imported_heavy_dependencies(statement) == []
+
+
+def test_batch_cli_import_is_lazy():
+    assert _imported_heavy_dependencies('import scse.main.batch') == []
+
+
+def test_notebook_import_does_not_simulate():
+    statement = 'import scse.main.notebook_interface as notebook\nassert not hasattr(notebook, "m")'
+    assert _imported_heavy_dependencies(statement) == []
@@ -0,0 +1,68 @@
+import threading
+import scse.controller.miniscot as miniSCOT
+from scse.services.service_registry import ServiceRegistry
+from scse.utils.model_server import LocalModelServer
+
+
+def _forecast(instance):
+    return len(instance['asin']) + instance['clock'] + sum(instance['features'])
+
+
+def _create_client(server, batch_size = 2, registry = None, **run_parameters):
+    run_parameters = dict(run_parameters, model_service_endpoint = server.endpoint,
+                          model_service_batch_size = batch_size)
+    return (registry or ServiceRegistry()).load_service('model_client', run_parameters)
+
+
+def test_predictions_are_batched_and_ordered():
+    with LocalModelServer(_forecast) as server:
+        client = _create_client(server)
+        asins = ['A1', 'A22', 'A333', 'A4444', 'A55555']
+
+        predictions = client.predict(3, asins, [[1]] * len(asins))
+        client.close()
+
+    assert predictions == [len(asin) + 4 for asin in asins]
+    assert server.request_count == 3
+    assert server.instance_count == len(asins)
+
+
+def test_predictions_are_cached_by_asin_clock_and_features():
+    with LocalModelServer(_forecast) as server:
+        client = _create_client(server)
+
+        client.predict(0, ['A1', 'A2'])
+        client.predict(0, ['A2', 'A1'])
+        assert server.instance_count == 2
+
+        client.predict(1, ['A1'])
+        client.predict(0, ['A1'], [[5]])
+        client.close()
+
+    assert server.instance_count == 4
+
+
+def test_batches_are_in_flight_concurrently():
+    # The server only answers once all the batches have arrived.
+    arrived = threading.Barrier(3, timeout = 5)
+
+    def forecast(instance):
+        arrived.wait()
+        return _forecast(instance)
+
+    with LocalModelServer(forecast) as server:
+        client = _create_client(server, batch_size = 1, model_service_max_in_flight = 3)
+        assert client.predict(0, ['A1', 'A22', 'A333']) == [2, 3, 4]
+        client.close()
+    assert server.request_count == 3
+
+
+def test_services_are_closed_with_the_run():
+    with LocalModelServer(_forecast) as server:
+        env = miniSCOT.SupplyChainEnvironment(time_horizon = 2, metrics_log_path = None)
+        client = _create_client(server, registry = env.service_registry)
+        client.predict(0, ['A1'])
+        assert client._executor is not None
+
+        env.run()
+        assert client._executor is None and client._session is None
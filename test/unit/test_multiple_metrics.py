@@ -0,0 +1,52 @@
+import pytest
+import scse.controller.miniscot as miniSCOT
+
+_PROFILE = 'newsvendor_service_metrics_profile'
+_PARAMETERS = dict(time_horizon = 30, metrics_log_path = None)
+
+
+def _run(**parameters):
+    env = miniSCOT.SupplyChainEnvironment(**dict(_PARAMETERS, **parameters))
+    env.run()
+    return env
+
+
+def test_metrics_share_one_pass():
+    single = _run()
+    env = _run(profile = _PROFILE)
+
+    # The primary metric is the reward of the run, unchanged by the other metrics
+    assert env.episode_reward == single.episode_reward
+    assert env.episode_rewards['cash_accounting'] == single.episode_reward
+
+    # The fill rate rewards the units shipped to customers
+    cash_accounting, fill_rate = env.metric_modules['cash_accounting'], env.metric_modules['fill_rate']
+    sales = sum(row['sales_quantity'] for row in cash_accounting.get_metrics_log())
+    assert env.episode_rewards['fill_rate'] == sales
+    assert 0 < fill_rate.fill_rate() <= 1
+    assert len(fill_rate.get_metrics_log()) == _PARAMETERS['time_horizon']
+
+
+def test_step_rewards_by_metric():
+    env = miniSCOT.SupplyChainEnvironment(profile = _PROFILE, **_PARAMETERS)
+    context, state = env.get_initial_env_values()
+    env.reset_agents(context, state)
+    state, _, reward = env.step(state, [])
+
+    assert set(reward['metrics']) == {'cash_accounting', 'fill_rate'}
+    assert reward['metrics']['cash_accounting']['timestep_reward']['total'] == reward['timestep_reward']['total']
+    by_asin = reward['metrics']['fill_rate']['timestep_reward']['by_asin']
+    assert by_asin.sum() == reward['metrics']['fill_rate']['timestep_reward']['total']
+
+
+def test_primary_metric_and_concurrency():
+    concurrent = _run(profile = _PROFILE, primary_metric = 'fill_rate')
+    sequential = _run(profile = _PROFILE, primary_metric = 'fill_rate', concurrent_metrics = False)
+
+    assert concurrent.episode_reward == concurrent.episode_rewards['fill_rate']
+    assert concurrent.episode_rewards == sequential.episode_rewards
+
+
+def test_unknown_primary_metric():
+    with pytest.raises(ValueError):
+        miniSCOT.SupplyChainEnvironment(profile = _PROFILE, primary_metric = 'carbon', **_PARAMETERS)
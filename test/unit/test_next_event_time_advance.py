@@ -0,0 +1,39 @@
+import scse.controller.miniscot as miniSCOT
+
+_HORIZON = 30
+
+
+def _run(profile, time_advance):
+    env = miniSCOT.SupplyChainEnvironment(profile = profile, time_horizon = _HORIZON,
+                                          time_advance = time_advance)
+    context, state = env.get_initial_env_values()
+    env.reset_agents(context, state)
+    actions = []
+    clocks = []
+    while state['clock'] < _HORIZON:
+        clocks.append(state['clock'])
+        state, actions, _ = env.step(state, actions)
+    return env.episode_reward, state, clocks
+
+
+def test_skips_timesteps_without_events(periodic_profile):
+    fixed_reward, fixed_state, fixed_clocks = _run(periodic_profile, 'fixed')
+    event_reward, event_state, event_clocks = _run(periodic_profile, 'next_event')
+
+    assert len(fixed_clocks) == _HORIZON
+    # Each replenishment is shipped and arrives two timesteps later.
+    assert event_clocks == [0, 2, 10, 12, 20, 22]
+    # Holding cost of the skipped timesteps is accrued exactly.
+    assert event_reward == fixed_reward
+    assert event_state['date_time'] == fixed_state['date_time']
+    assert event_state['network'].nodes['Newsvendor']['inventory'] == \
+        fixed_state['network'].nodes['Newsvendor']['inventory']
+
+
+def test_demo_profile_is_unchanged_by_next_event_mode():
+    fixed = miniSCOT.SupplyChainEnvironment(time_horizon = 10)
+    fixed.run()
+    event = miniSCOT.SupplyChainEnvironment(time_horizon = 10, time_advance = 'next_event')
+    event.run()
+
+    assert event.episode_reward == fixed.episode_reward
@@ -0,0 +1,58 @@
+import functools
+import time
+import pytest
+from scse.experiments.queue import JobQueue, work
+from scse.experiments.results import ResultsStore, record_job
+from scse.metrics.demo_newsvendor_cash_accounting import CashAccounting
+
+
+def test_record_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(CashAccounting, '_DEFAULT_METRICS_LOG_PATH', str(tmp_path / 'metrics_log.csv'))
+    store = ResultsStore(str(tmp_path / 'results.db'))
+    run_id = store.record(time_horizon = 5, asin_selection = 1)
+
+    run = store.get_run(run_id)
+    assert run['profile'] == 'newsvendor_demo_profile'
+    assert run['simulation_seed'] == 12345 and run['steps'] == 5
+    assert 'miniscot_init' in run['time_profile']
+
+    steps = store.steps(run_id)
+    assert [clock for clock, _, _ in steps] == list(range(5))
+    assert steps[-1][2] == pytest.approx(run['episode_reward'])
+    assert len(store.step_metrics(run_id, 'revenue')) == 5
+
+    # Per-ASIN totals add up to the episode reward
+    asins = [asin for asin, in store.query('SELECT asin FROM asin_rewards WHERE run_id = ?', (run_id,))]
+    assert len(asins) == 1
+    assert sum(store.asin_rewards(asin)[0][1] for asin in asins) == pytest.approx(run['episode_reward'])
+
+    # The store replaces the csv log
+    assert not (tmp_path / 'metrics_log.csv').exists()
+
+
+def test_summarize_by_parameter(tmp_path):
+    store = ResultsStore(str(tmp_path / 'results.db'))
+    for seed in range(5000):
+        store.add_run({'profile': 'p', 'simulation_seed': seed, 'service_level': [0.9, 0.95][seed % 2]},
+                      episode_reward = seed % 2 + 1)
+
+    start_time = time.time()
+    summary = store.summarize('service_level', profile = 'p')
+    assert time.time() - start_time < 1
+    assert summary == [(0.9, 2500, 1.0), (0.95, 2500, 2.0)]
+
+    assert len(store.run_ids(service_level = 0.95)) == 2500
+    assert store.run_ids(profile = 'q') == []
+    with pytest.raises(ValueError):
+        store.summarize('service_level', metric = 'profile')
+
+
+def test_queue_workers_record_runs(tmp_path):
+    queue_path, results_path = str(tmp_path / 'queue.db'), str(tmp_path / 'results.db')
+    queue = JobQueue(queue_path)
+    queue.submit([{'time_horizon': 3, 'simulation_seed': seed} for seed in (1, 2)])
+
+    assert work(queue_path, execute = functools.partial(record_job, results_path)) == 2
+    store = ResultsStore(results_path)
+    assert [seed for _, seed, _ in store.summarize('simulation_seed')] == [1, 1]
+    assert [result['steps'] for _, _, result in queue.results()] == [3, 3]
@@ -0,0 +1,64 @@
+import pytest
+from scse.api.module import Service
+from scse.services.service_registry import ServiceRegistry, register_service, unregister_service
+
+
+class CountingService(Service):
+    def __init__(self, run_parameters):
+        self._seed = run_parameters['simulation_seed']
+        self.resets = 0
+
+    def get_name(self):
+        return 'counting'
+
+    def reset(self, context):
+        self.resets += 1
+
+
+@pytest.fixture(autouse = True)
+def counting_service():
+    register_service('counting', __name__ + '.CountingService')
+    yield
+    unregister_service('counting')
+
+
+def test_explicitly_registered_service_is_listed():
+    assert 'counting' in ServiceRegistry().list_available_services()
+
+
+def test_load_returns_same_instance_within_scope():
+    registry = ServiceRegistry()
+    service = registry.load_service('counting', {'simulation_seed': 1})
+
+    assert registry.load_service('counting', {'simulation_seed': 1}) is service
+
+    registry.reset_signed_in_services({})
+    assert service.resets == 1
+
+
+def test_scopes_do_not_share_instances():
+    registry = ServiceRegistry()
+    first = registry.scoped().load_service('counting', {'simulation_seed': 1})
+    second = registry.scoped().load_service('counting', {'simulation_seed': 1})
+
+    assert first is not second
+
+
+def test_unknown_service():
+    with pytest.raises(ValueError):
+        ServiceRegistry().load_service('no_such_service', {})
+
+
+def test_missing_dependency_of_service_module_is_reported(tmp_path, monkeypatch):
+    package = tmp_path / 'broken_services'
+    package.mkdir()
+    (package / '__init__.py').write_text('')
+    (package / 'service.py').write_text('import no_such_dependency\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    register_service('broken', 'broken_services.service')
+    try:
+        with pytest.raises(ModuleNotFoundError, match = 'no_such_dependency'):
+            ServiceRegistry().load_service('broken', {})
+    finally:
+        unregister_service('broken')
+    assert 'broken' not in ServiceRegistry().list_available_services()
@@ -0,0 +1,51 @@
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.controller.sharding import run_sharded
+
+_HORIZON = 10
+_ASINS = ['9780465024759', 'B00000002', 'B00000003']
+
+
+def test_sharded_run_merges_shards():
+    result = run_sharded(shards = 2, aggregates = ['on_hand_inventory'], time_horizon = _HORIZON,
+                         asin_selection = _ASINS)
+
+    assert result.asin_list == _ASINS
+    assert result.clocks.tolist() == list(range(_HORIZON))
+    assert result.reward_by_asin.shape == (_HORIZON, len(_ASINS))
+    assert result.rewards.sum() == pytest.approx(result.episode_reward)
+    assert result.reward_by_asin.sum(axis = 1) == pytest.approx(result.rewards)
+
+    # Deterministic
+    assert run_sharded(shards = 2, time_horizon = _HORIZON, asin_selection = _ASINS).episode_reward == result.episode_reward
+
+
+def test_sharded_runs_match_the_unsharded_run():
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = _HORIZON, asin_selection = _ASINS)
+    records = list(env.iter_steps(aggregates = ['on_hand_inventory'], copy = True))
+
+    for shards in [1, 2, 3]:
+        result = run_sharded(shards = shards, aggregates = ['on_hand_inventory'], time_horizon = _HORIZON,
+                             asin_selection = _ASINS)
+        assert result.reward_by_asin.tolist() == [record.reward_by_asin.tolist() for record in records]
+        assert result.aggregates.tolist() == [list(record.aggregates) for record in records]
+        assert result.episode_reward == pytest.approx(env.episode_reward)
+
+
+def test_metrics_are_merged():
+    parameters = dict(profile = 'newsvendor_service_metrics_profile', time_horizon = _HORIZON, asin_selection = _ASINS)
+    env = miniSCOT.SupplyChainEnvironment(**parameters)
+    env.run()
+    result = run_sharded(shards = 2, **parameters)
+
+    assert result.episode_rewards == pytest.approx(env.episode_rewards)
+    assert result.metric_rewards['cash_accounting'] == pytest.approx(result.rewards)
+    assert result.metric_rewards['fill_rate'].sum() == pytest.approx(env.episode_rewards['fill_rate'])
+    for name, metric in env.metric_modules.items():
+        assert result.metrics_logs[name] == pytest.approx(metric.get_metrics_log())
+
+
+def test_coupled_profiles_are_rejected(periodic_profile):
+    # The test agent doesn't declare itself ASIN separable.
+    with pytest.raises(ValueError, match = 'separable'):
+        run_sharded(shards = 2, profile = periodic_profile, time_horizon = _HORIZON)
@@ -0,0 +1,84 @@
+import datetime
+import numpy as np
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.api.csr_network import CSRNetwork
+from scse.api.module import Env
+from scse.controller.snapshot import save_snapshot, load_snapshot
+
+_PARAMETERS = dict(time_horizon = 15, metrics_log_path = None)
+
+
+def _rewards(env):
+    return [record.reward for record in env.iter_steps()]
+
+
+@pytest.mark.parametrize('network_backend', ['networkx', 'csr'])
+def test_warm_start_matches_cold_start(tmp_path, network_backend):
+    path = str(tmp_path / 'snapshot')
+    cold = miniSCOT.SupplyChainEnvironment(network_backend = network_backend, **_PARAMETERS)
+    cold.save_initial_state(path)
+    cold_rewards = _rewards(cold)
+
+    warm = miniSCOT.SupplyChainEnvironment(network_backend = network_backend, initial_state = path, **_PARAMETERS)
+    # The snapshot replaces the Env modules
+    assert not any(isinstance(module, Env) for module in warm._modules)
+    assert _rewards(warm) == cold_rewards
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    env = miniSCOT.SupplyChainEnvironment(**_PARAMETERS)
+    context, state = env.get_initial_env_values()
+    state['network']['Manufacturer']['Newsvendor']['shipments'].append(
+        {'id': 'abc', 'asin': 0, 'origin': 'Manufacturer', 'destination': 'Newsvendor', 'quantity': 3,
+         'time_until_arrival': 1})
+    state['customer_orders'].append({'type': 'customer_order', 'asin': 0, 'quantity': 2, 'uuid': 'xyz'})
+    save_snapshot(path, context, state)
+
+    loaded_context, loaded_state = load_snapshot(path)
+    assert list(loaded_context['asin_list']) == list(context['asin_list'])
+    assert loaded_state['date_time'] == datetime.datetime(2019, 1, 1)
+    assert loaded_state['customer_orders'] == state['customer_orders']
+    assert list(loaded_state['network'].nodes(data = True)) == list(state['network'].nodes(data = True))
+    assert list(loaded_state['network'].edges(data = True)) == list(state['network'].edges(data = True))
+
+
+def test_memory_mapped_snapshot_is_copy_on_write(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    env = miniSCOT.SupplyChainEnvironment(**_PARAMETERS)
+    env.save_initial_state(path)
+
+    _, state = load_snapshot(path, network_backend = 'csr')
+    G = state['network']
+    assert isinstance(G, CSRNetwork) and isinstance(G.inventory.base, np.memmap)
+    G.nodes['Newsvendor']['inventory'][0] = 42
+    _, state = load_snapshot(path, network_backend = 'csr')
+    assert state['network'].nodes['Newsvendor']['inventory'][0] == 1
+
+
+def test_snapshot_requires_json_values(tmp_path):
+    env = miniSCOT.SupplyChainEnvironment(**_PARAMETERS)
+    context, state = env.get_initial_env_values()
+    state['agent'] = object()
+    with pytest.raises(ValueError):
+        save_snapshot(str(tmp_path / 'snapshot'), context, state)
+
+
+def test_warm_start_from_a_subset_of_the_asins(tmp_path):
+    path = str(tmp_path / 'snapshot')
+    asins = ['9780465024759', 'B00000002', 'B00000003']
+    env = miniSCOT.SupplyChainEnvironment(asin_selection = asins, **_PARAMETERS)
+    context, state = env.get_initial_env_values()
+    state['network']['Manufacturer']['Newsvendor']['shipments'] += [
+        {'id': str(asin_id), 'asin': asin_id, 'origin': 'Manufacturer', 'destination': 'Newsvendor',
+         'quantity': 3, 'time_until_arrival': 1} for asin_id in range(3)]
+    state['customer_orders'].append({'type': 'customer_order', 'asin': 2, 'quantity': 2, 'uuid': 'xyz'})
+    save_snapshot(path, context, state)
+
+    context, state = load_snapshot(path, asin_ids = [2, 0])
+    assert list(context['asin_list']) == ['B00000003', '9780465024759']
+    shipments = state['network']['Manufacturer']['Newsvendor']['shipments']
+    assert [(shipment['id'], shipment['asin']) for shipment in shipments] == [('0', 1), ('2', 0)]
+    assert [order['asin'] for order in state['customer_orders']] == [0]
+    assert state['network'].nodes['Newsvendor']['inventory'].keys() <= {0, 1}
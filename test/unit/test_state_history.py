@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import scse.controller.miniscot as miniSCOT
+from scse.main.notebook_interface import miniSCOTnotebook
+
+_HORIZON = 20
+
+
+@pytest.mark.parametrize('network_backend', ['networkx', 'csr'])
+def test_history_matches_run(network_backend):
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = _HORIZON, record_history = True, metrics_log_path = None,
+                                          network_backend = network_backend)
+    state = env.run()
+    history = env.history
+    assert history.count == _HORIZON
+
+    inventory = history.frame('inventory')
+    asin = history.asin_list[0]
+    assert inventory[('Newsvendor', asin)].iloc[-1] == state['network'].nodes['Newsvendor']['inventory'][0]
+    assert history.total_reward.sum() == pytest.approx(env.episode_reward)
+    assert history.frame('reward')[asin].sum() == pytest.approx(env.episode_reward)
+
+    # Demand and sales are the executed customer orders and outbound shipments
+    log = env.metrics.get_metrics_log()
+    assert history.frame('sales')[asin].tolist() == [row['sales_quantity'] for row in log]
+    demand = history.frame('demand')[asin]
+    assert (demand >= 1).all() and (demand.cumsum() >= history.frame('sales')[asin].cumsum()).all()
+
+    # Views, not copies
+    assert np.shares_memory(inventory.to_numpy(), history.inventory)
+    labeled = history.array('in_transit')
+    assert labeled.dims == ('clock', 'node', 'asin') and labeled.values.base is history.in_transit
+    assert labeled.coords['clock'].tolist() == list(range(_HORIZON))
+
+
+def test_history_is_opt_in():
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = 2, metrics_log_path = None)
+    env.run()
+    assert env.history is None
+
+
+def test_notebook_history():
+    m = miniSCOTnotebook(record_history = True)
+    m.next()
+    m.next()
+    assert m.history.frame('reward').shape == (2, 1)
+
+
+def test_history_grows_past_the_horizon():
+    env = miniSCOT.SupplyChainEnvironment(time_horizon = 2, record_history = True, metrics_log_path = None)
+    context, state = env.get_initial_env_values()
+    env.reset_agents(context, state)
+    actions = []
+    for _ in range(5):
+        state, actions, _ = env.step(state, actions)
+    history = env.history
+    assert history.count == 5 and history.capacity >= 5
+    assert history.frame('reward').index.tolist() == list(range(5))
+    assert history.frame('demand').iloc[:, 0].ge(1).all()
@@ -0,0 +1,94 @@
+import pytest
+import networkx as nx
+import scse.controller.miniscot as miniSCOT
+from scse.api.csr_network import CSRNetwork
+from scse.api.network import get_asin_inventory_in_network, get_asin_inventory_on_all_inbound_arcs
+from scse.api.state_view import state_view, FrozenMapping
+from scse.modules.fulfillment.demo_newsvendor_closest_warehouse_fulfillment import ClosestWarehouseFulfillment
+
+_PARAMETERS = dict(time_horizon = 30, metrics_log_path = None)
+
+
+def _state(network_backend):
+    G = nx.DiGraph()
+    G.add_node('Manufacturer', node_type = 'vendor', location = (0.0, 0.0))
+    G.add_node('Warehouse', node_type = 'warehouse', location = (1.0, 1.0), inventory = {0: 5, 1: 2})
+    G.add_node('Customer', node_type = 'customer', location = (2.0, 2.0))
+    G.add_edge('Manufacturer', 'Warehouse', transit_time = 2,
+               shipments = [{'id': 's', 'asin': 0, 'origin': 'Manufacturer', 'destination': 'Warehouse',
+                             'quantity': 3, 'time_until_arrival': 1}])
+    G.add_edge('Warehouse', 'Customer', transit_time = 1, shipments = [])
+    if network_backend == 'csr':
+        G = CSRNetwork.from_networkx(G, 2)
+    return {'clock': 0, 'network': G, 'purchase_orders': [],
+            'customer_orders': [{'uuid': 'o', 'asin': 0, 'quantity': 1, 'destination': 'Customer', 'schedule': 0}]}
+
+
+@pytest.mark.parametrize('network_backend', ['networkx', 'csr'])
+def test_strict_view_is_read_only(network_backend):
+    state = _state(network_backend)
+    view = state_view(state, 'strict')
+    G = view['network']
+
+    with pytest.raises(TypeError):
+        view['clock'] = 1
+    with pytest.raises(TypeError):
+        view['customer_orders'].append({})
+    with pytest.raises(TypeError):
+        view['customer_orders'][0]['quantity'] = 2
+    with pytest.raises(TypeError):
+        G.nodes['Warehouse']['inventory'][0] = 0
+    with pytest.raises(TypeError):
+        G.get_edge_data('Manufacturer', 'Warehouse')['shipments'][0]['quantity'] = 0
+    with pytest.raises(TypeError):
+        G.add_node('Other')
+
+    assert state['clock'] == 0 and len(state['customer_orders']) == 1
+    assert G.nodes['Warehouse']['inventory'][0] == 5
+    assert dict(G.nodes(data = 'node_type')) == {'Manufacturer': 'vendor', 'Warehouse': 'warehouse',
+                                                 'Customer': 'customer'}
+    assert [(origin, destination) for origin, destination, _ in G.edges(data = True)] == list(G.edges())
+    assert G.edges['Warehouse', 'Customer']['transit_time'] == 1
+    assert G.nodes['Warehouse']['location'] == (1.0, 1.0)
+    # The network helpers accept views, and use the arrays of a CSRNetwork.
+    assert get_asin_inventory_in_network(G, 0) == 5
+    assert get_asin_inventory_on_all_inbound_arcs(G, 0) == 3
+    if network_backend == 'csr':
+        with pytest.raises(ValueError):
+            G.inventory[1, 0] = 0
+
+
+def test_release_view_protects_only_the_entries():
+    state = _state('networkx')
+    view = state_view(state, 'release')
+    with pytest.raises(TypeError):
+        view['clock'] = 1
+    assert view['network'] is state['network']
+    assert state_view(state, 'off') is state
+    with pytest.raises(ValueError):
+        state_view(state, 'debug')
+
+
+@pytest.mark.parametrize('network_backend', ['networkx', 'csr'])
+def test_strict_views_give_the_same_run(network_backend):
+    def run(mode):
+        env = miniSCOT.SupplyChainEnvironment(network_backend = network_backend, state_view = mode, **_PARAMETERS)
+        return [(record.reward, record.reward_by_asin.tolist()) for record in env.iter_steps()]
+
+    assert run('strict') == run('off')
+
+
+def test_strict_view_detects_agents_modifying_the_state(monkeypatch):
+    compute_actions = ClosestWarehouseFulfillment.compute_actions
+
+    def corrupting_compute_actions(self, state):
+        assert isinstance(state, FrozenMapping)
+        for _, node_data in state['network'].nodes(data = True):
+            if 'inventory' in node_data:
+                node_data['inventory'][0] += 1
+        return compute_actions(self, state)
+
+    monkeypatch.setattr(ClosestWarehouseFulfillment, 'compute_actions', corrupting_compute_actions)
+    env = miniSCOT.SupplyChainEnvironment(state_view = 'strict', **_PARAMETERS)
+    with pytest.raises(TypeError):
+        env.run()
@@ -0,0 +1,126 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import pytest
+from scse.utils.storage import ContentCache, LocalFileSystemStore, S3Store, file_lock
+
+
+class _LocalS3Client:
+    """
+    Stand-in for boto3's S3 client, serving objects from memory.
+    """
+    def __init__(self, objects, checksums = None):
+        self._objects = objects
+        self._checksums = checksums or {}
+        self._lock = threading.Lock()
+        self.ranges = []
+        # Called with the key after every part, e.g. to overwrite the object.
+        self.after_part = None
+
+    def head_object(self, Bucket, Key, ChecksumMode = None):
+        if Key not in self._objects:
+            raise _client_error('404')
+        data = self._objects[Key]
+        response = {'ContentLength': len(data), 'ETag': str(hash(data))}
+        if ChecksumMode == 'ENABLED' and Key in self._checksums:
+            response['ChecksumSHA256'] = self._checksums[Key]
+        return response
+
+    def get_object(self, Bucket, Key, Range, IfMatch = None):
+        start, end = [int(x) for x in Range[len('bytes='):].split('-')]
+        with self._lock:
+            data = self._objects[Key]
+            if IfMatch is not None and IfMatch != str(hash(data)):
+                raise _client_error('PreconditionFailed')
+            self.ranges.append((start, end))
+            if self.after_part is not None:
+                self.after_part(Key)
+        return {'Body': io.BytesIO(data[start:end + 1]), 'ETag': str(hash(data))}
+
+
+def _client_error(code):
+    error = Exception(code)
+    error.response = {'Error': {'Code': code}}
+    return error
+
+
+def test_s3_parallel_ranged_download(tmp_path):
+    data = os.urandom(10000)
+    client = _LocalS3Client({'datasets/orders.csv': data})
+    store = S3Store('bucket', 'datasets/', client = client, part_size = 1024)
+
+    fpath = ContentCache(str(tmp_path)).fetch(store, 'orders.csv')
+
+    with open(fpath, 'rb') as f:
+        assert f.read() == data
+    assert fpath.endswith('.csv')
+    assert len(client.ranges) == 10
+
+
+def test_object_overwritten_during_the_download(tmp_path):
+    data = os.urandom(4096)
+    client = _LocalS3Client({'orders.csv': data})
+    store = S3Store('bucket', client = client, part_size = 1024, max_workers = 1)
+
+    def overwrite(key):
+        client._objects[key] = os.urandom(4096)
+
+    client.after_part = overwrite
+    with pytest.raises(IOError, match = 'changed'):
+        ContentCache(str(tmp_path)).fetch(store, 'orders.csv')
+    assert len(client.ranges) == 1
+
+
+def test_download_is_checked_against_the_remote_checksum(tmp_path):
+    data = b'a,b\n1,2\n'
+    checksum = base64.b64encode(hashlib.sha256(data).digest()).decode()
+    store = S3Store('bucket', client = _LocalS3Client({'orders.csv': data}, {'orders.csv': checksum}))
+    with open(ContentCache(str(tmp_path / 'cache')).fetch(store, 'orders.csv'), 'rb') as f:
+        assert f.read() == data
+
+    wrong = base64.b64encode(hashlib.sha256(b'other').digest()).decode()
+    store = S3Store('bucket', client = _LocalS3Client({'orders.csv': data}, {'orders.csv': wrong}))
+    with pytest.raises(IOError, match = 'checksum'):
+        ContentCache(str(tmp_path / 'other')).fetch(store, 'orders.csv')
+
+
+def test_cached_copies_are_reused_until_the_object_changes(tmp_path):
+    client = _LocalS3Client({'orders.csv': b'a,b\n1,2\n'})
+    store = S3Store('bucket', client = client)
+    cache = ContentCache(str(tmp_path / 'cache'))
+
+    first = cache.fetch(store, 'orders.csv')
+    assert cache.fetch(store, 'orders.csv', verify = True) == first
+    assert len(client.ranges) == 1
+
+    client._objects['orders.csv'] = b'a,b\n3,4\n'
+    assert cache.fetch(store, 'orders.csv') != first
+    assert len(client.ranges) == 2
+
+
+def test_corrupted_copies_are_fetched_again(tmp_path):
+    with open(str(tmp_path / 'orders.csv'), 'wb') as f:
+        f.write(b'a,b\n1,2\n')
+    store = LocalFileSystemStore(str(tmp_path))
+    cache = ContentCache(str(tmp_path / 'cache'))
+
+    fpath = cache.fetch(store, 'orders.csv')
+    with open(fpath, 'wb') as f:
+        f.write(b'a,b\n9,9\n')
+
+    with open(cache.fetch(store, 'orders.csv', verify = True), 'rb') as f:
+        assert f.read() == b'a,b\n1,2\n'
+
+
+def test_missing_object(tmp_path):
+    store = S3Store('bucket', client = _LocalS3Client({}))
+    with pytest.raises(FileNotFoundError):
+        ContentCache(str(tmp_path)).fetch(store, 'missing.csv')
+
+
+def test_lock_in_the_current_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with file_lock('cache.lock'):
+        assert os.path.isfile('cache.lock')
@@ -49,3 +49,58 @@ def test_cli_transcript():
 
     # We just need to reach the end...
     assert True
+
+
+def test_iter_steps():
+    env = _create_miniscot()
+    records = list(env.iter_steps(aggregates = ['on_hand_inventory', 'open_customer_orders'], copy = True))
+
+    assert [record.clock for record in records] == list(range(_HORIZON))
+    assert records[-1].episode_reward == env.episode_reward
+    assert sum(record.reward for record in records) == pytest.approx(env.episode_reward)
+    assert records[0].reward_by_asin.shape == (1,)
+    assert records[0].reward_by_asin.sum() == pytest.approx(records[0].reward)
+    assert len(records[0].aggregates) == 2
+
+
+def test_iter_steps_early_stop():
+    env = _create_miniscot()
+    for record in env.iter_steps():
+        if record.clock == 3:
+            break
+
+    assert record.clock == 3
+
+
+def test_reward_by_asin_array():
+    env = _create_miniscot()
+    context, state = env.get_initial_env_values()
+    env.reset_agents(context, state)
+    asin = context['asin_list'][0]
+
+    for _ in range(_HORIZON):
+        state, actions, reward = env.step(state, [])
+        by_asin = reward['timestep_reward']['by_asin']
+        assert by_asin.shape == (len(context['asin_list']),)
+        assert by_asin.sum() == pytest.approx(reward['timestep_reward']['total'])
+
+    assert set(miniSCOT.reward_by_asin_dict(by_asin, context['asin_list'])) == {asin}
+
+    # Several actions on the same ASIN all add up
+    vendor = next(node for node, data in state['network'].nodes(data=True) if data['node_type'] == 'vendor')
+    warehouse = next(node for node, data in state['network'].nodes(data=True) if data['node_type'] == 'warehouse')
+    shipments = [{'type': 'inbound_shipment', 'asin': asin, 'origin': vendor, 'destination': warehouse,
+                  'quantity': 1, 'schedule': state['clock']} for _ in range(3)]
+    state, _, reward = env._execute_actions(shipments, state)
+    assert reward['total'] == pytest.approx(-3 * env._metrics._cost)
+    assert reward['by_asin'][0] == pytest.approx(reward['total'])
+
+
+def test_iter_steps_reuses_reward_by_asin():
+    env = _create_miniscot()
+    shared = [record.reward_by_asin for record in env.iter_steps()]
+    copied = [record.reward_by_asin for record in _create_miniscot().iter_steps(copy = True)]
+
+    assert all(reward_by_asin is shared[0] for reward_by_asin in shared)
+    assert shared[0].tolist() == copied[-1].tolist()
+    assert len(set(map(id, copied))) == _HORIZON